@@ -0,0 +1,118 @@
+import asyncio, concurrent.futures, functools, hashlib, pickle, weakref
+
+from loaders import get_yaml_loader
+from streaming import _stream_validator, validate_stream
+
+# Validation for asyncio programs (web services, say), which mustn't block
+# their event loop for long. A doc is parsed and validated from parse events,
+# as with --stream, a bounded number of events at a time, and the loop gets
+# control back in between. Big docs can go to an executor instead. Either
+# way, requests share the schema's compiled validator: it is compiled once,
+# and process workers load it once. Workers of a pool from
+# make_process_executor() load it when they start, so requests send them
+# only the doc; workers of other process pools are sent it with each
+# request, and keep the copy.
+
+# How many parse events are handled before yielding to the event loop.
+events_per_step = 1000
+
+# By default, sources at least this long (in characters, or bytes) are
+# validated in an executor.
+offload_size = 1 << 20
+
+def _iter_steps(v, source, loader):
+    # Errors, with None after every events_per_step events.
+    parser = get_yaml_loader(loader)(source)
+    try:
+        yield from _stream_validator(v, parser, '/').run(events_per_step)
+    finally:
+        parser.dispose()
+
+# Pickled validators sent to process executors, with a digest that names
+# them, so each is pickled once.
+_pickled = weakref.WeakKeyDictionary()
+
+def _pickle(v):
+    entry = _pickled.get(v)
+    if entry is None:
+        data = pickle.dumps(v, pickle.HIGHEST_PROTOCOL)
+        entry = _pickled[v] = (hashlib.sha1(data).hexdigest(), data)
+    return entry
+
+# In a process worker: validators it was sent, by digest. Once full, the
+# oldest are dropped.
+worker_cache_size = 8
+_worker_validators = {}
+
+# In a process worker: validators it loaded when it started, by digest.
+_worker_installed = {}
+
+# Process pools made by make_process_executor(), with the digests of the
+# validators their workers load.
+_executor_digests = weakref.WeakKeyDictionary()
+
+def _install(entries):
+    # The initializer of make_process_executor()'s workers.
+    for digest, data in entries:
+        _worker_installed[digest] = pickle.loads(data)
+
+def _validate_installed(digest, source, loader, max_errors):
+    return validate_stream(_worker_installed[digest], source, loader, max_errors=max_errors)
+
+def _validate_pickled(digest, data, source, loader, max_errors):
+    v = _worker_validators.get(digest)
+    if v is None:
+        while len(_worker_validators) >= worker_cache_size:
+            del _worker_validators[next(iter(_worker_validators))]
+        v = _worker_validators[digest] = pickle.loads(data)
+    return validate_stream(v, source, loader, max_errors=max_errors)
+
+def make_process_executor(schemas, max_workers=None):
+    '''
+    Return a concurrent.futures.ProcessPoolExecutor whose workers each load
+    the compiled forms of schemas once, as they start. validate_async()
+    sends such a worker only the doc, and which schema to use.
+    '''
+    entries = [_pickle(s.compile()) for s in schemas]
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers,
+        initializer=_install, initargs=(entries,))
+    _executor_digests[executor] = frozenset(digest for digest, data in entries)
+    return executor
+
+async def validate_async(schema, source, loader='auto', max_errors=None, executor=None, offload_at=offload_size):
+    '''
+    Validate the docs in source (yaml or json text, as a str or bytes)
+    against a schema, and return a list of errors, as validate_stream()
+    would. The event loop is never blocked for more than events_per_step
+    parse events at a time. Sources at least offload_at long are instead
+    validated by executor: a thread or process pool from concurrent.futures
+    (best made by make_process_executor(), for processes), or None for the
+    loop's default executor. With offload_at=None, nothing
+    is offloaded. Malformed yaml raises a yaml.YAMLError.
+    '''
+    # Compiled here, in the loop's thread, so concurrent requests never
+    # compile the same schema twice.
+    v = schema.compile()
+    if offload_at is not None and len(source) >= offload_at:
+        if isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+            digest, data = _pickle(v)
+            if digest in _executor_digests.get(executor, ()):
+                call = functools.partial(_validate_installed, digest, source, loader, max_errors)
+            else:
+                call = functools.partial(_validate_pickled, digest, data, source, loader, max_errors)
+        else:
+            call = functools.partial(validate_stream, v, source, loader, max_errors=max_errors)
+        return await asyncio.get_running_loop().run_in_executor(executor, call)
+    errors = []
+    steps = _iter_steps(v, source, loader)
+    try:
+        for e in steps:
+            if e is None:
+                await asyncio.sleep(0)
+                continue
+            errors.append(e)
+            if max_errors is not None and len(errors) >= max_errors:
+                break
+    finally:
+        steps.close()
+    return errors
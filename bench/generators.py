@@ -0,0 +1,130 @@
+import random, string
+
+# Generators for synthetic schemas and docs to benchmark with. Everything is
+# driven by a seeded random.Random, so the same parameters always produce
+# the same schema and the same docs.
+
+# Regexes that leaves may be constrained by, each with a way to make a
+# value that matches it.
+_regexes = [
+    (r'^[a-z]+$', lambda rng: ''.join(rng.choice(string.ascii_lowercase) for i in range(rng.randint(1, 12)))),
+    (r'^\d{3}-\d{4}$', lambda rng: '%03d-%04d' % (rng.randint(0, 999), rng.randint(0, 9999))),
+    (r'^[A-Z][a-z]*( [A-Z][a-z]*)*$', lambda rng: ' '.join(
+        rng.choice(string.ascii_uppercase) + 'x' * rng.randint(0, 6) for i in range(rng.randint(1, 3)))),
+    (r'^[a-f0-9]{8}(-[a-f0-9]{4}){3}-[a-f0-9]{12}$', lambda rng: '-'.join(
+        ''.join(rng.choice('abcdef0123456789') for i in range(n)) for n in (8, 4, 4, 4, 12))),
+]
+
+def _leaf(rng, regex_density):
+    if rng.random() < regex_density:
+        return {'regex': rng.choice(_regexes)[0]}
+    kind = rng.choice(['int', 'float', 'str', 'bool'])
+    if kind == 'int':
+        return {'type': 'int', 'min': 0, 'max': 1000}
+    if kind == 'float':
+        return {'type': 'float', 'xmin': 0.0}
+    if kind == 'str':
+        return {'type': 'str', 'max_length': 40}
+    return {'type': 'bool'}
+
+def _node_def(rng, width, depth, regex_density):
+    if depth <= 1:
+        return _leaf(rng, regex_density)
+    keys = []
+    for i in range(width):
+        pick = rng.random()
+        if pick < 0.2:
+            # A sequence of maps, one level down.
+            node = {'items': _node_def(rng, width, depth - 1, regex_density)}
+        elif pick < 0.3:
+            # A sequence of scalars.
+            node = {'items': _leaf(rng, regex_density)}
+        elif pick < 0.6:
+            node = _node_def(rng, width, depth - 1, regex_density)
+        else:
+            node = _leaf(rng, regex_density)
+        keys.append({'k%d' % i: node})
+    return {'keys': keys, 'required': ['k%d' % i for i in range(0, width, 2)]}
+
+def make_schema(width=8, depth=3, regex_density=0.25, seed=0):
+    '''
+    Return a yaval schema (as python data) whose root is a map of width keys,
+    nested depth levels deep. Some members are sequences; regex_density is
+    the share of leaves that are checked by a regex.
+    '''
+    rng = random.Random(seed)
+    return {
+        'schema_id': '00000000-0000-4000-8000-%012d' % seed,
+        'schema_version': '1.0',
+        'doc': _node_def(rng, width, depth, regex_density),
+    }
+
+def _leaf_value(rng, node, bad):
+    if 'regex' in node:
+        if bad:
+            return '!' + str(rng.random())
+        for pattern, make in _regexes:
+            if pattern == node['regex']:
+                return make(rng)
+    t = node.get('type')
+    if bad:
+        # Wrong type for most leaves; out of range for numbers.
+        return {'int': 1001, 'float': -1.5}.get(t, 12)
+    if t == 'int':
+        return rng.randint(0, 1000)
+    if t == 'float':
+        return rng.random() * 100 + 0.5
+    if t == 'str':
+        return ''.join(rng.choice(string.ascii_letters) for i in range(rng.randint(0, 20)))
+    return rng.random() < 0.5
+
+def _value(rng, node, seq_length, error_rate):
+    if 'keys' in node:
+        value = {}
+        for pair in node['keys']:
+            (name, member), = pair.items()
+            value[name] = _value(rng, member, seq_length, error_rate)
+        return value
+    if 'items' in node:
+        return [_value(rng, node['items'], seq_length, error_rate) for i in range(seq_length)]
+    return _leaf_value(rng, node, rng.random() < error_rate)
+
+def make_doc(schema, seq_length=10, error_rate=0.0, seed=0):
+    '''
+    Return a doc (as python data) for a schema from make_schema(), with
+    seq_length items in each sequence. error_rate is the chance that any
+    one leaf holds a value that the schema rejects.
+    '''
+    return _value(random.Random(seed), schema['doc'], seq_length, error_rate)
+
+def make_recursive_schema():
+    '''
+    Return a schema for trees of any depth, built from a named type that
+    refers to itself.
+    '''
+    return {
+        'schema_id': '00000000-0000-4000-8000-000000000001',
+        'types': [{'tree': {'keys': [{'value': {'type': 'int', 'min': 0}},
+            {'children': {'items': 'tree'}}], 'required': ['value']}}],
+        'doc': 'tree',
+    }
+
+def make_deep_doc(depth=1000, fanout=1, error_rate=0.0, seed=0):
+    '''
+    Return a tree for make_recursive_schema(), depth levels deep, where each
+    node has fanout children. It is built without recursion, so depth isn't
+    limited by python's stack.
+    '''
+    rng = random.Random(seed)
+    def node():
+        return {'value': -1 if rng.random() < error_rate else rng.randint(0, 100)}
+    root = node()
+    level = [root]
+    for i in range(depth - 1):
+        next_level = []
+        for parent in level:
+            parent['children'] = [node() for j in range(fanout)]
+            next_level.extend(parent['children'])
+        # Only one branch keeps growing, so size is linear in depth.
+        level = next_level[:1]
+    return root
@@ -0,0 +1,318 @@
+'''
+Run yaval benchmarks and report the results as json.
+
+Each scenario runs in a fresh python process, so that its peak memory is
+its own. Results (ops/sec and peak RSS for each scenario, plus what was run
+where) are written in a stable format, to be kept and compared with later
+runs:
+
+    python bench/run.py -o before.json
+    python bench/run.py --compare before.json -o after.json
+
+The startup scenario times one small doc from the command line. Most of
+that is python's and pyyaml's own start, which yaval can't help, so its
+target is set on the time beyond "python -c 'import yaml'" (the python
+scenario); --check fails the run when that is over startup_target_ms.
+
+The size of the generated schema, once compiled, is reported too: how much
+memory it holds per schema node, and how big its pickle is (that's what the
+schema cache stores, and what each worker process is sent).
+'''
+import os, sys, argparse, json, platform, resource, subprocess, tempfile, shutil, time, yaml
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [my_folder, folder_under_test] + sys.path
+
+from generators import *
+
+# Bump when the meaning or shape of the json output changes.
+result_format = 2
+
+default_params = {
+    'width': 8,
+    'depth': 3,
+    'seq_length': 10,
+    'regex_density': 0.25,
+    'error_rate': 0.0,
+    'files': 20,
+    'tree_depth': 2000,
+    'seed': 0,
+}
+
+def _write(path, data):
+    with open(path, 'w') as f:
+        yaml.safe_dump(data, f, sort_keys=False)
+    return path
+
+def _schema_file(folder, p):
+    return _write(os.path.join(folder, 'schema.yaml'),
+        make_schema(p['width'], p['depth'], p['regex_density'], p['seed']))
+
+def _doc(p, seed=None):
+    return make_doc(make_schema(p['width'], p['depth'], p['regex_density'], p['seed']),
+        p['seq_length'], p['error_rate'], p['seed'] if seed is None else seed)
+
+# How much longer than "python -c 'import yaml'" the startup scenario may take.
+startup_target_ms = 30.0
+
+# Each scenario takes the params and a scratch folder, and returns (unit,
+# run), where run() does one op. Setup happens before timing starts.
+
+def scenario_parse(p, folder):
+    # Parsing a doc's text, with the loader yaval would pick.
+    import loaders
+    text = yaml.safe_dump(_doc(p))
+    return 'doc', lambda: loaders.parse(text)
+
+def scenario_meta_schema(p, folder):
+    # Loading a schema: parsing it and validating it against the meta-schema.
+    import yaval
+    yaval.use_schema_cache = False
+    path = _schema_file(folder, p)
+    def run():
+        ctx = yaval.validation_context(path, buffered=True)
+        if not yaval.load_schema(path, ctx):
+            raise RuntimeError('The generated schema is not valid.')
+    return 'schema', run
+
+def scenario_scalars(p, folder):
+    # A long sequence of regex- and range-checked scalars.
+    import schema
+    node = {'items': {'keys': [{'code': {'regex': r'^\d{3}-\d{4}$'}},
+        {'count': {'type': 'int', 'min': 0, 'max': 1000}}]}}
+    s = schema.schema('scalars', node)
+    doc = [{'code': '%03d-%04d' % (i % 1000, i), 'count': i % 1001} for i in range(p['seq_length'] * 200)]
+    return 'doc', lambda: s.validate(doc)
+
+def scenario_compile(p, folder):
+    # Compiling a schema that was already parsed and validated.
+    import schema
+    node = make_schema(p['width'], p['depth'], p['regex_density'], p['seed'])
+    return 'schema', lambda: schema.schema('compile', node).compile()
+
+def scenario_nested(p, folder):
+    # A doc of nested maps and sequences, as wide and deep as the params say.
+    import schema
+    s = schema.schema('nested', make_schema(p['width'], p['depth'], p['regex_density'], p['seed']))
+    doc = _doc(p)
+    return 'doc', lambda: s.validate(doc)
+
+def scenario_deep(p, folder):
+    # One very deep tree, checked against a recursive named type.
+    import schema
+    s = schema.schema('deep', make_recursive_schema())
+    doc = make_deep_doc(p['tree_depth'], 2, p['error_rate'], p['seed'])
+    return 'doc', lambda: s.validate(doc)
+
+def _yaval_command(args):
+    # How the yaval launchers run it.
+    return [sys.executable, '-c', 'import sys; sys.path.insert(0, sys.argv.pop(1)); import yaval; yaval.main()',
+        folder_under_test] + args
+
+def _run_quietly(command, p, env=None):
+    done = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    if done.returncode and not p['error_rate']:
+        raise RuntimeError('%s failed on valid input.' % command[-1])
+
+def scenario_cli(p, folder):
+    # The command line, from start to exit, validating several files.
+    schema_path = _schema_file(folder, p)
+    docs = [_write(os.path.join(folder, 'doc%d.yaml' % i), _doc(p, i)) for i in range(p['files'])]
+    command = _yaval_command(['--no-daemon', '--no-schema-cache', schema_path] + docs)
+    return 'run', lambda: _run_quietly(command, p)
+
+def scenario_startup(p, folder):
+    # The command line on one small doc, as an editor or a git hook would
+    # run it: the schema is in the cache (after the warm-up run), there is
+    # no daemon, and yaval's bytecode is cached, as it is once installed.
+    # (With PYTHONDONTWRITEBYTECODE set, python never caches it itself, and
+    # compiling yaval's modules on every run takes about as long again.)
+    import compileall
+    compileall.compile_dir(folder_under_test, maxlevels=0, quiet=2)
+    schema_path = _schema_file(folder, p)
+    doc = _doc(dict(p, seq_length=1))
+    doc_path = _write(os.path.join(folder, 'doc.yaml'), doc)
+    env = dict(os.environ, XDG_CACHE_HOME=os.path.join(folder, 'cache'),
+        YAVAL_SOCKET=os.path.join(folder, 'no-daemon.sock'))
+    command = _yaval_command([schema_path, doc_path])
+    return 'run', lambda: _run_quietly(command, p, env)
+
+def scenario_python(p, folder):
+    # What the startup scenario can't go below: python starting and
+    # importing pyyaml.
+    command = [sys.executable, '-c', 'import yaml']
+    return 'run', lambda: _run_quietly(command, p)
+
+scenarios = ['parse', 'meta_schema', 'compile', 'scalars', 'nested', 'deep', 'cli', 'startup', 'python']
+
+def peak_rss_kb():
+    # The largest resident set of this process or any child it waited for.
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux reports kilobytes; macOS reports bytes.
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def run_one(name, p, min_time):
+    '''
+    Run one scenario in this process, repeating its op for at least
+    min_time seconds after one untimed warm-up, and return its result.
+    '''
+    folder = tempfile.mkdtemp()
+    try:
+        unit, run = globals()['scenario_' + name](p, folder)
+        run()
+        ops = 0
+        start = time.perf_counter()
+        while True:
+            run()
+            ops += 1
+            seconds = time.perf_counter() - start
+            if seconds >= min_time:
+                break
+    finally:
+        shutil.rmtree(folder)
+    return {'scenario': name, 'unit': unit, 'ops': ops, 'seconds': round(seconds, 6),
+        'ops_per_sec': round(ops / seconds, 3), 'peak_rss_kb': peak_rss_kb()}
+
+def _count_nodes(s):
+    count = 0
+    stack = [s.get_root()] + list(s.get_types().values())
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children())
+        stack.extend(node.extra_schemas())
+    return count
+
+def schema_memory(p):
+    '''
+    Compile the generated schema, and return how many schema nodes it has,
+    how much memory it holds once compiled (not counting the parsed yaml),
+    and the size of its pickle.
+    '''
+    import gc, pickle, tracemalloc, schema
+    node = make_schema(p['width'], p['depth'], p['regex_density'], p['seed'])
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    s = schema.schema('memory', node)
+    s.compile()
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    nodes = _count_nodes(s)
+    return {'schema_nodes': nodes, 'compiled_kb': round(held / 1024.0, 1),
+        'bytes_per_node': round(held / float(nodes), 1),
+        'pickled_kb': round(len(pickle.dumps(s, pickle.HIGHEST_PROTOCOL)) / 1024.0, 1)}
+
+def run_all(names, p, min_time, before={}, before_memory=None):
+    results = []
+    for name in names:
+        command = [sys.executable, os.path.abspath(__file__), '--one', name,
+            '--params', json.dumps(p), '--min-time', str(min_time)]
+        done = subprocess.run(command, stdout=subprocess.PIPE, universal_newlines=True)
+        if done.returncode:
+            results.append({'scenario': name, 'error': 'exit code %d' % done.returncode})
+        else:
+            results.append(json.loads(done.stdout))
+        sys.stderr.write(describe(results[-1], before.get(name)) + '\n')
+    # Measured in a process of its own, like the scenarios.
+    command = [sys.executable, os.path.abspath(__file__), '--memory', '--params', json.dumps(p)]
+    done = subprocess.run(command, stdout=subprocess.PIPE, universal_newlines=True)
+    memory = json.loads(done.stdout) if not done.returncode else {'error': 'exit code %d' % done.returncode}
+    sys.stderr.write(describe_memory(memory, before_memory) + '\n')
+    import loaders
+    return {
+        'format': result_format,
+        'startup_overhead_ms': startup_overhead_ms(results),
+        'startup_target_ms': startup_target_ms,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'libyaml': loaders.has_libyaml(),
+        'min_time': min_time,
+        'params': p,
+        'results': results,
+        'schema_memory': memory,
+    }
+
+def startup_overhead_ms(results):
+    '''
+    Return how many ms a run of the startup scenario takes beyond one of the
+    python scenario, or None if either wasn't run.
+    '''
+    by_name = dict((r['scenario'], r) for r in results if 'ops_per_sec' in r)
+    if 'startup' not in by_name or 'python' not in by_name:
+        return None
+    return round(1000.0 / by_name['startup']['ops_per_sec'] - 1000.0 / by_name['python']['ops_per_sec'], 3)
+
+def describe(result, before=None):
+    if 'error' in result:
+        return '%-12s failed: %s' % (result['scenario'], result['error'])
+    text = '%-12s %12.1f %s/s %10d KB peak' % (result['scenario'], result['ops_per_sec'],
+        result['unit'], result['peak_rss_kb'])
+    if before and 'ops_per_sec' in before:
+        text += '  (%+.1f%% speed, %+.1f%% memory)' % (
+            100.0 * (result['ops_per_sec'] / before['ops_per_sec'] - 1),
+            100.0 * (result['peak_rss_kb'] / before['peak_rss_kb'] - 1))
+    return text
+
+def describe_memory(memory, before=None):
+    if 'error' in memory:
+        return '%-12s failed: %s' % ('memory', memory['error'])
+    text = '%-12s %d schema nodes, %.1f KB compiled (%.0f B/node), %.1f KB pickled' % ('memory',
+        memory['schema_nodes'], memory['compiled_kb'], memory['bytes_per_node'], memory['pickled_kb'])
+    if before and 'compiled_kb' in before:
+        text += '  (%+.1f%% compiled, %+.1f%% pickled)' % (
+            100.0 * (memory['compiled_kb'] / before['compiled_kb'] - 1),
+            100.0 * (memory['pickled_kb'] / before['pickled_kb'] - 1))
+    return text
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='bench', description='Benchmark yaval on synthetic schemas and docs.')
+    parser.add_argument('scenario', nargs='*', help='scenarios to run: %s (default: all)' % ', '.join(scenarios))
+    for name, value in sorted(default_params.items()):
+        parser.add_argument('--' + name.replace('_', '-'), type=type(value), default=value, metavar='N')
+    parser.add_argument('--min-time', type=float, default=1.0, metavar='SECONDS',
+        help='how long to repeat each scenario')
+    parser.add_argument('-o', '--output', metavar='PATH', help='where to write json results (default: stdout)')
+    parser.add_argument('--compare', metavar='PATH', help='earlier json results to compare with')
+    parser.add_argument('--check', action='store_true',
+        help='exit with status 1 if startup takes more than %g ms beyond python and pyyaml' % startup_target_ms)
+    parser.add_argument('--one', help=argparse.SUPPRESS)
+    parser.add_argument('--memory', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--params', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    for name in args.scenario:
+        if name not in scenarios:
+            parser.error('unknown scenario %r' % name)
+    if args.one:
+        print(json.dumps(run_one(args.one, json.loads(args.params), args.min_time), sort_keys=True))
+        sys.exit(0)
+    if args.memory:
+        print(json.dumps(schema_memory(json.loads(args.params)), sort_keys=True))
+        sys.exit(0)
+    p = dict((name, getattr(args, name)) for name in default_params)
+    before = {}
+    before_memory = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            earlier = json.load(f)
+        before = dict((r['scenario'], r) for r in earlier['results'])
+        before_memory = earlier.get('schema_memory')
+    names = args.scenario or scenarios
+    if args.check:
+        names = names + [name for name in ['startup', 'python'] if name not in names]
+    report = run_all(names, p, args.min_time, before, before_memory)
+    text = json.dumps(report, indent=2, sort_keys=True) + '\n'
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    overhead = report['startup_overhead_ms']
+    if overhead is not None:
+        sys.stderr.write('startup is %.1f ms beyond python and pyyaml (target: %g ms)\n' % (overhead, startup_target_ms))
+    if args.check and (overhead is None or overhead > startup_target_ms):
+        sys.exit(1)
@@ -0,0 +1,309 @@
+import re, datetime
+
+from datatypes import *
+from validator import *
+from validator import _count_phrase, _incomparable_err_txt
+from regexes import literal_regex
+
+# Source text for each python type that a validator's dispatch table may
+# name, as it must be spelled in generated code.
+_type_source = {
+    string_type: 'str',
+    map_type: 'dict',
+    seq_type: 'list',
+    tuple_type: 'tuple',
+    int_type: 'int',
+    float_type: 'float',
+    bool_type: 'bool',
+    null_type: '_NoneType',
+    datetime.date: 'datetime.date',
+    datetime.datetime: 'datetime.datetime',
+}
+
+_module_header = '''# Generated by yaval from %(source)s. Do not edit; regenerate instead.
+#
+# validate(doc) returns a list of (schema_xpath, doc_xpath, msg, value)
+# tuples; format_error() turns one into the same text yaval prints.
+
+import re, datetime, operator
+
+_NoneType = type(None)
+
+_type_names = {
+    str: 'str', dict: 'map', list: 'seq', tuple: 'tuple', int: 'int',
+    float: 'float', bool: 'bool', _NoneType: 'null',
+    datetime.date: 'date', datetime.datetime: 'date',
+}
+
+def _type_name(value):
+    t = type(value)
+    return _type_names.get(t) or str(t)
+
+def _child_xpath(xpath, key):
+    if xpath == '/':
+        return '/%%s' %% key
+    return '%%s/%%s' %% (xpath, key)
+
+def _item_xpath(xpath, i):
+    if xpath == '/':
+        return '/[%%d]' %% i
+    return '%%s[%%d]' %% (xpath, i)
+
+def _compare_by_day(value, n, op):
+    # For a value and a bound that python can't compare: a date and a
+    # timestamp are compared by day. None if they can't be compared at all.
+    if isinstance(value, datetime.date) and isinstance(n, datetime.date):
+        if isinstance(value, datetime.datetime):
+            value = value.date()
+        if isinstance(n, datetime.datetime):
+            n = n.date()
+        return op(value, n)
+    return None
+
+def format_error(error):
+    schema_xpath, doc_xpath, msg, value = error
+    if type(value) is dict:
+        value = '{...}'
+    elif type(value) is list:
+        value = '[...]'
+    elif type(value) is str:
+        value = repr(value)
+    return 'Doc:%%s with value=%%s violates %%s. %%s' %% (doc_xpath, value, schema_xpath, msg)
+'''
+
+_module_footer = '''
+def validate(doc, xpath='/'):
+    errors = []
+    %s(doc, xpath, errors)
+    return errors
+'''
+
+# The name, operator and message of each bound check, by check name.
+_bound_sources = {
+    '_check_max': ('max', 'gt', '>', 'Value is greater than max (%s).'),
+    '_check_xmax': ('xmax', 'ge', '>=', 'Value is greater than or equal to xmax (%s).'),
+    '_check_min': ('min', 'lt', '<', 'Value is less than min (%s)'),
+    '_check_xmin': ('xmin', 'le', '<=', 'Value is less than or equal to xmin (%s).'),
+}
+
+class _generator:
+
+    def __init__(self):
+        self.names = {}
+        self.pending = []
+        self.functions = []
+        self.constants = []
+        self.regex_names = {}
+
+    def name_for(self, v):
+        '''
+        Return the name of the generated function for a validator, queueing
+        it for generation the first time it is seen.
+        '''
+        if v is None:
+            return 'None'
+        key = id(v)
+        if key not in self.names:
+            self.names[key] = '_v%d' % len(self.names)
+            self.pending.append(v)
+        return self.names[key]
+
+    def regex_name(self, r):
+        # Generated code always uses python's re. Schema regexes carry their
+        # flags inline, so those compiled by another engine may have none.
+        key = (r.pattern, getattr(r, 'flags', 0))
+        if key not in self.regex_names:
+            name = '_re%d' % len(self.regex_names)
+            self.regex_names[key] = name
+            self.constants.append('%s = re.compile(%r, %d)' % ((name,) + key))
+        return self.regex_names[key]
+
+    def constant(self, prefix, value_source):
+        name = '_%s%d' % (prefix, len(self.constants))
+        self.constants.append('%s = %s' % (name, value_source))
+        return name
+
+    def run(self, root):
+        root_name = self.name_for(root)
+        while self.pending:
+            v = self.pending.pop(0)
+            self.functions.append(self.function_source(v))
+        return root_name
+
+    def function_source(self, v):
+        fn = self.names[id(v)]
+        sx = v.schema.get_xpath()
+        out = ['def %s(value, xpath, errors):' % fn]
+        add = lambda depth, line: out.append('    ' * depth + line)
+        def error(depth, msg_source):
+            add(depth, 'errors.append((%r, xpath, %s, value))' % (sx, msg_source))
+        walks_map = v.walkers.get(map_type) is not None
+        walks_seq = v.walkers.get(seq_type) is not None
+        if not v.accepts_any:
+            if not v.expected:
+                error(1, repr(v.type_error))
+                add(1, 'return')
+                out.append('')
+                return '\n'.join(out)
+            types = sorted(set(_type_source[t] for t in v.dispatch), key=str)
+            add(1, 't = type(value)')
+            if len(types) == 1:
+                add(1, 'if t is not %s:' % types[0])
+            else:
+                add(1, 'if t not in (%s):' % ', '.join(types))
+            error(2, '%r %% _type_name(value)' % v.type_error)
+            add(2, 'return')
+        elif walks_map or walks_seq:
+            add(1, 't = type(value)')
+        for check, operand in v.checks:
+            self.check_source(check, operand, add, error)
+        if v.ref:
+            call = '%s(value, xpath, errors)' % self.name_for(v.ref)
+            ref_types = set(v.ref.dispatch)
+            if v.ref.accepts_any or (not v.accepts_any and set(v.dispatch) <= ref_types):
+                add(1, call)
+            else:
+                # Only values of the named type's types are checked against it.
+                add(1, 'if type(value) in (%s,):' % ', '.join(sorted(_type_source[t] for t in ref_types)))
+                add(2, call)
+        if walks_map:
+            add(1, 'if t is dict:')
+            self.map_source(v, add, error)
+        if walks_seq:
+            add(1, '%s t is list or t is tuple:' % ('elif' if walks_map else 'if'))
+            self.seq_source(v, add, error)
+        if len(out) == 1:
+            add(1, 'pass')
+        out.append('')
+        return '\n'.join(out)
+
+    def check_source(self, check, n, add, error):
+        name = check.__name__
+        if name == '_check_regex':
+            if isinstance(n, literal_regex):
+                add(1, 'if value not in %s:' % self.constant('lit', 'frozenset(%r)' % sorted(n.strings)))
+            else:
+                add(1, 'if not %s.search(value):' % self.regex_name(n))
+            tpl = 'Value "%%s" does not match regex /%s/.' % n.pattern.replace('%', '%%')
+            error(2, '%r %% (value,)' % tpl)
+        elif name == '_check_multiple_of':
+            add(1, 'if value %% %r != 0:' % n)
+            error(2, repr('Value is not a multiple of %d.' % n))
+        elif name in _bound_sources:
+            bound, op, symbol, msg = _bound_sources[name]
+            add(1, 'try:')
+            add(2, 'bad = value %s %r' % (symbol, n))
+            add(1, 'except TypeError:')
+            add(2, 'bad = _compare_by_day(value, %r, operator.%s)' % (n, op))
+            add(1, 'if bad is None:')
+            error(2, repr(_incomparable_err_txt % (bound, n)))
+            add(1, 'elif bad:')
+            error(2, repr(msg % n))
+        elif name == '_check_max_length':
+            add(1, 'if len(value) > %r:' % n)
+            error(2, '%r %% len(value)' % ('Length of %%d is greater than max_length (%s).' % n))
+        elif name == '_check_min_length':
+            add(1, 'if len(value) < %r:' % n)
+            error(2, '%r %% len(value)' % ('Length of %%d is less than min_length (%s).' % n))
+        else:
+            raise ValueError('No code generator for check %s.' % name)
+
+    def extras_count_source(self, v, depth, count, noun, section, add, error):
+        lo, hi = v.extras_min, v.extras_max
+        if lo is not None and lo == hi:
+            add(depth, 'if %s != %d:' % (count, lo))
+            tpl = 'Expected exactly %s besides those declared in %s; found %%d.' % (_count_phrase(lo, noun), section)
+            error(depth + 1, '%r %% %s' % (tpl, count))
+            return
+        if lo is not None:
+            add(depth, 'if %s < %d:' % (count, lo))
+            tpl = 'Expected at least %s besides those declared in %s; found %%d.' % (_count_phrase(lo, noun), section)
+            error(depth + 1, '%r %% %s' % (tpl, count))
+        if hi is not None:
+            add(depth, '%s %s > %d:' % ('elif' if lo is not None else 'if', count, hi))
+            tpl = 'Expected at most %s besides those declared in %s; found %%d.' % (_count_phrase(hi, noun), section)
+            error(depth + 1, '%r %% %s' % (tpl, count))
+
+    def map_source(self, v, add, error):
+        for name in v.required:
+            add(2, 'if %r not in value:' % (name,))
+            error(3, repr('Missing required key "%s".' % name))
+        if v.extras_allowed:
+            add(2, 'extra_count = 0')
+        keys = None
+        if v.keys is not None:
+            keys = self.constant('keys', '{%s}' % ', '.join('%r: %s' % (k, self.name_for(child))
+                for k, child in v.keys.items()))
+        add(2, 'for k, item in value.items():')
+        add(3, 'child_xpath = _child_xpath(xpath, k)')
+        if v.key_type:
+            add(3, '%s(k, child_xpath, errors)' % self.name_for(v.key_type))
+        depth = 3
+        if keys:
+            add(3, 'if k in %s:' % keys)
+            add(4, 'f = %s[k]' % keys)
+            add(4, 'if f is not None:')
+            add(5, 'f(item, child_xpath, errors)')
+            if v.value_type or v.extras_allowed or v.keys is not None:
+                add(3, 'else:')
+                depth = 4
+        if v.value_type:
+            add(depth, '%s(item, child_xpath, errors)' % self.name_for(v.value_type))
+        elif v.keys is not None or v.extras_allowed:
+            if not v.extras_allowed:
+                add(depth, "errors.append((%r, xpath, 'Key \"%%s\" is not declared in keys, and extras are not allowed.' %% (k,), value))" % v.schema.get_xpath())
+            else:
+                add(depth, 'extra_count += 1')
+                if v.extras:
+                    add(depth, '%s(item, child_xpath, errors)' % self.name_for(v.extras))
+        elif not keys and not v.key_type:
+            add(3, 'pass')
+        if v.extras_allowed:
+            self.extras_count_source(v, 2, 'extra_count', 'key', 'keys', add, error)
+
+    def seq_source(self, v, add, error):
+        if v.items:
+            add(2, 'for i, item in enumerate(value):')
+            add(3, '%s(item, _item_xpath(xpath, i), errors)' % self.name_for(v.items))
+            return
+        if v.fields is None:
+            add(2, 'pass')
+            return
+        n = len(v.fields)
+        for name, i in v.required_fields:
+            add(2, 'if len(value) <= %d:' % i)
+            error(3, repr('Missing required field "%s".' % name))
+        for i, field in enumerate(v.fields):
+            if field:
+                add(2, 'if len(value) > %d:' % i)
+                add(3, '%s(value[%d], _item_xpath(xpath, %d), errors)' % (self.name_for(field), i, i))
+        if not v.extras_allowed:
+            add(2, 'if len(value) > %d:' % n)
+            tpl = 'Found %%d fields, but only %d are declared, and extras are not allowed.' % n
+            error(3, '%r %% len(value)' % tpl)
+            return
+        if v.extras:
+            add(2, 'for i in range(%d, len(value)):' % n)
+            add(3, '%s(value[i], _item_xpath(xpath, i), errors)' % self.name_for(v.extras))
+        add(2, 'extra_count = max(len(value) - %d, 0)' % n)
+        self.extras_count_source(v, 2, 'extra_count', 'field', 'fields', add, error)
+
+def generate_source(schema, source_name=None):
+    '''
+    Return the text of a standalone python module that validates docs
+    against a schema. Each compiled node becomes a function with its types,
+    bounds, messages and regexes inlined, so nothing is interpreted or
+    looked up at validation time.
+    '''
+    gen = _generator()
+    root_name = gen.run(schema.compile())
+    parts = [_module_header % {'source': source_name or schema.get_xpath()}]
+    if gen.constants:
+        parts.append('\n'.join(c for c in gen.constants if c.startswith('_re')) + '\n')
+    parts.extend(gen.functions)
+    tables = [c for c in gen.constants if not c.startswith('_re')]
+    if tables:
+        # These refer to functions, so they come after all of them.
+        parts.append('\n'.join(tables) + '\n')
+    parts.append(_module_footer % root_name)
+    return '\n'.join(parts)
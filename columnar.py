@@ -0,0 +1,208 @@
+from datatypes import *
+
+# Bulk checks for columns of scalars: a long sequence whose items are all
+# checked by the same leaf validator, or one column of a "fields" table.
+# Rather than visiting values one by one, a column is filtered down to the
+# indices of values that fail, and only those are handed back to the
+# validator to report. Valid data, the common case, never leaves these
+# tight loops.
+
+# Below this many values, batching costs more than it saves.
+batch_min = 64
+
+# numpy is optional. It only pays off for long numeric columns, and it is
+# slow to import, so it is only imported when such a column turns up.
+numpy_min = 4096
+_numpy = None
+_numpy_tried = False
+
+def get_numpy():
+    global _numpy, _numpy_tried
+    if not _numpy_tried:
+        _numpy_tried = True
+        try:
+            import numpy as _numpy
+        except ImportError:
+            _numpy = None
+    return _numpy
+
+def _check_regex(column, r):
+    search = r.search
+    return [i for i, x in enumerate(column) if not search(x)]
+
+def _check_multiple_of(column, n):
+    return [i for i, x in enumerate(column) if x % n != 0]
+
+def _check_max(column, n):
+    return [i for i, x in enumerate(column) if x > n]
+
+def _check_xmax(column, n):
+    return [i for i, x in enumerate(column) if x >= n]
+
+def _check_min(column, n):
+    return [i for i, x in enumerate(column) if x < n]
+
+def _check_xmin(column, n):
+    return [i for i, x in enumerate(column) if x <= n]
+
+def _check_max_length(column, n):
+    return [i for i, x in enumerate(column) if len(x) > n]
+
+def _check_min_length(column, n):
+    return [i for i, x in enumerate(column) if len(x) < n]
+
+# Keyed by the name of the validator's check function.
+_bulk_checks = {
+    '_check_regex': _check_regex,
+    '_check_multiple_of': _check_multiple_of,
+    '_check_max': _check_max,
+    '_check_xmax': _check_xmax,
+    '_check_min': _check_min,
+    '_check_xmin': _check_xmin,
+    '_check_max_length': _check_max_length,
+    '_check_min_length': _check_min_length,
+}
+
+_numpy_checks = {
+    '_check_multiple_of': lambda a, n: a % n != 0,
+    '_check_max': lambda a, n: a > n,
+    '_check_xmax': lambda a, n: a >= n,
+    '_check_min': lambda a, n: a < n,
+    '_check_xmin': lambda a, n: a <= n,
+}
+
+def _numeric_array(column):
+    '''
+    Return column as a numpy array, if that can be done exactly: every value
+    must be an int (not a bool), or every value a float.
+    '''
+    if len(column) < numpy_min:
+        return None
+    types = set(map(type, column))
+    if types != {int_type} and types != {float_type}:
+        return None
+    numpy = get_numpy()
+    if numpy is None:
+        return None
+    try:
+        a = numpy.array(column)
+    except OverflowError:
+        return None
+    # Ints too big for int64 come back as objects.
+    if a.dtype.kind not in 'if':
+        return None
+    return a
+
+def is_leaf(v):
+    '''
+    Can every error that v reports about a value be found without looking
+    at anything but that value? (None, a validator that checks nothing, is
+    a leaf too.)
+    '''
+    return v is None or (v.built and v.ref is None and not v.walkers)
+
+def failing_indices(v, column):
+    '''
+    Return the sorted indices of values in column that a leaf validator
+    would report errors for, or None if the column can't be checked in
+    bulk. Values at other indices are valid.
+    '''
+    if v is None:
+        return []
+    bad = []
+    if not v.accepts_any:
+        dispatch = v.dispatch
+        bad = [i for i, x in enumerate(column) if type(x) not in dispatch]
+    if not v.checks:
+        return bad
+    # Checks only apply to values of the right type.
+    index = None
+    if bad:
+        skip = set(bad)
+        index = [i for i in range(len(column)) if i not in skip]
+        column = [column[i] for i in index]
+    failed = set()
+    array = None
+    array_tried = False
+    try:
+        for check, operand in v.checks:
+            name = check.__name__
+            if name in _numpy_checks and type(operand) in (int_type, float_type):
+                if not array_tried:
+                    array = _numeric_array(column)
+                    array_tried = True
+                if array is not None:
+                    fails = _numpy_checks[name](array, operand)
+                    failed.update(get_numpy().flatnonzero(fails).tolist())
+                    continue
+            failed.update(_bulk_checks[name](column, operand))
+    except (TypeError, KeyError):
+        # A comparison that python rejects (a date against an int bound,
+        # say) is left to the validator's own checks, one value at a time;
+        # they compare dates by day, and report other mismatches.
+        return None
+    if index is not None:
+        failed = set(index[i] for i in failed)
+    failed.update(bad)
+    return sorted(failed)
+
+def failing_rows(v, rows):
+    '''
+    Return the sorted indices of rows that a "fields" validator would report
+    errors for (about the row itself or about any of its fields), or None
+    if they can't be checked in bulk.
+    '''
+    fields = v.fields
+    n = len(fields)
+    bad = set()
+    good = []
+    dispatch = v.dispatch
+    required_len = max([i + 1 for name, i in v.required_fields] or [0])
+    for i, row in enumerate(rows):
+        if (not v.accepts_any and type(row) not in dispatch) or not is_seq(row):
+            bad.add(i)
+        elif len(row) < required_len or (len(row) > n and not v.extras_allowed):
+            bad.add(i)
+        else:
+            good.append(i)
+    if v.checks:
+        column = [rows[i] for i in good]
+        failed = failing_indices(_checks_only(v), column)
+        if failed is None:
+            return None
+        bad.update(good[k] for k in failed)
+    if v.extras_allowed and (v.extras_min is not None or v.extras_max is not None):
+        lo = v.extras_min or 0
+        hi = v.extras_max
+        for i in good:
+            count = max(len(rows[i]) - n, 0)
+            if count < lo or (hi is not None and count > hi):
+                bad.add(i)
+    for j, field in enumerate(fields):
+        if field is None:
+            continue
+        index = [i for i in good if len(rows[i]) > j]
+        failed = failing_indices(field, [rows[i][j] for i in index])
+        if failed is None:
+            return None
+        bad.update(index[k] for k in failed)
+    if v.extras is not None:
+        index = []
+        column = []
+        for i in good:
+            row = rows[i]
+            for j in range(n, len(row)):
+                index.append(i)
+                column.append(row[j])
+        failed = failing_indices(v.extras, column)
+        if failed is None:
+            return None
+        bad.update(index[k] for k in failed)
+    return sorted(bad)
+
+class _checks_only:
+    # Stands in for a validator when only its checks should run, because
+    # types have already been checked.
+    accepts_any = True
+    def __init__(self, v):
+        self.checks = v.checks
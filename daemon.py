@@ -0,0 +1,127 @@
+import os, sys
+
+from schema_cache import get_cache_dir
+
+# The protocol is one json object per line, in both directions. A client
+# sends a single request line; the daemon streams back response lines as
+# results become available, and closes the connection when it's done. If
+# handling a request fails unexpectedly, the last line is {"internal_error":
+# ...}, and the client should do the work itself.
+# Only connect() runs on every yaval invocation, so everything imports what
+# it needs when it is called, to keep startup quick.
+
+def get_socket_path():
+    '''
+    Return the path of the unix domain socket where a yaval daemon listens.
+    $YAVAL_SOCKET overrides the default, which is in $XDG_RUNTIME_DIR (or
+    the cache folder when that is not set).
+    '''
+    path = os.environ.get('YAVAL_SOCKET')
+    if path:
+        return path
+    folder = os.environ.get('XDG_RUNTIME_DIR') or get_cache_dir()
+    return os.path.join(folder, 'yaval.sock')
+
+def connect(socket_path=None):
+    '''
+    Return a socket connected to a running daemon, or None if there isn't
+    one. This is cheap when no daemon has been started.
+    '''
+    socket_path = socket_path or get_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+    import socket
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+def send_request(sock, request):
+    '''
+    Send a request over a connected socket, and yield each response as it
+    arrives.
+    '''
+    import json
+    try:
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        with sock.makefile('r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+    finally:
+        sock.close()
+
+def _handle(handler):
+    import json
+    line = handler.rfile.readline()
+    if not line:
+        return
+    wfile = handler.wfile
+    def respond(msg):
+        wfile.write((json.dumps(msg) + '\n').encode('utf-8'))
+        wfile.flush()
+    try:
+        handler.server.handle_request_func(json.loads(line.decode('utf-8')), respond)
+    except (BrokenPipeError, ConnectionResetError):
+        # The client went away; nothing to tell it.
+        pass
+    except Exception as e:
+        # A bug, not a problem with the request. The daemon keeps serving,
+        # and logs what happened.
+        import traceback
+        traceback.print_exc()
+        try:
+            respond({'internal_error': '%s: %s' % (e.__class__.__name__, e)})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+def make_server(handle_request_func, socket_path):
+    '''
+    Bind a server to a unix domain socket. Each decoded request is passed,
+    along with a function that sends a response, to handle_request_func.
+    Requests are handled one at a time. That keeps per-request settings
+    simple, and validating a typical doc takes milliseconds anyway.
+    '''
+    import socketserver
+    class request_handler(socketserver.StreamRequestHandler):
+        handle = _handle
+    sock = connect(socket_path)
+    if sock:
+        sock.close()
+        raise RuntimeError('A yaval daemon is already listening on %s.' % socket_path)
+    if os.path.exists(socket_path):
+        # Left behind by a daemon that didn't shut down cleanly.
+        os.remove(socket_path)
+    folder = os.path.dirname(socket_path)
+    if folder and not os.path.isdir(folder):
+        os.makedirs(folder, 0o700)
+    # The daemon reads any file a client names, so only its owner may talk
+    # to it. The socket is created that way, rather than changed once it is
+    # bound, so that no one else can connect in between.
+    old_umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, request_handler)
+    finally:
+        os.umask(old_umask)
+    server.handle_request_func = handle_request_func
+    return server
+
+def serve(handle_request_func, socket_path=None):
+    '''
+    Handle requests on a unix domain socket until interrupted.
+    '''
+    import signal
+    socket_path = socket_path or get_socket_path()
+    server = make_server(handle_request_func, socket_path)
+    # Turn SIGTERM into an exception, so the socket gets cleaned up.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
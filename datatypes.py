@@ -1,3 +1,5 @@
+import datetime
+
 float_type = type(1.0)
 int_type = type(1)
 string_type = type('')
@@ -7,6 +9,7 @@ bool_type = type(True)
 map_type = type({})
 seq_type = type([])
 tuple_type = type(())
+null_type = type(None)
 
 def is_string(obj):
     t = type(obj)
@@ -38,22 +41,41 @@ def is_scalar(obj):
     t = type(obj)
     return not (t is map_type or t is seq_type or t is tuple_type)
 
-def get_simple_type_name(obj):
-    if is_string(obj):
-        return 'str'
-    if is_map(obj):
-        return 'map'
-    if is_seq(obj):
-        return 'seq'
-    if is_tuple(obj):
-        return 'tuple'
-    if is_int(obj):
-        return 'int'
-    if is_float(obj):
-        return 'float'
-    if is_bool(obj):
-        return 'bool'
-    if obj is None:
-        return 'null'
-    return str(type(obj))
+# Maps python types (as produced by a yaml loader) to the names that schemas
+# use for them. Lookup is a single dict probe, no matter how many types exist.
+simple_type_names = {
+    string_type: 'str',
+    unicode_type: 'str',
+    map_type: 'map',
+    seq_type: 'seq',
+    tuple_type: 'tuple',
+    int_type: 'int',
+    float_type: 'float',
+    bool_type: 'bool',
+    null_type: 'null',
+    datetime.date: 'date',
+    datetime.datetime: 'date',
+}
+
+# The inverse: for each type name a schema may declare, which python types
+# satisfy it. Tuples are represented as yaml sequences, so lists satisfy
+# 'tuple' as well as 'seq'.
+python_types_for_name = {
+    'str': (string_type, unicode_type),
+    'map': (map_type,),
+    'seq': (seq_type,),
+    'tuple': (seq_type, tuple_type),
+    'int': (int_type,),
+    'float': (float_type,),
+    'number': (int_type, float_type),
+    'bool': (bool_type,),
+    'null': (null_type,),
+    'date': (datetime.date, datetime.datetime),
+}
 
+def get_simple_type_name(obj):
+    t = type(obj)
+    name = simple_type_names.get(t)
+    if name is None:
+        return str(t)
+    return name
@@ -0,0 +1,104 @@
+import pickle
+
+from schema_violation import *
+from datatypes import *
+
+# Revalidation of a doc that was edited: the new version is walked alongside
+# what validating the old one found, and subtrees that are the same as
+# before are not validated again; the errors found in them last time are
+# reused. Only the changed subtrees, and the container checks of their
+# ancestors (required keys, lengths, extras), run again.
+
+_container_types = (map_type, seq_type, tuple_type)
+
+class _record:
+    # What validating one container node against one validator found: the
+    # node, every error in its subtree (in the order they were found), and
+    # a _record for each container child, by (validator, step), where step
+    # is the child's (kind, key) in its doc path, or None when a validator
+    # checks the same node again (see _walk_ref).
+    __slots__ = ('node', 'errors', 'children')
+
+    def __init__(self, node):
+        self.node = node
+        self.errors = None
+        self.children = {}
+
+def _same(a, b):
+    # Whether two subtrees validate the same way. == is quick, but says 1,
+    # 1.0 and True are the same, and ignores the order of keys, which decides
+    # the order of errors; pickles tell those apart.
+    if a is b:
+        return True
+    if type(a) is not type(b) or a != b:
+        return False
+    try:
+        return pickle.dumps(a, pickle.HIGHEST_PROTOCOL) == pickle.dumps(b, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return False
+
+class incremental_doc:
+    '''
+    Keeps the last version of a doc and what validating it found, so that
+    validating the next version only visits what changed. Subtrees are
+    matched up by where they are (map key, or index in a sequence), so
+    inserting an item early in a long sequence changes everything after it.
+    '''
+    def __init__(self, v):
+        self.validator = v
+        self._root = None
+        # How many nodes the last update() checked, and how many subtrees it
+        # found unchanged.
+        self.visited = 0
+        self.reused = 0
+
+    def update(self, yaml_node, node_xpath='/'):
+        '''
+        Validate a new version of the doc, and return a list of its errors,
+        as validate() would.
+        '''
+        visited = reused = 0
+        log = []
+        top = _record(None)
+        stack = [(self.validator, yaml_node, node_xpath, self._root, top, None)]
+        pop = stack.pop
+        while stack:
+            v, node, xpath, old, parent, key = pop()
+            if v is None:
+                # The end of a container's subtree: (None, record, start, ...).
+                node.errors = log[xpath:]
+                continue
+            if old is not None and _same(old.node, node):
+                reused += 1
+                # Callers fill in where errors are in the text, which may
+                # have moved, so reused errors are copies.
+                log.extend(e.copy() for e in old.errors)
+                # Keep the new version of the subtree, so the old one can go.
+                old.node = node
+                parent.children[key] = old
+                continue
+            visited += 1
+            depth = len(stack)
+            start = len(log)
+            walker = v.check_node(node, xpath, log)
+            if walker:
+                walker(v, node, xpath, stack, log)
+            record = None
+            if parent is not None and type(node) in _container_types:
+                record = parent.children[key] = _record(node)
+            if len(stack) == depth:
+                if record is not None:
+                    record.errors = log[start:]
+                continue
+            old_children = old.children if old is not None and record is not None else None
+            for i in range(depth, len(stack)):
+                child_v, child, child_xpath = stack[i]
+                child_key = (child_v, None if child_xpath is xpath else child_xpath[1:])
+                stack[i] = (child_v, child, child_xpath,
+                    old_children.get(child_key) if old_children else None, record, child_key)
+            if record is not None:
+                stack.insert(depth, (None, record, start, None, None, None))
+        self._root = top.children.get(None)
+        self.visited = visited
+        self.reused = reused
+        return log
@@ -0,0 +1,227 @@
+import yaml, re
+
+from schema_violation import _item_step
+
+# libyaml is an optional dependency of pyyaml. When it's present, its loader
+# is an order of magnitude faster than the pure-python one.
+try:
+    from yaml import CSafeLoader as _libyaml_loader
+except ImportError:
+    _libyaml_loader = None
+
+# Names accepted by parse() and by yaval's --loader option.
+loader_names = ['auto', 'libyaml', 'python', 'json']
+
+def has_libyaml():
+    return _libyaml_loader is not None
+
+def get_yaml_loader(name='auto'):
+    '''
+    Return the yaml loader class for a backend name. "auto" picks libyaml
+    when it is available, and falls back to the pure-python loader.
+    '''
+    if name == 'python':
+        return yaml.SafeLoader
+    if name == 'libyaml':
+        if _libyaml_loader is None:
+            raise ValueError('The libyaml loader was requested, but pyyaml was built without libyaml.')
+        return _libyaml_loader
+    return _libyaml_loader or yaml.SafeLoader
+
+def looks_like_json(text, path=None):
+    '''
+    Guess whether a doc is json. Json is nearly a subset of yaml, and
+    _json_loads() reads it the way yaml does, so a wrong guess costs a
+    failed json parse, not a wrong answer.
+    '''
+    if path and path.lower().endswith('.json'):
+        return True
+    for c in text:
+        if not c.isspace():
+            return c == '{' or c == '['
+    return False
+
+# The numbers that yaml 1.1 (and so pyyaml) reads as floats: those with a
+# ".", and an exponent only if it has a sign. Json's other floats, like 1e5
+# and 1.5e3, are strings in yaml.
+_yaml_float_pat = re.compile(r'-?[0-9]+\.[0-9]*(?:[eE][-+][0-9]+)?$')
+
+def _json_float(text):
+    return float(text) if _yaml_float_pat.match(text) else text
+
+def _json_constant(name):
+    # python's json module accepts these, but they aren't json, and yaml
+    # reads them as strings.
+    raise ValueError('%s is not valid json.' % name)
+
+def _json_loads(text):
+    # Parse json, with numbers read as yaml would read them.
+    import json
+    return json.loads(text, parse_float=_json_float, parse_constant=_json_constant)
+
+def parse(text, path=None, loader='auto'):
+    '''
+    Parse a yaml (or json) doc with the fastest backend that can handle it.
+    '''
+    if loader == 'json':
+        return _json_loads(text)
+    if loader == 'auto' and looks_like_json(text, path):
+        try:
+            return _json_loads(text)
+        except ValueError:
+            # Probably yaml flow style, which only looks like json.
+            pass
+    return yaml.load(text, Loader=get_yaml_loader(loader))
+
+def parse_all(text, path=None, loader='auto'):
+    '''
+    Like parse(), but yield every doc in a yaml stream, one at a time, so
+    that each can be dropped before the next is built. Json is always a
+    single doc.
+    '''
+    if loader == 'json' or (loader == 'auto' and looks_like_json(text, path)):
+        try:
+            yield _json_loads(text)
+            return
+        except ValueError:
+            if loader == 'json':
+                raise
+    yield from yaml.load_all(text, Loader=get_yaml_loader(loader))
+
+# A line that begins a doc. Within a doc, no line can start this way.
+_doc_start_pat = re.compile(r'---(?:\s|$)')
+# A line with nothing for the parser but a comment, directive or doc end.
+_no_content_pat = re.compile(r'\s*(?:#.*)?$|%|\.\.\.(?:\s|$)')
+
+def split_stream(lines, docs_per_chunk):
+    '''
+    Group the lines of a yaml stream into chunks of up to docs_per_chunk
+    docs each, without parsing them, yielding (text, first_doc, doc_count,
+    first_line) for each chunk. first_doc and first_line count from 0. A
+    stream always yields at least one chunk, even if it holds no docs.
+    '''
+    chunk = []
+    first_doc = 0
+    doc_count = 0
+    first_line = 0
+    n = -1
+    for n, line in enumerate(lines):
+        if line.startswith('---') and _doc_start_pat.match(line):
+            if doc_count >= docs_per_chunk:
+                # Directives just before a doc belong to it.
+                held = 0
+                while held < len(chunk) and chunk[-1 - held].startswith('%'):
+                    held += 1
+                split = len(chunk) - held
+                yield ''.join(chunk[:split]), first_doc, doc_count, first_line
+                chunk = chunk[split:]
+                first_doc += doc_count
+                doc_count = 0
+                first_line = n - held
+            doc_count += 1
+        elif first_doc == 0 and doc_count == 0 and not _no_content_pat.match(line):
+            # The first doc may begin without "---".
+            doc_count = 1
+        chunk.append(line)
+    yield ''.join(chunk), first_doc, doc_count, first_line
+
+def count_docs(lines, most=None):
+    '''
+    Count the docs in a yaml stream without parsing it, as split_stream()
+    does, stopping once there are most of them (if most is given).
+    '''
+    doc_count = 0
+    for line in lines:
+        if line.startswith('---') and _doc_start_pat.match(line):
+            doc_count += 1
+        elif doc_count == 0 and not _no_content_pat.match(line):
+            doc_count = 1
+        else:
+            continue
+        if most is not None and doc_count >= most:
+            break
+    return doc_count
+
+class source_map:
+    '''
+    Finds where the nodes of docs are in the text of a yaml stream (or a
+    chunk of one; see split_stream). Parsing for validation keeps no
+    positions, which is what makes it fast; this parses the text again,
+    keeping them, but only once a location is first asked for, so docs that
+    are valid never pay for it.
+    '''
+    def __init__(self, text, loader='auto', first_doc=0, first_line=0):
+        self.text = text
+        self.loader = loader
+        self.first_doc = first_doc
+        self.first_line = first_line
+        self._roots = []
+        self._composer = None
+        # Keys of each mapping node, as python values, by id of the node.
+        self._keys = {}
+
+    def get_root(self, doc_index=0):
+        '''
+        Return the node for a doc in the text (counting from first_doc), or
+        None. Docs are composed in order, as far as needed, and kept.
+        '''
+        i = doc_index - self.first_doc
+        if self._composer is None:
+            self._composer = yaml.compose_all(self.text, Loader=get_yaml_loader(
+                'auto' if self.loader == 'json' else self.loader))
+        try:
+            while len(self._roots) <= i:
+                self._roots.append(next(self._composer))
+        except (StopIteration, yaml.YAMLError, ValueError):
+            # Json that yaml can't read, say; locations just stay unknown.
+            self._composer = iter(())
+            return None
+        return self._roots[i] if i >= 0 else None
+
+    def _children(self, node):
+        keys = self._keys.get(id(node))
+        if keys is None:
+            keys = self._keys[id(node)] = {}
+            constructor = yaml.constructor.SafeConstructor()
+            for key_node, value_node in node.value:
+                try:
+                    keys.setdefault(constructor.construct_object(key_node, deep=True), value_node)
+                except (yaml.YAMLError, TypeError):
+                    # Unhashable or unreadable keys can't be looked up.
+                    pass
+        return keys
+
+    def find_node(self, doc_path, doc_index=0):
+        '''
+        Return the yaml node that a doc path names, or the nearest ancestor
+        of it that can be found, or None.
+        '''
+        steps = []
+        while type(doc_path) is tuple:
+            steps.append(doc_path)
+            doc_path = doc_path[0]
+        node = self.get_root(doc_index)
+        for _, kind, key in reversed(steps):
+            if node is None:
+                break
+            if kind == _item_step:
+                if not isinstance(node, yaml.SequenceNode) or key >= len(node.value):
+                    break
+                node = node.value[key]
+            else:
+                if not isinstance(node, yaml.MappingNode) or key not in self._children(node):
+                    break
+                node = self._children(node)[key]
+        return node
+
+    def locate(self, e):
+        '''
+        Fill in the line and column (1-based, in the whole stream) of a
+        schema_violation, unless they are already known.
+        '''
+        if e.line is not None:
+            return
+        node = self.find_node(e.doc_path, e.doc_index or self.first_doc)
+        if node is not None:
+            e.line = node.start_mark.line + 1 + self.first_line
+            e.column = node.start_mark.column + 1
@@ -0,0 +1,172 @@
+import collections, weakref
+
+from schema_violation import *
+from datatypes import *
+
+# Subtrees with more nodes than this are not worth hashing; they are only
+# recognized when the very same object recurs (a yaml alias, say).
+freeze_limit = 32
+
+# How many misses a validator gets before the memo gives up on it, unless
+# at least a quarter of its lookups hit.
+skip_after = 64
+
+class _too_big(Exception):
+    pass
+
+def _freeze(node):
+    '''
+    Return a hashable value that is equal for two subtrees exactly when they
+    would validate the same way, or None if the subtree is too big or holds
+    something unhashable. Types are part of the value, so 1, 1.0 and True
+    stay distinct; so is key order, since it decides the order of errors.
+    '''
+    t = type(node)
+    if t is map_type and len(node) < freeze_limit:
+        # The common case, a map of scalars, needs no recursion.
+        items = tuple(node.items())
+        try:
+            hash(items)
+            return (t, items, tuple(map(type, node)), tuple(map(type, node.values())))
+        except TypeError:
+            pass
+    budget = [freeze_limit]
+    def walk(x):
+        budget[0] -= 1
+        if budget[0] < 0:
+            raise _too_big()
+        t = type(x)
+        if t is map_type:
+            return (t, tuple((walk(k), walk(item)) for k, item in x.items()))
+        if t is seq_type:
+            return (t, tuple(walk(item) for item in x))
+        hash(x)
+        return (t, x)
+    try:
+        return walk(node)
+    except (_too_big, TypeError):
+        return None
+
+def _rebase(path, old_root, new_root):
+    # Move a doc path from beneath one node to beneath another.
+    steps = []
+    while path is not old_root:
+        steps.append(path)
+        path = path[0]
+    for step in reversed(steps):
+        new_root = (new_root, step[1], step[2])
+    return new_root
+
+def _rebased(e, old_root, new_root):
+    return schema_violation(e.schema, _rebase(e.doc_path, old_root, new_root), e._msg, e.value)
+
+class subtree_memo:
+    '''
+    Remembers the errors found in subtrees, so that a subtree which recurs
+    is validated once and then looked up. A subtree recurs when the same
+    object appears twice in a doc (yaml aliases load that way), or when
+    equal small subtrees appear anywhere, in any doc validated with the same
+    memo: the same defaults block, the same address. Remembered errors are
+    moved to the doc path where the subtree recurs.
+
+    Small subtrees are remembered across docs, up to max_entries of them,
+    least recently used first out. Objects are only recognized by identity
+    within one doc, since python reuses the ids of objects that are gone.
+    '''
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # [hits, misses] for each validator. Nodes checked by validators
+        # whose subtrees rarely recur (each list item's outer map, say) are
+        # not worth hashing, so after a while they are no longer tried.
+        # Weakly keyed, so that a memo kept across schema reloads (by the
+        # daemon) doesn't keep retired validators alive.
+        self.stats = weakref.WeakKeyDictionary()
+
+    def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def _put(self, key, entry):
+        self.entries[key] = entry
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def iter_violations(self, v, yaml_node, node_xpath='/'):
+        '''
+        Do what v.iter_violations() does, consulting and filling the memo.
+        '''
+        identities = {}
+        # The stats of the validators met in this doc, to spare the hot loop
+        # the weak dict's lookups.
+        doc_stats = {}
+        errors = []
+        # Every error yielded while a subtree is open is logged, so that when
+        # the subtree ends, its errors are log[start:].
+        log = []
+        open_subtrees = []
+        stack = [(v, yaml_node, node_xpath)]
+        pop = stack.pop
+        while stack:
+            v, node, xpath = pop()
+            if v is None:
+                # The end of a subtree that was validated the long way.
+                key, root, start, by_identity = open_subtrees.pop()
+                entry = (root, log[start:])
+                if by_identity:
+                    identities[key] = entry
+                else:
+                    self._put(key, entry)
+                if not open_subtrees:
+                    del log[:]
+                continue
+            key = None
+            by_identity = False
+            t = type(node)
+            is_container = t is map_type or t is seq_type
+            # Only regexes cost enough to be worth remembering scalars.
+            if is_container or (t is string_type and v.regex is not None):
+                stats = doc_stats.get(v)
+                if stats is None:
+                    stats = self.stats.get(v)
+                    if stats is None:
+                        stats = self.stats[v] = [0, 0]
+                    doc_stats[v] = stats
+                if stats[1] >= skip_after and stats[0] * 4 < stats[1]:
+                    key = None
+                elif not is_container:
+                    key = (v, t, node)
+                else:
+                    frozen = _freeze(node)
+                    if frozen is None:
+                        key = (v, id(node))
+                        by_identity = True
+                    else:
+                        key = (v, frozen)
+            entry = None
+            if key is not None:
+                entry = identities.get(key) if by_identity else self._get(key)
+                if entry is not None:
+                    self.hits += 1
+                    stats[0] += 1
+                    root, found = entry
+                    for e in found:
+                        errors.append(_rebased(e, root, xpath))
+                else:
+                    self.misses += 1
+                    stats[1] += 1
+                    open_subtrees.append((key, xpath, len(log), by_identity))
+                    stack.append((None, None, None))
+            if entry is None:
+                walker = v.check_node(node, xpath, errors)
+                if walker:
+                    walker(v, node, xpath, stack, errors)
+            if errors:
+                if open_subtrees:
+                    log.extend(errors)
+                yield from errors
+                errors.clear()
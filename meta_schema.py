@@ -0,0 +1,42 @@
+# Generated from yaval_schema.yaml by "python schema.py". Do not edit.
+
+source_hash = '90249d99fcb57cd379df3bcc5ce1d83ae6d52116'
+
+node = {'schema_id': 'b1dcd6d9-9680-4fb7-f569-616758d9b877',
+ 'schema_version': '1.0',
+ 'min_yaval_version': '1.0',
+ 'types': [{'schema_id': {'regex': '/^(?i)[a-f0-9]{8}-?([a-f0-9]{4}-?){3}[a-f0-9]{12}$/'}},
+           {'schema_version': {'regex': '/^(?i)\\d+(\\.\\d+){0,2}(-[-_a-z]+)?$/'}},
+           {'node_def': {'keys': [{'type': 'str'},
+                                  {'items': 'str|node_def'},
+                                  {'keys': 'seq'},
+                                  {'key_type': 'str|node_def'},
+                                  {'value_type': 'str|node_def'},
+                                  {'fields': 'seq'},
+                                  {'required': 'seq'},
+                                  {'regex': 'str'},
+                                  'min',
+                                  'xmin',
+                                  'max',
+                                  'xmax',
+                                  {'max_length': 'int'},
+                                  {'min_length': 'int'},
+                                  {'multiple_of': 'int'},
+                                  {'examples': 'seq'},
+                                  'default',
+                                  {'extras': 'str|node_def'},
+                                  {'description': 'str'},
+                                  {'tags': 'seq'},
+                                  {'tag_defs': 'seq'}]}}],
+ 'yaval_schema': {'keys': [{'schema_id': {'type': 'schema_id'}},
+                           {'schema_version': {'type': 'schema_version'}},
+                           {'min_yaval_version': {'type': 'schema_version'}},
+                           {'tags': {'items': {'type': 'str'}}},
+                           {'tag_defs': {'items': {'key_type': 'str',
+                                                   'value_type': 'str'}}},
+                           {'types': {'items': {'value_type': 'str|node_def',
+                                                'min_length': 1,
+                                                'max_length': 1}}}],
+                  'extras': {'type': 'str|node_def',
+                             'max_length': 1,
+                             'min_length': 1}}}
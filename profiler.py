@@ -0,0 +1,154 @@
+import time
+
+import columnar
+
+class _stats:
+    __slots__ = ('visits', 'self_time', 'cum_time', 'regex_evals', 'violations')
+    def __init__(self):
+        self.visits = 0
+        self.self_time = 0.0
+        self.cum_time = 0.0
+        self.regex_evals = 0
+        self.violations = 0
+
+# How report() can sort its rows.
+sort_keys = ['self', 'cum', 'visits', 'regex', 'violations']
+
+class schema_profile:
+    '''
+    Records, for each schema node, how often it was visited, how long
+    checking its nodes took (cumulative, including descendants, and self),
+    how many values its regex was evaluated on, and how many violations it
+    produced. Validation with a profile runs its own loop (see
+    iter_violations), so validation without one pays nothing for it.
+
+    Values in a long sequence that are checked in bulk (see columnar.py) are
+    not visited one by one; they count toward the sequence's own schema
+    node, except for those that turn out to be invalid.
+    '''
+    def __init__(self):
+        # _stats by validator; see by_xpath() for the same by schema xpath.
+        self.stats = {}
+        # Stacks of validators, from the root of the doc down, are numbered;
+        # stack 0 is empty, and every other is (outer stack, validator).
+        self.stacks = [None]
+        self._stack_ids = {}
+        # Self time by stack number.
+        self.stack_times = {}
+
+    def _get(self, v):
+        s = self.stats.get(v)
+        if s is None:
+            s = self.stats[v] = _stats()
+        return s
+
+    def iter_violations(self, v, yaml_node, node_xpath='/'):
+        '''
+        Do what v.iter_violations() does, timing each node. A memo is not
+        consulted, so that every node is visited and counted.
+        '''
+        clock = time.perf_counter
+        stats = self.stats
+        stacks = self.stacks
+        stack_ids = self._stack_ids
+        stack_times = self.stack_times
+        # How many of each validator's subtrees are open, so that recursive
+        # types don't count their time more than once.
+        open_count = {}
+        # Time spent by the consumer between errors isn't the schema's
+        # fault; subtree start times are kept net of it.
+        paused = 0.0
+        errors = []
+        found = []
+        frames = 0
+        stack = [(v, yaml_node, node_xpath)]
+        pop = stack.pop
+        while stack:
+            v, node, xpath = pop()
+            if v is None:
+                # The end of a subtree: (None, (v, start, outer frames), None).
+                v, start, frames = node
+                n = open_count[v] - 1
+                open_count[v] = n
+                if not n:
+                    stats[v].cum_time += clock() - paused - start
+                continue
+            start = clock()
+            s = stats.get(v) or self._get(v)
+            s.visits += 1
+            if v.regex is not None and (v.accepts_any or type(node) in v.dispatch):
+                s.regex_evals += 1
+            depth = len(stack)
+            walker = v.check_node(node, xpath, errors)
+            if walker:
+                walker(v, node, xpath, stack, errors)
+                if v.batch and v.items.regex is not None and len(stack) - depth < len(node):
+                    # Some items were checked in bulk, and so never visited.
+                    s.regex_evals += len(node)
+            elapsed = clock() - start
+            s.self_time += elapsed
+            key = stack_ids.get((frames, v))
+            if key is None:
+                key = stack_ids[(frames, v)] = len(stacks)
+                stacks.append((frames, v))
+            stack_times[key] = stack_times.get(key, 0.0) + elapsed
+            if len(stack) > depth:
+                # Children were pushed; close the subtree once they're done.
+                stack.insert(depth, (None, (v, start - paused, frames), None))
+                frames = key
+                open_count[v] = open_count.get(v, 0) + 1
+            elif not open_count.get(v):
+                s.cum_time += elapsed
+            if errors:
+                s.violations += len(errors)
+                found.extend(errors)
+                errors.clear()
+                pause = clock()
+                yield from found
+                found.clear()
+                paused += clock() - pause
+
+    def by_xpath(self):
+        '''
+        Return a dict of schema xpath: (visits, cum_time, self_time,
+        regex_evals, violations), with times in seconds.
+        '''
+        result = {}
+        for v, s in self.stats.items():
+            row = (s.visits, s.cum_time, s.self_time, s.regex_evals, s.violations)
+            xpath = v.schema.get_xpath()
+            if xpath in result:
+                row = tuple(a + b for a, b in zip(result[xpath], row))
+            result[xpath] = row
+        return result
+
+    def report(self, top=20, sort='self'):
+        '''
+        Return a table of the top schema nodes, most expensive first.
+        '''
+        column = {'visits': 0, 'cum': 1, 'self': 2, 'regex': 3, 'violations': 4}[sort]
+        rows = sorted(self.by_xpath().items(), key=lambda item: (-item[1][column], item[0]))
+        lines = ['%10s %10s %10s %10s %10s  %s' % ('visits', 'cum ms', 'self ms', 'regex', 'violations', 'schema')]
+        for xpath, (visits, cum_time, self_time, regex_evals, violations) in rows[:top]:
+            lines.append('%10d %10.2f %10.2f %10d %10d  %s' % (visits, cum_time * 1000,
+                self_time * 1000, regex_evals, violations, xpath))
+        return '\n'.join(lines) + '\n'
+
+    def write_collapsed(self, f):
+        '''
+        Write self time by schema stack in the "collapsed" format that
+        flamegraph tools read: frames joined by ;, then a count, which here
+        is microseconds.
+        '''
+        totals = {}
+        for n, seconds in self.stack_times.items():
+            names = []
+            while n:
+                n, v = self.stacks[n]
+                names.append(v.schema.get_xpath().replace(';', ','))
+            key = ';'.join(reversed(names))
+            totals[key] = totals.get(key, 0.0) + seconds
+        for key in sorted(totals):
+            micros = int(round(totals[key] * 1e6))
+            if micros:
+                f.write('%s %d\n' % (key, micros))
@@ -0,0 +1,154 @@
+import re
+
+try:
+    from re import _parser as _sre_parse
+except ImportError:
+    # Before python 3.11.
+    import sre_parse as _sre_parse
+
+# Regexes in schemas are compiled here, once per pattern per process, no
+# matter how many schema nodes (or schemas) use them.
+
+# Global inline flags, like (?i), that python only accepts at the start of a
+# pattern. Scoped flags, like (?i:...), are left alone.
+_inline_flags_pat = re.compile(r'\(\?([aiLmsux]+)\)')
+
+def normalize_regex(pattern):
+    '''
+    Convert a regex as it may be written in a schema into one that python's
+    re module accepts: surrounding /.../ delimiters are removed, and global
+    inline flags are moved to the front.
+    '''
+    if len(pattern) > 1 and pattern[0] == '/' and pattern[-1] == '/':
+        pattern = pattern[1:-1]
+    flags = ''.join(_inline_flags_pat.findall(pattern))
+    if flags:
+        pattern = '(?%s)' % ''.join(sorted(set(flags))) + _inline_flags_pat.sub('', pattern)
+    return pattern
+
+# The engines that can compile schema regexes. re2 (the google-re2 package)
+# runs in time linear in the length of the value, so a schema from someone
+# else can't make validation backtrack for minutes; it doesn't support
+# backreferences or lookaround, and schemas that use them fail to load.
+regex_backends = ['re', 're2']
+regex_backend = 're'
+_re2 = None
+
+def set_regex_backend(name):
+    '''
+    Choose the engine that compiles regexes from now on.
+    '''
+    global regex_backend, _re2
+    if name not in regex_backends:
+        raise ValueError('Unknown regex engine %r.' % name)
+    if name == 're2' and _re2 is None:
+        try:
+            import re2 as _re2
+        except ImportError:
+            raise ValueError('The re2 regex engine was requested, but the re2 module is not installed.')
+    regex_backend = name
+
+class literal_regex:
+    '''
+    Stands in for a compiled regex that can only match a whole value from a
+    short list, like ^(yes|no)$. search() is then a set lookup, which is
+    several times faster than running the regex; it returns a bool rather
+    than a match.
+    '''
+    __slots__ = ('pattern', 'flags', 'strings', 'search')
+
+    def __init__(self, pattern, flags, strings):
+        self.pattern = pattern
+        self.flags = flags
+        self.strings = frozenset(strings)
+        self.search = self.strings.__contains__
+
+    def __reduce__(self):
+        return (literal_regex, (self.pattern, self.flags, self.strings))
+
+# Patterns that stand for more strings than this are left to the engine.
+literal_max = 64
+
+def _literal_strings(items):
+    # The strings that a parsed (sub)pattern matches, or None if it isn't
+    # made only of literals, classes of literals, groups and alternatives.
+    result = ['']
+    for op, av in items:
+        if op is _sre_parse.LITERAL:
+            options = [chr(av)]
+        elif op is _sre_parse.IN:
+            if any(item_op is not _sre_parse.LITERAL for item_op, c in av):
+                return None
+            options = [chr(c) for item_op, c in av]
+        elif op is _sre_parse.BRANCH:
+            options = []
+            for branch in av[1]:
+                strings = _literal_strings(branch)
+                if strings is None:
+                    return None
+                options.extend(strings)
+        elif op is _sre_parse.SUBPATTERN:
+            group, add_flags, del_flags, sub = av
+            if add_flags or del_flags:
+                return None
+            options = _literal_strings(sub)
+            if options is None:
+                return None
+        else:
+            return None
+        result = [a + b for a in result for b in options]
+        if len(result) > literal_max:
+            return None
+    return result
+
+_start_anchors = (_sre_parse.AT_BEGINNING, _sre_parse.AT_BEGINNING_STRING)
+_end_anchors = (_sre_parse.AT_END, _sre_parse.AT_END_STRING)
+
+def _as_literal(pattern):
+    # A literal_regex that does what the pattern does, or None.
+    try:
+        parsed = _sre_parse.parse(pattern)
+    except re.error:
+        return None
+    # Case folding and per-line anchors break the equivalence with a set.
+    if parsed.state.flags & (re.IGNORECASE | re.MULTILINE | re.LOCALE):
+        return None
+    items = list(parsed)
+    if len(items) < 2 or items[0] not in [(_sre_parse.AT, a) for a in _start_anchors] \
+            or items[-1] not in [(_sre_parse.AT, a) for a in _end_anchors]:
+        return None
+    strings = _literal_strings(items[1:-1])
+    if strings is None:
+        return None
+    if items[-1][1] is _sre_parse.AT_END:
+        # Without MULTILINE, $ also matches just before a final newline.
+        strings = strings + [s + '\n' for s in strings]
+    return literal_regex(pattern, parsed.state.flags, strings)
+
+# Compiled regexes by (engine, pattern as written). Once full, the oldest
+# entries are dropped.
+regex_cache_size = 512
+_cache = {}
+
+def compile_regex(pattern):
+    '''
+    Return a compiled regex for a pattern as written in a schema, sharing
+    one per pattern. A ValueError describes patterns that don't compile.
+    '''
+    key = (regex_backend, pattern)
+    r = _cache.get(key)
+    if r is None:
+        normalized = normalize_regex(pattern)
+        r = _as_literal(normalized)
+        if r is None:
+            try:
+                if regex_backend == 're2':
+                    r = _re2.compile(normalized)
+                else:
+                    r = re.compile(normalized)
+            except Exception as e:
+                raise ValueError('Regex /%s/ is not valid: %s.' % (pattern, e))
+        while len(_cache) >= regex_cache_size:
+            del _cache[next(iter(_cache))]
+        _cache[key] = r
+    return r
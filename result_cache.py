@@ -0,0 +1,89 @@
+import os, json, hashlib, tempfile
+
+from schema_cache import get_cache_dir
+
+def _hash_file(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def _stat_key(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+class result_cache:
+    '''
+    Remembers which docs validated cleanly against a particular compiled
+    schema, so unchanged docs can be skipped on later runs. A doc counts as
+    unchanged if its mtime and size match what was recorded, or failing
+    that, if its content hash does. Only clean results are remembered;
+    docs with errors are always validated again, so their errors are
+    reported every time.
+    '''
+    def __init__(self, fingerprint, cache_dir=None):
+        self.path = os.path.join(cache_dir or get_cache_dir(), 'results', fingerprint + '.json')
+        self.entries = {}
+        self.dirty = False
+        # Stat and hash info gathered by is_known_valid(), for record().
+        self._pending = {}
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+        except Exception:
+            pass
+
+    def is_known_valid(self, doc_path):
+        key = os.path.abspath(doc_path)
+        try:
+            mtime, size = _stat_key(doc_path)
+        except OSError:
+            return False
+        entry = self.entries.get(key)
+        if entry and entry[0] == mtime and entry[1] == size:
+            return True
+        content_hash = _hash_file(doc_path)
+        self._pending[key] = [mtime, size, content_hash]
+        if entry and entry[2] == content_hash:
+            # Touched but not changed; remember the new mtime.
+            self.entries[key] = self._pending.pop(key)
+            self.dirty = True
+            return True
+        return False
+
+    def record(self, doc_path, valid):
+        key = os.path.abspath(doc_path)
+        pending = self._pending.pop(key, None)
+        if valid and pending:
+            # If the doc changed while it was being validated, the result
+            # doesn't describe the content we hashed.
+            try:
+                if list(_stat_key(doc_path)) != pending[:2]:
+                    return
+            except OSError:
+                return
+            self.entries[key] = pending
+            self.dirty = True
+        elif not valid and key in self.entries:
+            del self.entries[key]
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        folder = os.path.dirname(self.path)
+        try:
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            fd, tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(self.entries, f)
+                os.replace(tmp, self.path)
+            except Exception:
+                os.remove(tmp)
+                raise
+            self.dirty = False
+        except Exception:
+            pass
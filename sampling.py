@@ -0,0 +1,104 @@
+import math
+
+from schema_violation import format_doc_path
+
+# Sampling checks only some of the items of long sequences, for a quick
+# (but not conclusive) answer about huge docs. A sequence of more than
+# min_length items has a random sample of them checked, always including
+# its first and last; checks on the sequence itself (its length, say) are
+# made as usual. Samples are reproducible: each sequence's is drawn from the
+# seed and the sequence's path in the doc.
+
+# Sequences of this many items or fewer are checked in full.
+default_min_length = 1000
+
+def parse_sample(text):
+    '''
+    Parse a sample size as written on the command line: a share of the
+    items, like 0.01, or a number of items, like 500. Return (rate, count),
+    one of which is None. Raise ValueError if text is neither.
+    '''
+    try:
+        count = int(text)
+    except ValueError:
+        try:
+            rate = float(text)
+        except ValueError:
+            raise ValueError('%r is neither a rate (like 0.01) nor a number of items (like 500).' % text)
+        if not 0 < rate <= 1:
+            raise ValueError('A sample rate must be more than 0, and no more than 1.')
+        return rate, None
+    if count < 1:
+        raise ValueError('A sample must be at least 1 item.')
+    return None, count
+
+class sampler:
+    '''
+    Picks which items of a long sequence to check: a share of them (rate),
+    or a number of them (count). Keeps count of what it picked.
+    '''
+    def __init__(self, rate=None, count=None, seed=0, min_length=default_min_length):
+        self.rate = rate
+        self.count = count
+        self.seed = seed
+        self.min_length = min_length
+        self.sequences = 0
+        self.total = 0
+        self.checked = 0
+
+    def pick(self, n, doc_path):
+        '''
+        Return the sorted indices of the items to check in the sequence of n
+        items at doc_path, or None if every item should be checked.
+        '''
+        if n <= self.min_length:
+            return None
+        k = self.count if self.count is not None else int(math.ceil(self.rate * n))
+        # The first and last are always among them.
+        k = max(k, 2)
+        self.sequences += 1
+        self.total += n
+        if k >= n:
+            self.checked += n
+            return None
+        self.checked += k
+        import random
+        rng = random.Random('%s:%s' % (self.seed, format_doc_path(doc_path)))
+        return [0] + sorted(rng.sample(range(1, n - 1), k - 2)) + [n - 1]
+
+    def take(self):
+        '''
+        Return (sequences, total, checked): how many long sequences were
+        sampled since the last call, how many items they had, and how many
+        of those were picked. Then start counting again.
+        '''
+        counts = (self.sequences, self.total, self.checked)
+        self.sequences = self.total = self.checked = 0
+        return counts
+
+def sample_validators(v, s):
+    '''
+    Return a copy of validator v, and of every validator it leads to, that
+    checks the items of long sequences that sampler s picks, rather than all
+    of them. v itself is unchanged.
+    '''
+    import copy
+    copies = {}
+    def sampled(v):
+        if v is None:
+            return None
+        if v in copies:
+            return copies[v]
+        c = copies[v] = copy.copy(v)
+        c.sample = s
+        if v.keys:
+            c.keys = dict((name, sampled(child)) for name, child in v.keys.items())
+        if v.fields:
+            c.fields = tuple(sampled(child) for child in v.fields)
+        c.items = sampled(v.items)
+        c.key_type = sampled(v.key_type)
+        c.value_type = sampled(v.value_type)
+        c.extras = sampled(v.extras)
+        c.ref = sampled(v.ref)
+        return c
+    return sampled(v)
@@ -1,49 +1,231 @@
-import os, re, yaml
+import os, sys, re, weakref
 
 from schema_violation import *
 from datatypes import *
+from validator import *
+from loaders import *
+from regexes import *
 
-schema_id_pat = re.compile(r'^(?i)[a-f0-9]{8}-?([a-f0-9]{4}-?){3}[a-f0-9]{12}$')
-schema_version_pat = re.compile(r'^(?i)\d+(\.\d+){0,2}(-[-_a-z]+)?$')
+schema_id_pat = re.compile(r'(?i)^[a-f0-9]{8}-?([a-f0-9]{4}-?){3}[a-f0-9]{12}$')
+schema_version_pat = re.compile(r'(?i)^\d+(\.\d+){0,2}(-[-_a-z]+)?$')
 yaval_schema_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yaval_schema.yaml')
+# A copy of the meta-schema as python data, which loads faster than the yaml.
+# Regenerate it with "python schema.py" after editing yaval_schema.yaml.
+embedded_meta_schema_path = os.path.join(os.path.dirname(yaval_schema_path), 'meta_schema.py')
+
+# Bump this whenever a change to yaval alters what a compiled schema holds
+# or how it behaves; cached compiled schemas from other versions are ignored.
+yaval_version = '1.0.0'
 
 _not_yet_inited = 'nOt yEt iNiTeD'
+_resolving = 'rEsOlViNg'
+
+# The keys that may appear in a node_def, per yaval_schema.yaml.
+_node_def_keys = frozenset(['type', 'items', 'keys', 'key_type', 'value_type',
+    'fields', 'required', 'regex', 'min', 'xmin', 'max', 'xmax', 'max_length',
+    'min_length', 'multiple_of', 'examples', 'default', 'extras', 'description',
+    'tags', 'tag_defs'])
+
+# The keys at the top of a full schema doc that describe the schema itself,
+# rather than the top-level construct of docs that the schema validates.
+_doc_metadata_keys = frozenset(['schema_id', 'schema_version',
+    'min_yaval_version', 'tags', 'tag_defs', 'types'])
+
+def _iter_member_defs(members):
+    if is_map(members):
+        for name, value in members.items():
+            yield name, value
+    elif is_seq(members):
+        for member in members:
+            if is_map(member) and len(member) == 1:
+                for name, value in member.items():
+                    yield name, value
+            elif is_scalar(member):
+                yield member, None
+
+def _intern(name):
+    return sys.intern(name) if type(name) is str else name
 
 class schema:
+    # Big schemas have tens of thousands of nodes, and each worker process
+    # holds a copy, so nodes keep no __dict__. A node's parent is a weakref
+    # (its children are kept by the parent); once compiled, validation only
+    # needs each node's xpath, which is built up front. Every node below the
+    # top of a schema doc holds the top itself, though, and the top holds
+    # every node, so a node (or its validator) that outlives the schema it
+    # came from keeps that schema's parents and named types alive with it.
+    __slots__ = ('name', '_parent', '_top', 'node', '_xpath', '_expected_types',
+        '_implied_type_map', '_regex', '_validator', '_root', '_types',
+        '_types_schema', '_type_problem', '_tag_index', '_children', '_extras',
+        '__weakref__')
+
     def __init__(self, name, node_from_schema_yaml, parent=None):
-        self.name = name
-        self.parent = None
+        self.name = _intern(name)
+        self._parent = weakref.ref(parent) if parent else None
+        self._top = (parent._top or parent) if parent else None
+        self.node = node_from_schema_yaml
         if parent:
-            self.parent = parent
+            self._xpath = sys.intern('%s/%s' % (parent._xpath, self.name))
         else:
-            self._node_root = node_from_schema_yaml            
-        self.node = node_from_schema_yaml
+            self._xpath = sys.intern('schema:%s' % self.name)
         self._expected_types = _not_yet_inited
         self._implied_type_map = None
         self._regex = _not_yet_inited
-        
+        self._validator = None
+        self._root = _not_yet_inited
+        self._types = None
+        self._types_schema = None
+        self._type_problem = None
+        self._tag_index = None
+        self._children = None
+        self._extras = None
+
+    @property
+    def parent(self):
+        return self._parent() if self._parent else None
+
+    def __getstate__(self):
+        # Weakrefs can't be pickled, so the parent itself is.
+        state = dict((name, getattr(self, name)) for name in schema.__slots__
+            if name != '__weakref__')
+        state['_parent'] = self.parent
+        return state
+
+    def __setstate__(self, state):
+        parent = state.pop('_parent')
+        self._parent = weakref.ref(parent) if parent else None
+        for name, value in state.items():
+            setattr(self, name, _intern(value) if name in ('name', '_xpath') else value)
+
     def get_xpath(self):
-        if self.parent:
-            return '%s/%s' % (self.parent().get_xpath(), self.name)
-        else:
-            return 'schema:%s' % self.name
-        
+        return self._xpath
+
     def children(self):
-        node = self.node
-        if not hasattr(node, 'children'):
-            return
-        contains = node['children']
-        for key, value in contains.iteritems():
-            yield schema(key, value, self)
+        '''
+        Return a schema for each member declared in "keys" or "fields". Members
+        are listed either as a bare name (any value is acceptable) or as a
+        single-key map of name: node_def. They are made once, and kept.
+        '''
+        if self._children is None:
+            self._children = tuple(schema(name, value, self)
+                for key in self.has_def_for(['keys', 'fields'])
+                for name, value in _iter_member_defs(self.node[key]))
+        return self._children
 
     def extra_schemas(self):
-        node = self.node
-        if not hasattr(node, 'contains'):
-            return
-        contains = node['contains']
-        for key, value in contains.iteritems():
-            yield schema(key, value, self)
-            
+        '''
+        Return a schema for each of "items", "key_type", "value_type" and
+        "extras" that this schema defines. Each is named for the key that
+        introduced it.
+        '''
+        if self._extras is None:
+            self._extras = tuple(schema(key, self.node[key], self)
+                for key in self.has_def_for(['items', 'key_type', 'value_type', 'extras']))
+        return self._extras
+
+    def is_doc(self):
+        '''
+        Is this the top of a full schema doc (with schema_id, types, and so
+        forth), rather than a simple node_def?
+        '''
+        if self.parent or not is_map(self.node):
+            return False
+        for key in self.node:
+            if key not in _node_def_keys:
+                return True
+        return False
+
+    def get_root(self):
+        '''
+        Return the schema for the top-level construct that a doc must match.
+        For a node_def, this is the schema itself. For a full schema doc, it
+        is the one key besides the metadata keys. If a full schema doc does
+        not have exactly one such key, return None.
+        '''
+        if self._root is _not_yet_inited:
+            self._root = self
+            if self.is_doc():
+                roots = [k for k in self.node if k not in _doc_metadata_keys]
+                if len(roots) == 1:
+                    self._root = schema(roots[0], self.node[roots[0]], self)
+                else:
+                    self._root = None
+        return self._root
+
+    def get_types(self):
+        '''
+        Return the symbol table of named types declared in the "types" section
+        of the schema doc that this schema belongs to, as a dict of name:
+        schema. The table is built once, at the top of the schema, and shared
+        by every node beneath it; so is each named type's compiled validator.
+        '''
+        top = self._top or self
+        if top._types is None:
+            top._types = {}
+            if top.is_doc() and is_seq(top.node.get('types')):
+                types_schema = top._types_schema = schema('types', top.node['types'], top)
+                for name, value in _iter_member_defs(top.node['types']):
+                    top._types[name] = schema(name, value, types_schema)
+        return top._types
+
+    def find_named_type(self, name):
+        if not is_string(name) or name in python_types_for_name:
+            return None
+        return self.get_types().get(name)
+
+    def _types_for_name(self, name):
+        '''
+        Return the list of built-in type names that a type name stands for,
+        or None if the name imposes no type constraint. A name may join
+        alternatives with |. Names that are part of a cycle, or that don't
+        resolve, are described in self._type_problem for the validator to
+        report.
+        '''
+        if not name:
+            # A bare tag like !!str, with no value.
+            return None
+        if not is_string(name):
+            self._type_problem = 'Type %s is not a type name.' % repr(name)
+            return []
+        types = []
+        named_count = 0
+        for alt in name.split('|'):
+            alt = alt.strip()
+            named = self.find_named_type(alt)
+            if named is None:
+                if alt not in python_types_for_name:
+                    self._type_problem = 'Type "%s" is not a built-in type or a named type in this schema.' % alt
+                    return []
+                alt_types = [alt]
+            elif named._expected_types is _resolving:
+                self._type_problem = 'Type "%s" is defined in terms of itself.' % alt
+                return []
+            else:
+                named_count += 1
+                alt_types = named.get_expected_types()
+                if named._type_problem:
+                    self._type_problem = named._type_problem
+                    return []
+                if alt_types is None:
+                    return None
+            types.extend(t for t in alt_types if t not in types)
+        if named_count > 1:
+            self._type_problem = 'Type "%s" names more than one named type; only one is allowed.' % name
+            return []
+        return types
+
+    def get_type_ref(self):
+        '''
+        If this schema refers to a named type (either as its entire definition,
+        or with the "type" key), return the schema for that type.
+        '''
+        name = self.node if is_string(self.node) else self.get_def_for('type')
+        if is_string(name):
+            for alt in name.split('|'):
+                named = self.find_named_type(alt.strip())
+                if named is not None:
+                    return named
+
     def has_def_for(self, keys):
         '''
         Does this schema have a definition for any key in a certain list?
@@ -58,7 +240,7 @@ class schema:
     def get_regex(self):
         if self._regex == _not_yet_inited:
             r = self.get_def_for('regex')
-            if r: r = re.compile(r)
+            if r: r = compile_regex(r)
             self._regex = r
         return self._regex
                    
@@ -66,19 +248,22 @@ class schema:
         '''
         Return a list of the type names that this schema expects/accepts.
         Normally list will contain a single string like 'str' or 'map'.
-        However, it may contain the name of another schema node (e.g., 'email'
-        might refer to a node in the schema that defines email addresses), or
-        it may be an empty list if no datatypes are compatible with the set
-        of properties in the schema; this would indicate a bad schema. In such
-        cases, self._impled_type_map will contain diagnostic info. The function
+        Names of types in the schema's "types" section (e.g., 'email' might
+        refer to a node that defines email addresses) are resolved to the
+        built-in types that they expect. The list may be empty if no datatypes
+        are compatible with the set of properties in the schema; this would
+        indicate a bad schema. In such cases, self._impled_type_map (or, for
+        type names that can't be resolved, self._type_problem) will contain
+        diagnostic info. The function
         may also return None if the schema imposes no constraints on the type
         of the yaml node it validates.
         '''
         if self._expected_types == _not_yet_inited:
             # The common case at leaf nodes is a simple declaration of datatype.
             # No further analysis is needed for this case.
+            self._expected_types = _resolving
             if is_string(self.node):
-                self._expected_types = [self.node]
+                self._expected_types = self._types_for_name(self.node)
             else:
                 # First, figure out which types are implied by which properties.
                 # There are faster ways to narrow down to a single type, but this
@@ -97,21 +282,28 @@ class schema:
                 check_for('fields', ['tuple'])
                 check_for('multiple_of', ['int'])
                 if self.has_def_for('type'):
-                    x['type'] = [self.node['type']]
+                    types = self._types_for_name(self.node['type'])
+                    if types is not None:
+                        x['type'] = types
                 if self.has_def_for('default'):
                     x['default'] = [get_simple_type_name(self.node['default'])]
                 check_for(['max', 'min', 'xmax', 'xmin'], ['int', 'float', 'date'])
                 check_for(['min_length', 'max_length'], ['str', 'seq', 'map', 'tuple'])
                 check_for('extras', ['map', 'seq', 'tuple'])
+                check_for(['key_type', 'value_type'], ['map'])
+                check_for('required', ['map', 'tuple'])
                 self._implied_type_map = x
                 if not x:
                     self._expected_types = None
                 else:
-                    keys = x.keys()
+                    keys = list(x.keys())
                     intersect = x[keys[0]]
-                    for i in xrange(1,len(keys)):
+                    for i in range(1,len(keys)):
                         intersect = [k for k in intersect if k in x[keys[i]]]
                     self._expected_types = sorted(intersect) # sort for consistency
+                if self._expected_types:
+                    # The map only explains a conflict; there isn't one.
+                    self._implied_type_map = None
         return self._expected_types
         
     def get_def_for(self, key):
@@ -122,65 +314,131 @@ class schema:
                 print(str(self.node))
                 raise
             
+    def compile(self):
+        '''
+        Return a validator that embodies everything this schema checks. The
+        validator is built on first request and reused thereafter.
+        '''
+        if self._validator is None:
+            root = self.get_root()
+            ref = self.find_named_type(self.node)
+            if root is not self and root is not None:
+                self._validator = root.compile()
+            elif ref is not None and ref is not self:
+                # A bare reference to a named type shares its validator.
+                self._validator = ref.compile()
+            else:
+                # Store the validator before building it, so that recursive
+                # named types find it instead of compiling themselves again.
+                self._validator = validator(self)
+                self._validator.build()
+        return self._validator
+
+    def get_tag_index(self):
+        '''
+        Return a dict of schema xpath: the set of tags in effect at that
+        schema node, taking + and - prefixes and the tags of the whole schema
+        doc into account. It is worked out once, from the compiled schema.
+        '''
+        if self._tag_index is None:
+            from tags import tag_index, doc_tags
+            self._tag_index = tag_index(self.compile(), doc_tags(self))
+        return self._tag_index
+
+    def select_tags(self, only=(), skip=()):
+        '''
+        Return a copy of this schema that only checks the schema nodes that
+        have one of the tags in only (if any are given) and none of the tags
+        in skip. This schema is unchanged.
+        '''
+        import copy
+        from tags import prune_to_tags, doc_tags
+        v = prune_to_tags(self.compile(), only, skip, doc_tags(self))
+        if v is None:
+            # Nothing is selected, so there is nothing to check.
+            v = validator(self)
+            v.built = True
+        selected = copy.copy(self)
+        selected._validator = v
+        return selected
+
+    def sample(self, s):
+        '''
+        Return a copy of this schema that only checks the items of long
+        sequences that sampler s picks (see sampling.py). This schema is
+        unchanged.
+        '''
+        import copy
+        from sampling import sample_validators
+        sampled = copy.copy(self)
+        sampled._validator = sample_validators(self.compile(), s)
+        return sampled
+
     def self_validate(self):
-        with open(yaval_schema_path, 'r') as f:
-            yaval_schema = yaml.load(f.read())
-        self.validate(yaval_schema, self.node)
+        return get_meta_schema().validate(self.node)
         
-    def validate(self, yaml_node, node_xpath='/'):
+    def validate(self, yaml_node, node_xpath='/', max_errors=None, memo=None, profile=None):
         '''
         Compare a node in a yaml doc/stream to a schema, and return a list of
         errors. An empty list means the yaml is valid according to the schema.
+        If max_errors is given, stop looking once that many have been found.
         '''
-        errors = []
-        # Convenience methods to unclutter code...
-        ae = lambda msg: errors.append(schema_violation(self, node_xpath, msg, yaml_node))
-        d = lambda key: self.get_def_for(key)
-        expected = self.get_expected_types()
-        actual = get_simple_type_name(yaml_node)
-        has_type_error = False
-        if expected is None:
-            pass
-        elif not expected:
-            msg = 'No type fits all the properties specified in the schema:'
-            for key in self._implied_type_map:
-                msg += '\n    - %s implies type %s' % (key, '|'.join(self._implied_type_map[key]))
-            ae(msg)
-            has_type_error = True
-        elif actual not in expected:
-            expected = '|'.join(expected)
-            ae('Expected node type to be %s, not %s.' % (expected, actual))
-            has_type_error = True
-        # Make sure types resolve.
-        if not has_type_error:
-            pass
-        
-        # If the type isn't right, many of our validation tests are useless. For
-        # example, we can't test a regex against a value that's not a string.
-        # Only do the next block of tests if they are likely to add value.
-        if not has_type_error:
-            r = self.get_regex()
-            if r and (not r.search(yaml_node)):
-                ae('Value "%s" does not match regex /%s/.' % (yaml_node, r.pattern))
-            n = d('multiple_of')
-            if n and (yaml_node % n != 0):
-                ae('Value is not a multiple of %d.' % n)
-            n = d('max')
-            if (n is not None) and (yaml_node > n):
-                ae('Value is greater than max (%s).' % n)
-            n = d('xmax')
-            if (n is not None) and (yaml_node >= n):
-                ae('Value is greater than or equal to xmax (%s).' % n)
-            n = d('min')
-            if (n is not None) and (yaml_node < n):
-                ae('Value is less than min (%s)' % n)
-            n = d('xmin')
-            if (n is not None) and (yaml_node <= n):
-                ae('Value is less than or equal to xmin (%s).' % n)
-            n = d('max_length')
-            if (n is not None) and (len(yaml_node) > n):
-                ae('Length of %d is greater than max_length (%s).' % (len(yaml_node), n))
-            n = d('min_length')
-            if (n is not None) and (len(yaml_node) < n):
-                ae('Length of %d is less than min_length (%s).' % (len(yaml_node), n))
-        return errors
+        return self.compile().validate(yaml_node, node_xpath, max_errors, memo, profile)
+
+    def iter_violations(self, yaml_node, node_xpath='/', memo=None, profile=None):
+        '''
+        Like validate(), but yield errors one at a time, as they are found.
+        '''
+        return self.compile().iter_violations(yaml_node, node_xpath, memo, profile)
+
+_meta_schema_hash = None
+def get_meta_schema_hash():
+    '''
+    Return a hash of the text of yaval_schema.yaml.
+    '''
+    global _meta_schema_hash
+    if _meta_schema_hash is None:
+        import hashlib
+        with open(yaval_schema_path, 'rb') as f:
+            _meta_schema_hash = hashlib.sha1(f.read()).hexdigest()
+    return _meta_schema_hash
+
+def _get_embedded_meta_schema():
+    # The node from meta_schema.py, or None if that is missing or was
+    # generated from a different yaval_schema.yaml.
+    try:
+        import meta_schema
+    except ImportError:
+        return None
+    if getattr(meta_schema, 'source_hash', None) != get_meta_schema_hash():
+        return None
+    return meta_schema.node
+
+_meta_schema = None
+def get_meta_schema():
+    '''
+    Return the schema for yaval schemas, loading it on first request.
+    '''
+    global _meta_schema
+    if _meta_schema is None:
+        node = _get_embedded_meta_schema()
+        if node is None:
+            with open(yaval_schema_path, 'r') as f:
+                node = parse(f.read(), yaval_schema_path)
+        _meta_schema = schema('yaval', node)
+    return _meta_schema
+
+def write_embedded_meta_schema(path=embedded_meta_schema_path):
+    '''
+    Write yaval_schema.yaml, parsed, as a python module.
+    '''
+    import pprint
+    with open(yaval_schema_path, 'r') as f:
+        node = parse(f.read(), yaval_schema_path)
+    with open(path, 'w') as f:
+        f.write('# Generated from yaval_schema.yaml by "python schema.py". Do not edit.\n\n')
+        f.write('source_hash = %r\n\n' % get_meta_schema_hash())
+        f.write('node = %s\n' % pprint.pformat(node, sort_dicts=False))
+
+if __name__ == '__main__':
+    write_embedded_meta_schema()
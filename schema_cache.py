@@ -0,0 +1,95 @@
+import os, re, sys, pickle, hashlib
+
+from schema import *
+import regexes
+
+_schema_id_line_pat = re.compile(r'^schema_id:\s*["\']?([-A-Za-z0-9]+)', re.M)
+_schema_version_line_pat = re.compile(r'^schema_version:\s*["\']?([-_.A-Za-z0-9]+)', re.M)
+_unsafe_chars_pat = re.compile(r'[^-_.A-Za-z0-9]')
+
+def get_cache_dir():
+    '''
+    Return the folder where yaval caches things between runs, following
+    the XDG convention ($XDG_CACHE_HOME/yaval, or ~/.cache/yaval).
+    '''
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'yaval')
+
+# Bump this whenever the attributes of compiled schemas or validators
+# change, so entries pickled by older code are not reused.
+compiled_format = 8
+
+def get_schema_fingerprint(schema_text):
+    '''
+    Return a hash that changes whenever the schema text, the meta-schema, the
+    yaval version, the compiled format, the python version or the regex
+    engine changes--that is, whenever a compiled form of the schema might
+    differ.
+    '''
+    h = hashlib.sha1()
+    for part in [yaval_version, str(compiled_format), '%d.%d' % sys.version_info[:2],
+            get_meta_schema_hash(), regexes.regex_backend, schema_text]:
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def _get_id_and_version(schema_text):
+    # Only used to name cache files, so a cheap scan of top-level lines is
+    # enough; it saves parsing the yaml just to find a cache entry.
+    m = _schema_id_line_pat.search(schema_text)
+    schema_id = m.group(1).lower() if m else 'noid'
+    m = _schema_version_line_pat.search(schema_text)
+    version = m.group(1) if m else 'nover'
+    return _unsafe_chars_pat.sub('_', schema_id), _unsafe_chars_pat.sub('_', version)
+
+def get_cache_path(schema_text, cache_dir=None):
+    schema_id, version = _get_id_and_version(schema_text)
+    return os.path.join(cache_dir or get_cache_dir(), 'schemas',
+        '%s-%s-%s.pickle' % (schema_id, version, get_schema_fingerprint(schema_text)))
+
+def load_cached_schema(schema_text, cache_dir=None):
+    '''
+    Return the compiled schema cached for schema_text, or None if there is
+    no usable cache entry.
+    '''
+    path = get_cache_path(schema_text, cache_dir)
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        # Missing, unreadable, truncated, or from incompatible code: all of
+        # these just mean we have to compile again.
+        return None
+
+def store_cached_schema(schema_text, compiled_schema, cache_dir=None):
+    '''
+    Cache a schema that has already been validated and compiled. Entries for
+    other content with the same schema_id and schema_version are removed,
+    since they can no longer match. (Schemas without a schema_id can't be
+    told apart this way, so they are never pruned.) Failures are ignored; the
+    cache is an optimization, not a requirement.
+    '''
+    import glob, tempfile
+    compiled_schema.compile()
+    path = get_cache_path(schema_text, cache_dir)
+    folder = os.path.dirname(path)
+    try:
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        prefix = os.path.basename(path).rsplit('-', 1)[0]
+        if not prefix.startswith('noid-'):
+            for stale in glob.glob(os.path.join(folder, glob.escape(prefix) + '-*.pickle')):
+                if stale != path:
+                    os.remove(stale)
+        # Write to a temp file and rename, so concurrent runs never see a
+        # partially written entry.
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(compiled_schema, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except Exception:
+            os.remove(tmp)
+            raise
+    except Exception:
+        pass
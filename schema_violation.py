@@ -2,27 +2,96 @@ from datatypes import *
 
 _no_value_provided = 'nO VaLuE PrOvIdEd'
 
+# A doc path is either a string (the xpath of the node where validation
+# began), or a tuple of (parent path, step kind, key or index) that names a
+# node beneath it. Building a tuple per node is much cheaper than formatting
+# a string per node, and most paths are never needed as text.
+_key_step = 0
+_item_step = 1
+
+def child_doc_path(parent, key):
+    return (parent, _key_step, key)
+
+def item_doc_path(parent, i):
+    return (parent, _item_step, i)
+
+def format_doc_path(path):
+    '''
+    Return the xpath text for a doc path, like /a/b[2].
+    '''
+    steps = []
+    while type(path) is tuple:
+        steps.append(path)
+        path = path[0]
+    text = path
+    for _, kind, key in reversed(steps):
+        if kind == _item_step:
+            text = '%s[%d]' % ('/' if text == '/' else text, key)
+        elif text == '/':
+            text = '/%s' % (key,)
+        else:
+            text = '%s/%s' % (text, key)
+    return text
+
 class schema_violation:
     '''
     A validation_error is a single problem discovered during schema-based
-    validation of a yaml doc.
+    validation of a yaml doc. It holds references to what went wrong (the
+    schema, a doc path, the value) and only formats them as text when asked;
+    docs with many problems are often reported only in part, or not at all.
     '''
+    # Where the problem is in the doc's text (1-based), when that's known.
+    line = None
+    column = None
+    # Which doc in a multi-doc stream (from 0), when there are several.
+    doc_index = None
+
     def __init__(self, schema_xpath, doc_xpath, msg, value=_no_value_provided):
-        # Allow schema_xpath to be either a schema object or a string.
-        if hasattr(schema_xpath, 'get_xpath'):
-            schema_xpath = schema_xpath.get_xpath()
-        self.schema_xpath = schema_xpath
-        self.doc_xpath = doc_xpath
-        self.msg = msg
-        text = 'Doc:%s' % doc_xpath
-        if value != _no_value_provided:
+        # Allow schema_xpath to be either a schema object or a string, and
+        # doc_xpath to be either a string or a doc path tuple. msg may be a
+        # string, or a (template, args) tuple.
+        self.schema = schema_xpath
+        self.doc_path = doc_xpath
+        self._msg = msg
+        self.value = value
+
+    def copy(self):
+        '''
+        Return the same violation, without the line, column or doc index
+        that may have been filled in for it.
+        '''
+        return schema_violation(self.schema, self.doc_path, self._msg, self.value)
+
+    @property
+    def schema_xpath(self):
+        if hasattr(self.schema, 'get_xpath'):
+            return self.schema.get_xpath()
+        return self.schema
+
+    @property
+    def doc_xpath(self):
+        return format_doc_path(self.doc_path)
+
+    @property
+    def msg(self):
+        msg = self._msg
+        if type(msg) is tuple:
+            msg = msg[0] % msg[1]
+        return msg
+
+    @property
+    def text(self):
+        text = 'Doc:%s' % self.doc_xpath
+        value = self.value
+        if value is not _no_value_provided:
             if is_map(value):
                 value = '{...}'
             elif is_seq(value):
                 value = '[...]'
             elif is_string(value):
                 value = repr(value)
-            text += ' with value=%s' % value
-        self.text = text + ' violates %s. %s' % (schema_xpath, msg)
+            text += ' with value=%s' % (value,)
+        return text + ' violates %s. %s' % (self.schema_xpath, self.msg)
+
     def __str__(self):
         return self.text
@@ -0,0 +1,400 @@
+import itertools, yaml
+
+from schema_violation import *
+from datatypes import *
+from loaders import *
+from validator import _check_extras_count
+
+_merge_tag = 'tag:yaml.org,2002:merge'
+
+# Markers for the state of a map frame: waiting for a key, or waiting for the
+# value of a merge key (<<).
+_expect_key = 'eXpEcT kEy'
+_expect_merge = 'eXpEcT mErGe'
+
+class _sized:
+    '''
+    Stands in for a container whose members have already been discarded, so
+    length checks can still run once the container ends.
+    '''
+    __slots__ = ('n',)
+    def __init__(self, n):
+        self.n = n
+    def __len__(self):
+        return self.n
+
+class _part:
+    '''
+    What one of the validators that check an open container remembers
+    about it. Nothing here grows with the number of members, except the set
+    of keys seen in a map that has required keys.
+    '''
+    __slots__ = ('v', 'structured', 'extra_count', 'seen')
+    def __init__(self, v, structured, is_map):
+        self.v = v
+        self.structured = structured
+        self.extra_count = 0
+        self.seen = set() if (is_map and structured and v.required) else None
+
+class _frame:
+    '''
+    What the stream validator remembers about one open container: a _part
+    for each validator that checks it. Most containers have one, or none;
+    a node that refines a named type, like {type: rows, max_length: 10},
+    has its own and the named type's.
+    '''
+    __slots__ = ('parts', 'xpath', 'is_map', 'count', 'target', 'mark')
+    def __init__(self, parts, xpath, is_map, mark):
+        self.parts = parts
+        self.mark = mark
+        self.xpath = xpath
+        self.is_map = is_map
+        self.count = 0
+        self.target = _expect_key
+
+# The target of a member that nothing checks: no validators, and no xpath.
+_no_target = ((), None)
+
+class _stream_validator:
+
+    def __init__(self, v, loader, node_xpath):
+        self.root = ((v,) if v is not None else (), node_xpath)
+        self.loader = loader
+        self.frames = []
+        self.anchors = {}
+        self.errors = []
+        # Which doc of the stream is being validated, from 0.
+        self.doc_index = -1
+        # Set when an event's node had to be built and checked in memory;
+        # errors found that way may be about any node inside it.
+        self.materialized = False
+
+    def run(self, pause_every=None):
+        '''
+        Yield errors as they are found, for every doc in the stream. Each
+        error gets the index of its doc, and each error about a single node
+        that was seen as events gets the line and column where that node
+        starts.
+        If pause_every is given, also yield None after every that many
+        events, so the caller can do something else in between.
+        '''
+        loader = self.loader
+        frames = self.frames
+        errors = self.errors
+        left = pause_every
+        while loader.check_event():
+            event = loader.get_event()
+            cls = event.__class__
+            mark = event.start_mark
+            self.materialized = False
+            if cls is yaml.DocumentStartEvent:
+                # Each doc starts afresh; aliases can't reach across docs.
+                self.doc_index += 1
+                del frames[:]
+                self.anchors.clear()
+            elif cls is yaml.SequenceEndEvent or cls is yaml.MappingEndEvent:
+                f = frames.pop()
+                mark = f.mark
+                self._finish(f)
+            elif cls is yaml.ScalarEvent or cls is yaml.AliasEvent or \
+                    cls is yaml.SequenceStartEvent or cls is yaml.MappingStartEvent:
+                self._arrive(event)
+            if errors:
+                if mark is not None and not self.materialized:
+                    for e in errors:
+                        e.line = mark.line + 1
+                        e.column = mark.column + 1
+                for e in errors:
+                    e.doc_index = self.doc_index
+                yield from errors
+                errors.clear()
+            if left is not None:
+                left -= 1
+                if not left:
+                    left = pause_every
+                    yield None
+
+    def _resolve_tag(self, event):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = self.loader.resolve(yaml.ScalarNode, event.value, event.implicit)
+        return tag
+
+    def _scalar(self, event, tag=None):
+        node = yaml.ScalarNode(tag or self._resolve_tag(event), event.value,
+            event.start_mark, event.end_mark, style=event.style)
+        value = self.loader.construct_document(node)
+        if event.anchor is not None:
+            self.anchors[event.anchor] = value
+        return value
+
+    def _materialize(self, event):
+        '''
+        Build the python value for the node that begins with event. This is
+        used for anchored containers (an alias may reuse them later), complex
+        keys, and merged maps; ordinary containers are never built.
+        '''
+        self.materialized = True
+        cls = event.__class__
+        if cls is yaml.ScalarEvent:
+            return self._scalar(event)
+        if cls is yaml.AliasEvent:
+            return self.anchors[event.anchor]
+        loader = self.loader
+        stack = []
+        value = None
+        while True:
+            cls = event.__class__
+            if cls is yaml.SequenceStartEvent or cls is yaml.MappingStartEvent:
+                value = {} if cls is yaml.MappingStartEvent else []
+                if event.anchor is not None:
+                    self.anchors[event.anchor] = value
+                stack.append([value, _expect_key])
+            else:
+                if cls is yaml.ScalarEvent:
+                    tag = self._resolve_tag(event)
+                    top = stack[-1] if stack else None
+                    if tag == _merge_tag and top and top[1] is _expect_key and type(top[0]) is map_type:
+                        value = _expect_merge
+                    else:
+                        value = self._scalar(event, tag)
+                elif cls is yaml.AliasEvent:
+                    value = self.anchors[event.anchor]
+                else:
+                    value = stack.pop()[0]
+                if not stack:
+                    return value
+                top = stack[-1]
+                container = top[0]
+                if type(container) is seq_type:
+                    container.append(value)
+                elif top[1] is _expect_key:
+                    top[1] = value
+                elif top[1] is _expect_merge:
+                    for k, item in _iter_merged(value):
+                        container.setdefault(k, item)
+                    top[1] = _expect_key
+                else:
+                    container[top[1]] = value
+                    top[1] = _expect_key
+            event = loader.get_event()
+
+    def _arrive(self, event):
+        frames = self.frames
+        f = frames[-1] if frames else None
+        cls = event.__class__
+        if f is not None and f.is_map and f.target is _expect_key:
+            if not f.parts and cls is yaml.ScalarEvent and event.anchor is None:
+                # Nothing checks this map, its keys or its values (not even
+                # those of a merged map), so the key isn't built.
+                f.count += 1
+                f.target = _no_target
+                return
+            if cls is yaml.ScalarEvent:
+                tag = self._resolve_tag(event)
+                if tag == _merge_tag:
+                    f.target = _expect_merge
+                    return
+                key = self._scalar(event, tag)
+            else:
+                key = self._materialize(event)
+            self._on_key(f, key)
+            return
+        if f is None:
+            vs, xpath = self.root
+        elif f.is_map:
+            if f.target is _expect_merge:
+                f.target = _expect_key
+                for k, item in _iter_merged(self._materialize(event)):
+                    self._on_key(f, k)
+                    vs, xpath = f.target
+                    f.target = _expect_key
+                    for v in vs:
+                        self.errors.extend(v.validate(item, xpath))
+                return
+            vs, xpath = f.target
+            f.target = _expect_key
+        else:
+            vs, xpath = self._item_targets(f)
+        if cls is yaml.ScalarEvent:
+            # Scalars that nothing checks (in a subtree pruned by tags, say)
+            # aren't built, unless an alias may use them later.
+            if vs:
+                value = self._scalar(event)
+                for v in vs:
+                    if v.ref:
+                        self.errors.extend(v.validate(value, xpath))
+                    else:
+                        v.check_node(value, xpath, self.errors)
+            elif event.anchor is not None:
+                self._scalar(event)
+        elif cls is yaml.AliasEvent or event.anchor is not None:
+            value = self._materialize(event)
+            for v in vs:
+                self.errors.extend(v.validate(value, xpath))
+        else:
+            is_map = cls is yaml.MappingStartEvent
+            parts = self._parts(vs, map_type if is_map else seq_type, xpath) if vs else []
+            frames.append(_frame(parts, xpath, is_map, event.start_mark))
+
+    def _parts(self, vs, t, xpath):
+        # A _part for each validator that checks a container of type t,
+        # following each one to the named types it refines, just as
+        # validation in memory does (see _walk_ref). Validators with nothing
+        # to check in the container get none.
+        parts = []
+        for v in vs:
+            while True:
+                if t in v.dispatch:
+                    structured = v.walkers.get(t) is not None
+                elif v.accepts_any:
+                    structured = False
+                else:
+                    self.errors.append(v.type_violation({} if t is map_type else [], xpath))
+                    break
+                if structured or v.checks:
+                    parts.append(_part(v, structured, t is map_type))
+                ref = v.ref
+                if ref is None or not (t in ref.dispatch or ref.accepts_any):
+                    break
+                v = ref
+        return parts
+
+    def _item_targets(self, f):
+        i = f.count
+        f.count += 1
+        vs = None
+        for p in f.parts:
+            if not p.structured:
+                continue
+            v = p.v
+            if v.items:
+                child = v.items
+            elif v.fields is not None:
+                if i < len(v.fields):
+                    child = v.fields[i]
+                elif v.extras_allowed:
+                    child = v.extras
+                else:
+                    continue
+            else:
+                continue
+            if child is not None:
+                if vs is None:
+                    vs = []
+                vs.append(child)
+        if vs is None:
+            return _no_target
+        return vs, item_doc_path(f.xpath, i)
+
+    def _on_key(self, f, key):
+        f.count += 1
+        f.target = _no_target
+        vs = None
+        xpath = None
+        for p in f.parts:
+            if not p.structured:
+                continue
+            v = p.v
+            if xpath is None:
+                xpath = child_doc_path(f.xpath, key)
+            if v.key_type:
+                self.errors.extend(v.key_type.validate(key, xpath))
+            if p.seen is not None:
+                p.seen.add(key)
+            keys = v.keys
+            child = keys.get(key) if keys else None
+            if child is not None:
+                pass
+            elif keys is not None and key in keys:
+                continue
+            elif v.value_type:
+                child = v.value_type
+            elif keys is not None or v.extras_allowed:
+                if not v.extras_allowed:
+                    self.errors.append(schema_violation(v.schema, f.xpath,
+                        ('Key "%s" is not declared in keys, and extras are not allowed.', (key,)), {}))
+                    continue
+                p.extra_count += 1
+                child = v.extras
+                if child is None:
+                    continue
+            else:
+                continue
+            if vs is None:
+                vs = []
+            vs.append(child)
+        if vs is not None:
+            f.target = (vs, xpath)
+
+    def _finish(self, f):
+        errors = self.errors
+        xpath = f.xpath
+        placeholder = {} if f.is_map else []
+        for p in f.parts:
+            v = p.v
+            if v.checks:
+                sized = _sized(f.count)
+                for check, operand in v.checks:
+                    msg = check(sized, operand)
+                    if msg:
+                        errors.append(schema_violation(v.schema, xpath, msg, placeholder))
+            if not p.structured:
+                continue
+            if f.is_map:
+                for name in v.required:
+                    if name not in p.seen:
+                        errors.append(schema_violation(v.schema, xpath, ('Missing required key "%s".', (name,)), placeholder))
+                if v.extras_allowed:
+                    msg = _check_extras_count(v, p.extra_count, 'key', 'keys')
+                    if msg:
+                        errors.append(schema_violation(v.schema, xpath, msg, placeholder))
+            elif v.fields is not None:
+                for name, i in v.required_fields:
+                    if i >= f.count:
+                        errors.append(schema_violation(v.schema, xpath, ('Missing required field "%s".', (name,)), placeholder))
+                n = len(v.fields)
+                if v.extras_allowed:
+                    msg = _check_extras_count(v, max(f.count - n, 0), 'field', 'fields')
+                    if msg:
+                        errors.append(schema_violation(v.schema, xpath, msg, placeholder))
+                elif f.count > n:
+                    errors.append(schema_violation(v.schema, xpath,
+                        ('Found %d fields, but only %d are declared, and extras are not allowed.', (f.count, n)), placeholder))
+
+def _iter_merged(value):
+    # The value of a merge key is a map, or a sequence of maps.
+    maps = value if is_seq(value) else [value]
+    for m in maps:
+        if is_map(m):
+            for k, item in m.items():
+                yield k, item
+
+def iter_stream_violations(validator, stream, loader='auto', node_xpath='/'):
+    '''
+    Validate each doc in a yaml stream (a string or a file object) from
+    parse events, without building the docs in memory, and yield errors as
+    they are found. Each error's doc_index says which doc it's about,
+    counting from 0, even when the stream has only one. Each container is
+    checked and released as soon as it ends, so memory grows with the depth
+    of the doc rather than its size. The violations are the same ones that
+    validator.validate() reports for the loaded doc, though container-level
+    violations (lengths, missing members) are reported when the container
+    ends, after the violations inside it. Parsing goes no further than the
+    consumer reads.
+
+    Anchored containers are built in memory, since aliases may reuse them.
+    Keys that follow a merge key (<<) do not suppress the merged values.
+    '''
+    parser = get_yaml_loader(loader)(stream)
+    try:
+        yield from _stream_validator(validator, parser, node_xpath).run()
+    finally:
+        parser.dispose()
+
+def validate_stream(validator, stream, loader='auto', node_xpath='/', max_errors=None):
+    '''
+    Like iter_stream_violations(), but return a list of errors. If max_errors
+    is given, parsing stops as soon as that many errors have been found.
+    '''
+    return list(itertools.islice(iter_stream_violations(validator, stream, loader, node_xpath), max_errors))
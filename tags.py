@@ -0,0 +1,141 @@
+import copy
+
+from datatypes import *
+
+# Tags label parts of a schema (see "tags" in yaval_schema.yaml). Which tags
+# apply at a schema node depends on where it is used: a tag written as +tag
+# also applies to everything leafward, and -tag stops one that was inherited.
+# Tags are resolved over compiled validators, so that validating only the
+# nodes with (or without) certain tags can skip every subtree that has
+# nothing left to check.
+
+no_tags = (frozenset(), frozenset(), frozenset())
+
+def parse_tags(names):
+    '''
+    Split the tags written on a schema node into three sets: the tags the
+    node has, the ones it passes leafward, and the inherited ones it stops.
+    '''
+    if not is_seq(names):
+        return no_tags
+    own, passed, stopped = set(), set(), set()
+    for name in names:
+        if not is_string(name):
+            continue
+        if name.startswith('+'):
+            own.add(name[1:])
+            passed.add(name[1:])
+        elif name.startswith('-'):
+            stopped.add(name[1:])
+        else:
+            own.add(name)
+    return frozenset(own), frozenset(passed), frozenset(stopped)
+
+def doc_tags(s):
+    '''
+    Return the tags listed at the top of the schema doc that s belongs to.
+    Those label the whole schema, so every node inherits them.
+    '''
+    top = s
+    while top.parent:
+        top = top.parent
+    if not top.is_doc():
+        return frozenset()
+    own, passed, stopped = parse_tags(top.node.get('tags'))
+    return own | passed
+
+def _children(v):
+    # Every validator that v hands nodes to, including a named type that it
+    # refines.
+    if v.keys:
+        yield from v.keys.values()
+    if v.fields:
+        yield from v.fields
+    yield v.items
+    yield v.key_type
+    yield v.value_type
+    yield v.extras
+    yield v.ref
+
+def _resolve(v, inherited):
+    # The tags in effect at v, and the tags it passes to its children.
+    own, passed, stopped = v.tags or no_tags
+    kept = inherited - stopped
+    return kept | own, kept | passed
+
+def tag_index(v, inherited=frozenset()):
+    '''
+    Return a dict of schema xpath: the set of tags in effect at that schema
+    node, for every node that validating with v can visit. A named type that
+    is used in several places has the tags of every use.
+    '''
+    index = {}
+    seen = set()
+    stack = [(v, inherited)]
+    while stack:
+        v, inherited = stack.pop()
+        if v is None or (v, inherited) in seen:
+            continue
+        seen.add((v, inherited))
+        tags, below = _resolve(v, inherited)
+        xpath = v.schema.get_xpath()
+        index[xpath] = index.get(xpath, frozenset()) | tags
+        stack.extend((child, below) for child in _children(v))
+    return index
+
+def _uncheck(v):
+    # Make a copy of a validator accept any node, while still handing its
+    # members to their own validators.
+    v.checks = ()
+    v.regex = None
+    v.accepts_any = True
+    v.required = ()
+    v.required_fields = ()
+    v.extras_allowed = True
+    v.extras_min = None
+    v.extras_max = None
+
+def _select(v, inherited, only, skip, memo):
+    if v is None:
+        return None
+    key = (v, inherited)
+    if key in memo:
+        # A recursive type that is still being selected; it can't be pruned.
+        return memo[key]
+    tags, below = _resolve(v, inherited)
+    keep = (not only or tags & only) and not tags & skip
+    selected = memo[key] = copy.copy(v)
+    if not keep:
+        _uncheck(selected)
+    def select(child):
+        return _select(child, below, only, skip, memo)
+    if v.keys:
+        selected.keys = dict((name, select(child)) for name, child in v.keys.items())
+    if v.fields:
+        selected.fields = tuple(select(child) for child in v.fields)
+    selected.items = select(v.items)
+    selected.key_type = select(v.key_type)
+    selected.value_type = select(v.value_type)
+    selected.extras = select(v.extras)
+    selected.ref = select(v.ref)
+    if v.ref is not None and selected.ref is None:
+        # Nothing is left to check against the named type; _walk_ref
+        # expects one, so dispatch straight to the walkers.
+        selected.dispatch = dict((t, selected.walkers.get(t)) for t in v.dispatch)
+    if selected.items is None:
+        selected.batch = None
+    if not keep and all(child is None for child in _children(selected)):
+        memo[key] = None
+        return None
+    return selected
+
+def prune_to_tags(v, only=(), skip=(), inherited=frozenset()):
+    '''
+    Return a copy of validator v that only checks schema nodes having one of
+    the tags in only (if any are given) and none of the tags in skip. Other
+    nodes are still walked through, to reach selected nodes beneath them,
+    but a subtree with nothing selected in it is pruned: validation never
+    visits it, and streaming validation doesn't build its values. Return
+    None if nothing at all is selected. v itself is unchanged.
+    '''
+    return _select(v, frozenset(inherited), frozenset(only), frozenset(skip), {})
@@ -0,0 +1,121 @@
+import os, sys, asyncio, concurrent.futures, unittest, yaml
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+from schema import *
+from streaming import validate_stream
+import async_validation
+from async_validation import validate_async
+
+schema_text = '''
+items:
+  keys: [{n: {type: int, min: 0}}, {name: {regex: '^[a-z]+$'}}]
+  required: [n]
+'''
+
+def _doc_text(count):
+    return ''.join('- {n: %d, name: %s}\n' % (i if i % 7 else -i - 1, 'ok' if i % 5 else 'Bad')
+        for i in range(count))
+
+def _strs(errors):
+    return [str(e) for e in errors]
+
+def _worker_caches():
+    # Run in a process worker.
+    return len(async_validation._worker_installed), len(async_validation._worker_validators)
+
+class async_validation_test(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = schema('s', yaml.safe_load(schema_text))
+        self.text = _doc_text(500)
+        self.expected = _strs(validate_stream(self.schema.compile(), self.text))
+
+    def test_in_loop(self):
+        errors = asyncio.run(validate_async(self.schema, self.text, offload_at=None))
+        self.assertEqual(self.expected, _strs(errors))
+        errors = asyncio.run(validate_async(self.schema, self.text.encode('utf-8'), offload_at=None))
+        self.assertEqual(self.expected, _strs(errors))
+
+    def test_max_errors(self):
+        errors = asyncio.run(validate_async(self.schema, self.text, max_errors=3, offload_at=None))
+        self.assertEqual(self.expected[:3], _strs(errors))
+
+    def test_yields_to_the_loop(self):
+        ticks = []
+        async def ticker(done):
+            while not done.is_set():
+                ticks.append(1)
+                await asyncio.sleep(0)
+        async def main():
+            done = asyncio.Event()
+            task = asyncio.ensure_future(ticker(done))
+            errors = await validate_async(self.schema, _doc_text(5000), offload_at=None)
+            done.set()
+            await task
+            return errors
+        asyncio.run(main())
+        # 5000 items are about 45000 events.
+        self.assertGreater(len(ticks), 10)
+
+    def test_refined_named_type_yields(self):
+        s = schema('r', yaml.safe_load('''
+            types:
+              - rows: {items: {keys: [{n: int}, {name: str}]}}
+            root: {type: rows, min_length: 1}
+        '''))
+        ticks = []
+        async def ticker(done):
+            while not done.is_set():
+                ticks.append(1)
+                await asyncio.sleep(0)
+        async def main():
+            done = asyncio.Event()
+            task = asyncio.ensure_future(ticker(done))
+            errors = await validate_async(s, _doc_text(5000), offload_at=None)
+            done.set()
+            await task
+            return errors
+        self.assertEqual([], asyncio.run(main()))
+        self.assertGreater(len(ticks), 10)
+
+    def test_thread_executor(self):
+        async def main(executor):
+            return await asyncio.gather(*[validate_async(self.schema, self.text,
+                executor=executor, offload_at=1000) for i in range(4)])
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            results = asyncio.run(main(executor))
+        self.assertEqual([self.expected] * 4, [_strs(errors) for errors in results])
+
+    def test_process_executor(self):
+        async def main(executor):
+            return [await validate_async(self.schema, self.text, executor=executor, offload_at=1000)
+                for i in range(2)]
+        with concurrent.futures.ProcessPoolExecutor(1) as executor:
+            results = asyncio.run(main(executor))
+        self.assertEqual([self.expected] * 2, [_strs(errors) for errors in results])
+        # The validator was pickled once, for both requests.
+        self.assertIn(self.schema.compile(), async_validation._pickled)
+
+    def test_installed_in_workers(self):
+        other = schema('o', yaml.safe_load('items: str'))
+        async def main(executor):
+            return [await validate_async(s, self.text, executor=executor, offload_at=1000)
+                for s in [self.schema, other, self.schema]]
+        with async_validation.make_process_executor([self.schema, other], 1) as executor:
+            results = asyncio.run(main(executor))
+            caches = executor.submit(_worker_caches).result()
+        self.assertEqual(self.expected, _strs(results[0]))
+        self.assertEqual(self.expected, _strs(results[2]))
+        self.assertEqual(500, len(results[1]))
+        # Both were loaded as the worker started; no request sent one.
+        self.assertEqual((2, 0), caches)
+
+    def test_syntax_error(self):
+        with self.assertRaises(yaml.YAMLError):
+            asyncio.run(validate_async(self.schema, '- [unclosed\n', offload_at=None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import os, sys, unittest
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test, os.path.join(folder_under_test, 'bench')] + sys.path
+
+from schema import *
+from generators import *
+
+class bench_test(unittest.TestCase):
+
+    def test_generated_schemas_are_valid(self):
+        for seed in range(3):
+            s = schema('x', make_schema(width=5, depth=4, seed=seed))
+            self.assertEqual([], s.self_validate())
+        self.assertEqual([], schema('x', make_recursive_schema()).self_validate())
+
+    def test_error_rate(self):
+        node = make_schema(width=6, depth=3, regex_density=0.5)
+        s = schema('x', node)
+        self.assertEqual([], s.validate(make_doc(node, seq_length=4)))
+        self.assertTrue(s.validate(make_doc(node, seq_length=4, error_rate=0.5)))
+        self.assertEqual(make_doc(node, 4, 0.5, seed=1), make_doc(node, 4, 0.5, seed=1))
+
+    def test_deep_doc(self):
+        s = schema('x', make_recursive_schema())
+        self.assertEqual([], s.validate(make_deep_doc(5000)))
+        errors = s.validate(make_deep_doc(100, fanout=2, error_rate=1.0))
+        self.assertEqual(199, len(errors))
+
+    def test_schema_memory(self):
+        import run
+        memory = run.schema_memory(dict(run.default_params, width=4, depth=2))
+        self.assertGreater(memory['schema_nodes'], 4)
+        self.assertGreater(memory['compiled_kb'], 0)
+        self.assertGreater(memory['pickled_kb'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
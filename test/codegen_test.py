@@ -0,0 +1,70 @@
+import os, sys, unittest, yaml
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+from schema import *
+from codegen import *
+
+def load_generated(s):
+    namespace = {}
+    exec(compile(generate_source(s), '<generated>', 'exec'), namespace)
+    return namespace
+
+class codegen_test(unittest.TestCase):
+
+    def assert_same_as_interpreted(self, schema_txt, *doc_txts):
+        s = schema('x', yaml.safe_load(schema_txt))
+        generated = load_generated(s)
+        for doc_txt in doc_txts:
+            doc = yaml.safe_load(doc_txt)
+            expected = sorted(str(e) for e in s.validate(doc))
+            actual = sorted(generated['format_error'](e) for e in generated['validate'](doc))
+            self.assertEqual(expected, actual)
+
+    def test_scalars(self):
+        self.assert_same_as_interpreted('min: 3\nmax: 10', '2', '3', '11', 'x', '5.5')
+        self.assert_same_as_interpreted('xmin: 0\nxmax: 1', '0', '1', '0.5')
+        self.assert_same_as_interpreted('multiple_of: 3', '9', '10', '1.5')
+        self.assert_same_as_interpreted('regex: ^a%d', 'a%d', 'b', '3')
+        self.assert_same_as_interpreted('regex: ^(yes|n%)$', 'yes', 'n%', 'no', '3')
+        self.assert_same_as_interpreted('min_length: 2\nmax_length: 3', 'a', 'abcd', '[1, 2]', '{a: 1}')
+        self.assert_same_as_interpreted('multiple_of: 1\nregex: x', '3')
+        self.assert_same_as_interpreted('number', '3', '3.5', 'x')
+        self.assert_same_as_interpreted('min: 0', '2020-01-01', '-1')
+        self.assert_same_as_interpreted('min: 2020-01-02\nxmax: 2021-01-01', '2020-01-01 10:00:00',
+            '2021-01-01', '2020-06-01', '3')
+
+    def test_maps(self):
+        schema_txt = '''keys: [{a: int}, {b: {items: {min: 0}}}, c]
+required: [a, d]
+extras: {regex: ^z, max_length: 1}'''
+        self.assert_same_as_interpreted(schema_txt, '{a: 1, b: [1, -1], c: x}', '{zz: 1}',
+            '{za: q, zb: r}', '{q: w}', '[]')
+        self.assert_same_as_interpreted('key_type: str\nvalue_type: int', '{a: 1, 2: x}')
+        self.assert_same_as_interpreted('keys: [a]', '{a: 1, b: 2}')
+        self.assert_same_as_interpreted('keys: [a]\nextras: {min_length: 1, max_length: 1}',
+            '{a: 1}', '{a: 1, b: 2}', '{b: 2, c: 3}')
+
+    def test_fields(self):
+        schema_txt = 'items: {fields: [{name: str}, {amount: number}], required: [name]}'
+        self.assert_same_as_interpreted(schema_txt, '[[eggs, 12], [], [a, b, c], 5]')
+        schema_txt = 'fields: [a, {b: int}]\nextras: {type: str, min_length: 1, max_length: 2}'
+        self.assert_same_as_interpreted(schema_txt, '[1, 2]', '[1, 2, x]', '[1, 2, x, y, 3]')
+
+    def test_named_types(self):
+        schema_txt = '''types:
+  - tree: {keys: [{name: str}, {children: {items: tree}}], required: [name]}
+  - small: {type: int, max: 9}
+root: {keys: [{t: tree}, {n: {type: small, min: 1}}, {u: str|small}]}'''
+        self.assert_same_as_interpreted(schema_txt, '{t: {name: a, children: [{name: b}, {children: []}]}}',
+            '{n: 0, u: 12}', '{n: x, u: 1.5}', '{n: 5, u: five}')
+
+    def test_generated_module_is_standalone(self):
+        source = generate_source(schema('x', yaml.safe_load('items: {regex: ^a}')))
+        imports = [line for line in source.split('\n') if line.startswith(('import', 'from'))]
+        self.assertEqual(['import re, datetime, operator'], imports)
+
+if __name__ == '__main__':
+    unittest.main()
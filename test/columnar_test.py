@@ -0,0 +1,78 @@
+import os, sys, random, unittest, yaml
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+from schema import *
+import columnar
+
+def _messages(errors):
+    return [str(e) for e in errors]
+
+class columnar_test(unittest.TestCase):
+
+    def tearDown(self):
+        columnar.batch_min = 64
+
+    def assert_same_as_unbatched(self, schema_txt, doc):
+        v = schema('x', yaml.safe_load(schema_txt)).compile()
+        self.assertTrue(v.batch)
+        columnar.batch_min = 0
+        batched = _messages(v.validate(doc))
+        columnar.batch_min = sys.maxsize
+        unbatched = _messages(v.validate(doc))
+        self.assertEqual(unbatched, batched)
+        return batched
+
+    def test_scalar_items(self):
+        r = random.Random(4)
+        doc = [r.choice([r.randint(-5, 50), r.random() * 10, 'x', None, True]) for i in range(500)]
+        errors = self.assert_same_as_unbatched('items: {type: int, min: 0, xmax: 40, multiple_of: 3}', doc)
+        self.assertTrue(errors)
+        self.assert_same_as_unbatched('items: number', doc)
+        self.assert_same_as_unbatched('items: {min: 1}', doc)
+
+    def test_strings(self):
+        r = random.Random(5)
+        doc = [''.join(r.choice('ab') for i in range(r.randint(0, 5))) for j in range(200)] + [3]
+        self.assert_same_as_unbatched('items: {regex: ^a, min_length: 1, max_length: 4}', doc)
+
+    def test_fields_table(self):
+        r = random.Random(6)
+        def row():
+            fields = [r.choice(['eggs', 'milk', 7]), r.choice([1, 2.5, -1, 'x'])]
+            return fields[:r.randint(0, 2)] + ['dozen'] * r.randint(0, 2)
+        doc = [row() for i in range(500)] + [{}, 'x']
+        schema_txt = '''items:
+  fields: [{name: str}, {amount: {type: number, xmin: 0}}]
+  required: [name]
+  extras: {type: str, max_length: 1}'''
+        self.assertTrue(self.assert_same_as_unbatched(schema_txt, doc))
+        self.assertTrue(self.assert_same_as_unbatched('items: {fields: [a, {b: int}], max_length: 2}', doc))
+
+    def test_valid_items_are_not_visited(self):
+        v = schema('x', yaml.safe_load('items: {min: 0}')).compile()
+        columnar.batch_min = 0
+        self.assertEqual([2], columnar.failing_indices(v.items, [1, 2, -3, 4]))
+        self.assertEqual(['/[2]'], [e.doc_xpath for e in v.validate([1, 2, -3, 4])])
+
+    def test_incomparable_values_fall_back(self):
+        v = schema('x', yaml.safe_load('items: {min: 0}')).compile()
+        self.assertEqual(None, columnar.failing_indices(v.items, [1, datetime.date(2020, 1, 1)]))
+
+    @unittest.skipUnless(columnar.get_numpy(), 'numpy is not installed')
+    def test_numpy_matches_python(self):
+        r = random.Random(7)
+        doc = [r.randint(-100, 100) for i in range(columnar.numpy_min * 2)]
+        v = schema('x', yaml.safe_load('items: {min: -90, xmax: 90, multiple_of: 7}')).compile()
+        saved = columnar.numpy_min
+        try:
+            expected = columnar.failing_indices(v.items, doc)
+            columnar.numpy_min = sys.maxsize
+            self.assertEqual(columnar.failing_indices(v.items, doc), expected)
+        finally:
+            columnar.numpy_min = saved
+
+if __name__ == '__main__':
+    unittest.main()
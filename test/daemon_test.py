@@ -0,0 +1,102 @@
+import os, sys, io, stat, unittest, tempfile, shutil, threading, contextlib
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+import daemon, yaval
+
+shopping_list_schema = os.path.join(folder_under_test, 'samples', 'shopping-list', 'schema.yaml')
+
+class daemon_test(unittest.TestCase):
+
+    def setUp(self):
+        yaval.use_schema_cache = False
+        self.folder = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.folder, 'yaval.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_no_daemon(self):
+        self.assertIsNone(daemon.connect(self.socket_path))
+
+    def test_round_trip(self):
+        def echo(request, respond):
+            for item in request['items']:
+                respond({'item': item})
+        server = daemon.make_server(echo, self.socket_path)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            self.assertRaises(RuntimeError, daemon.make_server, echo, self.socket_path)
+            sock = daemon.connect(self.socket_path)
+            responses = list(daemon.send_request(sock, {'items': [1, 2, 3]}))
+            self.assertEqual([{'item': 1}, {'item': 2}, {'item': 3}], responses)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def serve(self, handle_request_func):
+        server = daemon.make_server(handle_request_func, self.socket_path)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        def stop():
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        self.addCleanup(stop)
+        return server
+
+    def test_socket_is_private(self):
+        self.serve(lambda request, respond: None)
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(self.socket_path).st_mode))
+
+    def test_internal_error(self):
+        def broken(request, respond):
+            respond({'item': 1})
+            raise KeyError('oops')
+        self.serve(broken)
+        with contextlib.redirect_stderr(io.StringIO()):
+            responses = list(daemon.send_request(daemon.connect(self.socket_path), {}))
+        self.assertEqual([{'item': 1}, {'internal_error': "KeyError: 'oops'"}], responses)
+
+    def test_client_falls_back(self):
+        def broken(request, respond):
+            respond({'path': 'x', 'output': [['stdout', 'from the daemon\n', False]], 'error_count': 0})
+            raise KeyError('oops')
+        self.serve(broken)
+        doc_path = os.path.join(self.folder, 'doc.yaml')
+        with open(doc_path, 'w') as f:
+            f.write('- [eggs, x]\n')
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit) as done:
+                yaval.yaval_via_daemon(daemon.connect(self.socket_path), shopping_list_schema, [doc_path])
+        # The doc was validated here, and the daemon's output dropped.
+        self.assertEqual(1, done.exception.code)
+        self.assertNotIn('from the daemon', stdout.getvalue())
+
+    def test_serve_request(self):
+        responses = []
+        request = {'cwd': os.getcwd(), 'schema': shopping_list_schema,
+            'texts': [['good', '- [eggs, 12]\n'], ['bad', '- [eggs, x]\n']]}
+        yaval.serve_request(request, responses.append)
+        self.assertEqual(0, responses[0]['error_count'])
+        self.assertEqual([0, 1], [r['error_count'] for r in responses[1:3]])
+        self.assertEqual({'exit_code': 1}, responses[3])
+        # Stdin is validated in its place among the docs.
+        doc_path = os.path.join(self.folder, 'doc.yaml')
+        with open(doc_path, 'w') as f:
+            f.write('- [milk, y]\n')
+        responses = []
+        yaval.serve_request(dict(request, texts=[], docs=['-', doc_path, '-'], stdin='- [eggs, x]\n'),
+            responses.append)
+        self.assertEqual(['-', doc_path, '-'], [r['path'] for r in responses[1:4]])
+        self.assertEqual([1, 1, 0], [r['error_count'] for r in responses[1:4]])
+        # The compiled schema stays loaded for the next request.
+        self.assertTrue((os.path.abspath(shopping_list_schema), 're') in yaval._warm_schemas)
+
+if __name__ == '__main__':
+    unittest.main()
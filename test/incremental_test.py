@@ -0,0 +1,75 @@
+import os, sys, copy, random, unittest, yaml
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test, os.path.join(folder_under_test, 'bench')] + sys.path
+
+from schema import *
+from incremental import *
+from generators import *
+
+def _paths(node, path=()):
+    yield path
+    if type(node) is dict:
+        for k, child in node.items():
+            yield from _paths(child, path + (k,))
+    elif type(node) is list:
+        for i, child in enumerate(node):
+            yield from _paths(child, path + (i,))
+
+class incremental_test(unittest.TestCase):
+
+    def assert_same_as_validate(self, s, inc, doc):
+        self.assertEqual([str(e) for e in s.validate(doc)], [str(e) for e in inc.update(doc)])
+
+    def test_random_edits(self):
+        node = make_schema(width=6, depth=4, regex_density=0.3, seed=1)
+        s = schema('x', node)
+        inc = incremental_doc(s.compile())
+        rng = random.Random(3)
+        doc = make_doc(node, 5, 0.05, seed=1)
+        self.assert_same_as_validate(s, inc, doc)
+        for i in range(200):
+            doc = copy.deepcopy(doc)
+            path = rng.choice(list(_paths(doc))[1:])
+            parent = doc
+            for k in path[:-1]:
+                parent = parent[k]
+            pick = rng.random()
+            if pick < 0.5:
+                parent[path[-1]] = rng.choice([1, 1.0, True, 'x', None, [], {}, 'abc'])
+            elif type(parent) is dict:
+                del parent[path[-1]]
+            else:
+                parent.insert(path[-1], copy.deepcopy(parent[path[-1]]))
+            self.assert_same_as_validate(s, inc, doc)
+
+    def test_only_changes_are_visited(self):
+        s = schema('x', yaml.safe_load('items: {keys: [{n: int}, {tags: {items: str}}]}'))
+        inc = incremental_doc(s.compile())
+        doc = [{'n': i, 'tags': ['a', 'b']} for i in range(100)]
+        self.assertEqual([], inc.update(doc))
+        self.assertEqual(100 * 5 + 1, inc.visited)
+        doc = copy.deepcopy(doc)
+        doc[7]['tags'][1] = 3
+        self.assertEqual(['Doc:/[7]/tags[1]'], [e.text.split(' ')[0] for e in inc.update(doc)])
+        # The root, the changed item and its n, tags, and each tag.
+        self.assertEqual((6, 99), (inc.visited, inc.reused))
+
+    def test_equal_values_of_other_types_are_changes(self):
+        s = schema('x', yaml.safe_load('keys: [{a: {keys: [{flag: bool}]}}]'))
+        inc = incremental_doc(s.compile())
+        self.assertEqual(1, len(inc.update({'a': {'flag': 1}})))
+        self.assertEqual(0, len(inc.update({'a': {'flag': True}})))
+
+    def test_errors_in_unchanged_subtrees_are_reused(self):
+        s = schema('x', yaml.safe_load('keys: [{a: {items: int}}, {b: int}]'))
+        inc = incremental_doc(s.compile())
+        first = inc.update({'a': [1, 'x'], 'b': 1})
+        second = inc.update({'a': [1, 'x'], 'b': 2})
+        self.assertEqual([str(e) for e in first], [str(e) for e in second])
+        self.assertEqual(1, inc.reused)
+        self.assertIsNot(first[0], second[0])
+
+if __name__ == '__main__':
+    unittest.main()
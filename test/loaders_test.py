@@ -0,0 +1,97 @@
+import os, sys, unittest, yaml
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+from loaders import *
+from schema_violation import *
+
+class loaders_test(unittest.TestCase):
+
+    def test_looks_like_json(self):
+        self.assertTrue(looks_like_json('  {"a": 1}'))
+        self.assertTrue(looks_like_json('\n[1, 2]'))
+        self.assertTrue(looks_like_json('a: 1', 'x.JSON'))
+        self.assertFalse(looks_like_json('a: 1'))
+        self.assertFalse(looks_like_json(''))
+
+    def test_backends_agree(self):
+        text = '{"a": [1, 2.5, "x", null, true]}'
+        expected = {'a': [1, 2.5, 'x', None, True]}
+        for name in loader_names:
+            if name == 'libyaml' and not has_libyaml():
+                continue
+            self.assertEqual(expected, parse(text, loader=name))
+
+    def test_json_numbers_read_as_yaml(self):
+        for text in ['[1e5]', '[1E+5]', '[1.5e3]', '[1.5e+3]', '[-2.0E-1]', '[0.5, -0, 12]',
+                '[NaN]', '[Infinity]', '[-Infinity]', '{"a": [1.0e5, 3]}']:
+            expected = yaml.safe_load(text)
+            self.assertEqual(expected, parse(text))
+            self.assertEqual([expected], list(parse_all(text)))
+        self.assertEqual(['1e5', 1500.0], parse('["1e5", 1.5e+3]', loader='json'))
+        # Those constants aren't json, so forced json rejects them.
+        self.assertRaises(ValueError, parse, '[NaN]', None, 'json')
+
+    def test_flow_yaml_falls_back(self):
+        self.assertEqual({'a': 1, 'b': 'c'}, parse('{a: 1, b: c}'))
+
+    def test_forced_json_rejects_yaml(self):
+        self.assertRaises(ValueError, parse, 'a: 1', None, 'json')
+
+    def test_auto_prefers_libyaml(self):
+        if has_libyaml():
+            self.assertIs(yaml.CSafeLoader, get_yaml_loader())
+        else:
+            self.assertIs(yaml.SafeLoader, get_yaml_loader())
+        self.assertIs(yaml.SafeLoader, get_yaml_loader('python'))
+
+    def test_source_map_locates_lazily(self):
+        source = source_map('a:\n  b: [1, 2]\n  3: x\n')
+        self.assertIsNone(source._composer)
+        node = source.find_node(item_doc_path(child_doc_path(child_doc_path('/', 'a'), 'b'), 1))
+        self.assertEqual((1, 9), (node.start_mark.line, node.start_mark.column))
+        # Keys are matched by value, not by text.
+        node = source.find_node(child_doc_path(child_doc_path('/', 'a'), 3))
+        self.assertEqual('x', node.value)
+        # A path that goes nowhere stops at the nearest node that exists.
+        node = source.find_node(child_doc_path(child_doc_path('/', 'a'), 'nope'))
+        self.assertEqual(1, node.start_mark.line)
+
+    def test_source_map_sets_line_and_column(self):
+        e = schema_violation('schema:x', item_doc_path('/', 1), 'msg')
+        source_map('- 1\n- 2\n').locate(e)
+        self.assertEqual((2, 3), (e.line, e.column))
+        e = schema_violation('schema:x', '/', 'msg')
+        source_map('- [').locate(e)
+        self.assertEqual(None, e.line)
+
+    def test_source_map_for_chunk(self):
+        # Docs 10 and 11 of a stream, in a chunk that starts on line 40.
+        source = source_map('---\na: 1\n---\nb: 2\n', first_doc=10, first_line=40)
+        e = schema_violation('schema:x', child_doc_path('/', 'b'), 'msg')
+        e.doc_index = 11
+        source.locate(e)
+        self.assertEqual((44, 4), (e.line, e.column))
+
+    def test_parse_all(self):
+        self.assertEqual([{'a': 1}, None, [2]], list(parse_all('a: 1\n---\n---\n- 2\n')))
+        self.assertEqual([[1]], list(parse_all('[1]')))
+
+    def test_split_stream(self):
+        text = '# log\na: 1\n---\nb: 2\n--- 3\n...\n%YAML 1.1\n---\nc: 4\n'
+        chunks = list(split_stream(text.splitlines(True), 2))
+        self.assertEqual([(0, 2, 0), (2, 2, 4)], [chunk[1:] for chunk in chunks])
+        self.assertEqual(text, ''.join(chunk[0] for chunk in chunks))
+        # Directives go with the doc they precede.
+        chunks = list(split_stream(text.splitlines(True), 1))
+        self.assertEqual('%YAML 1.1\n---\nc: 4\n', chunks[-1][0])
+        self.assertEqual([(0, 1, 0), (1, 1, 2), (2, 1, 4), (3, 1, 6)], [chunk[1:] for chunk in chunks])
+        docs = [doc for chunk in chunks for doc in parse_all(chunk[0])]
+        self.assertEqual(list(parse_all(text)), docs)
+        self.assertEqual([('', 0, 0, 0)], list(split_stream([], 2)))
+        self.assertEqual([(0, 1, 0)], [chunk[1:] for chunk in split_stream(['---\n', 'a: 1\n'], 2)])
+
+if __name__ == '__main__':
+    unittest.main()
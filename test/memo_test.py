@@ -0,0 +1,76 @@
+import os, sys, gc, random, unittest, yaml
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+from schema import *
+from memo import *
+from memo import _freeze
+
+schema_txt = '''types:
+  - address: {keys: [{street: str}, {zip: {regex: '^[0-9]{5}$'}}], required: [street]}
+root:
+  items:
+    keys: [{name: str}, {home: address}, {work: address}, {tags: {items: {regex: '^[a-z]+$'}}}]
+'''
+
+def _messages(errors):
+    return [str(e) for e in errors]
+
+class memo_test(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = schema('x', yaml.safe_load(schema_txt))
+
+    def random_doc(self, r):
+        addresses = [{'street': 'Main', 'zip': '12345'}, {'zip': 'abc'}, {'street': 5, 'zip': '1'}]
+        big = {'street': 'Long', 'zip': '00000', 'extra': list(range(40))}
+        doc = []
+        for i in range(100):
+            person = {'name': r.choice(['a', 'b', 7])}
+            person['home'] = r.choice(addresses + [big])
+            person['work'] = dict(r.choice(addresses))
+            person['tags'] = [r.choice(['x', 'Y', 'z9']) for j in range(r.randint(0, 3))]
+            doc.append(person)
+        return doc
+
+    def test_same_errors_as_without_memo(self):
+        r = random.Random(8)
+        memo = subtree_memo()
+        for i in range(3):
+            doc = self.random_doc(r)
+            self.assertEqual(_messages(self.schema.validate(doc)), _messages(self.schema.validate(doc, memo=memo)))
+        self.assertTrue(memo.hits > memo.misses)
+
+    def test_aliases_are_looked_up(self):
+        doc = yaml.safe_load('- home: &a {zip: x, extra: [%s]}\n- home: *a\n' % ', '.join(['0'] * 40))
+        memo = subtree_memo()
+        errors = self.schema.validate(doc, memo=memo)
+        self.assertEqual(_messages(self.schema.validate(doc)), _messages(errors))
+        self.assertEqual(['/[0]/home', '/[0]/home', '/[0]/home/zip',
+            '/[1]/home', '/[1]/home', '/[1]/home/zip'], [e.doc_xpath for e in errors])
+
+    def test_size_is_bounded(self):
+        memo = subtree_memo(5)
+        self.schema.validate(self.random_doc(random.Random(9)), memo=memo)
+        self.assertEqual(5, len(memo.entries))
+
+    def test_stats_let_validators_go(self):
+        memo = subtree_memo()
+        s = schema('x', yaml.safe_load(schema_txt))
+        s.validate(self.random_doc(random.Random(10)), memo=memo)
+        self.assertTrue(len(memo.stats) > 0)
+        # The LRU still holds some validators; once it is emptied, nothing does.
+        memo.entries.clear()
+        del s
+        gc.collect()
+        self.assertEqual(0, len(memo.stats))
+
+    def test_freeze_keeps_types_apart(self):
+        self.assertNotEqual(_freeze([1]), _freeze([True]))
+        self.assertNotEqual(_freeze({'a': 1, 'b': 2}), _freeze({'b': 2, 'a': 1}))
+        self.assertEqual(None, _freeze(list(range(freeze_limit))))
+
+if __name__ == '__main__':
+    unittest.main()
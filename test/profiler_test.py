@@ -0,0 +1,51 @@
+import os, sys, io, unittest, yaml
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+from schema import *
+from profiler import *
+
+class profiler_test(unittest.TestCase):
+
+    def test_counts(self):
+        s = schema('x', yaml.safe_load('items: {keys: [{id: {regex: "^[0-9]+$"}}, {n: int}]}'))
+        doc = [{'id': '1', 'n': 1}, {'id': 'a', 'n': 'b'}, {'id': '2'}]
+        p = schema_profile()
+        self.assertEqual([str(e) for e in s.validate(doc)], [str(e) for e in s.validate(doc, profile=p)])
+        stats = p.by_xpath()
+        visits, cum_time, self_time, regex_evals, violations = stats['schema:x/items/id']
+        self.assertEqual((3, 3, 1), (visits, regex_evals, violations))
+        self.assertEqual((2, 1), (stats['schema:x/items/n'][0], stats['schema:x/items/n'][4]))
+        self.assertEqual(1, stats['schema:x'][0])
+        self.assertTrue(stats['schema:x'][1] >= stats['schema:x'][2])
+        self.assertTrue(p.report(2).splitlines()[0].split()[0] == 'visits')
+        self.assertEqual(3, len(p.report(2).splitlines()))
+
+    def test_recursion_is_counted_once(self):
+        s = schema('x', yaml.safe_load('types: [{tree: {keys: [{kids: {items: tree}}]}}]\nroot: tree'))
+        doc = {}
+        for i in range(200):
+            doc = {'kids': [doc]}
+        p = schema_profile()
+        self.assertEqual([], s.validate(doc, profile=p))
+        stats = p.by_xpath()
+        total = sum(row[2] for row in stats.values())
+        # Cumulative time spans the whole walk once, not once per level.
+        self.assertTrue(stats['schema:x/types/tree'][1] <= total * 1.5 + 0.01)
+        self.assertEqual(201, stats['schema:x/types/tree'][0])
+
+    def test_collapsed(self):
+        s = schema('x', yaml.safe_load('keys: [{a: {items: int}}]'))
+        p = schema_profile()
+        s.validate({'a': list(range(10)) + ['x']}, profile=p)
+        f = io.StringIO()
+        p.write_collapsed(f)
+        for line in f.getvalue().splitlines():
+            stack, micros = line.rsplit(' ', 1)
+            self.assertTrue(stack.startswith('schema:x'))
+            self.assertTrue(int(micros) > 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os, sys, pickle, re, unittest
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+import regexes
+from regexes import *
+from schema import *
+
+class regexes_test(unittest.TestCase):
+
+    def tearDown(self):
+        set_regex_backend('re')
+
+    def test_patterns_are_shared(self):
+        self.assertIs(compile_regex('^[a-z]+[0-9]$'), compile_regex('^[a-z]+[0-9]$'))
+        a = schema('a', {'regex': '^[a-z]+[0-9]$'}).compile()
+        b = schema('b', {'items': {'regex': '^[a-z]+[0-9]$'}}).compile()
+        self.assertIs(a.regex, b.items.regex)
+
+    def test_cache_is_bounded(self):
+        old_size = regexes.regex_cache_size
+        regexes.regex_cache_size = 4
+        try:
+            for i in range(10):
+                compile_regex('^x{%d}$' % i)
+            self.assertEqual(4, len(regexes._cache))
+        finally:
+            regexes.regex_cache_size = old_size
+
+    def test_literal_patterns(self):
+        values = ['', 'a', 'ab', 'abc', 'abc\n', 'ABC', 'ad', 'bd', 'bce', 'xabc', 'abcx', 'yes', 'no']
+        literal = ['^abc$', r'^abc\Z', r'\Aab$', '^(yes|no)$', '^[ab]d$', '^(?:a|bc)(d|e)$', '/^abc$/', '^$']
+        other = ['^abc', 'abc$', '^a+$', '^(?i)abc$', '(?m)^abc$', '^a.c$', '^[^a]d$', '^(a|b*)$']
+        for pattern in literal + other:
+            r = compile_regex(pattern)
+            self.assertEqual(pattern in literal, isinstance(r, literal_regex), pattern)
+            python_re = re.compile(normalize_regex(pattern))
+            for value in values:
+                self.assertEqual(bool(python_re.search(value)), bool(r.search(value)), (pattern, value))
+
+    def test_literal_regex_pickles(self):
+        r = pickle.loads(pickle.dumps(compile_regex('^(on|off)$')))
+        self.assertTrue(r.search('on'))
+        self.assertFalse(r.search('of'))
+        self.assertEqual('^(on|off)$', r.pattern)
+
+    def test_invalid_patterns(self):
+        self.assertRaises(ValueError, compile_regex, 'a(')
+        self.assertRaises(ValueError, set_regex_backend, 'perl')
+
+    def test_re2_backend(self):
+        try:
+            import re2
+        except ImportError:
+            self.assertRaises(ValueError, set_regex_backend, 're2')
+            return
+        set_regex_backend('re2')
+        # Python's re would take longer than the age of the universe.
+        self.assertFalse(compile_regex('^(a+)+$').search('a' * 100 + '!'))
+        self.assertRaises(ValueError, compile_regex, r'^(a)\1$')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os, sys, unittest, tempfile, shutil
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+from result_cache import *
+
+class result_cache_test(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.doc = os.path.join(self.folder, 'doc.yaml')
+        self.write('a: 1\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, text, mtime=None):
+        with open(self.doc, 'w') as f:
+            f.write(text)
+        if mtime:
+            os.utime(self.doc, (mtime, mtime))
+
+    def reopen(self):
+        return result_cache('fp', self.folder)
+
+    def test_valid_result_is_remembered(self):
+        cache = self.reopen()
+        self.assertFalse(cache.is_known_valid(self.doc))
+        cache.record(self.doc, True)
+        cache.save()
+        self.assertTrue(self.reopen().is_known_valid(self.doc))
+
+    def test_invalid_result_is_not_remembered(self):
+        cache = self.reopen()
+        cache.is_known_valid(self.doc)
+        cache.record(self.doc, False)
+        cache.save()
+        self.assertFalse(self.reopen().is_known_valid(self.doc))
+
+    def test_change_is_noticed(self):
+        cache = self.reopen()
+        cache.is_known_valid(self.doc)
+        cache.record(self.doc, True)
+        cache.save()
+        self.write('a: 22\n', 1000000)
+        self.assertFalse(self.reopen().is_known_valid(self.doc))
+
+    def test_touch_without_change_is_still_valid(self):
+        cache = self.reopen()
+        cache.is_known_valid(self.doc)
+        cache.record(self.doc, True)
+        cache.save()
+        self.write('a: 1\n', 1000000)
+        self.assertTrue(self.reopen().is_known_valid(self.doc))
+
+    def test_other_fingerprint_is_separate(self):
+        cache = self.reopen()
+        cache.is_known_valid(self.doc)
+        cache.record(self.doc, True)
+        cache.save()
+        self.assertFalse(result_cache('other', self.folder).is_known_valid(self.doc))
+
+if __name__ == '__main__':
+    unittest.main()
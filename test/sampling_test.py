@@ -0,0 +1,59 @@
+import os, sys, unittest, yaml
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+from schema import *
+from sampling import *
+
+class sampling_test(unittest.TestCase):
+
+    def test_parse_sample(self):
+        self.assertEqual((0.01, None), parse_sample('0.01'))
+        self.assertEqual((None, 500), parse_sample('500'))
+        for text in ['0', '1.5', '-3', 'x']:
+            self.assertRaises(ValueError, parse_sample, text)
+
+    def test_pick(self):
+        s = sampler(count=10, min_length=100)
+        self.assertIsNone(s.pick(100, '/'))
+        picked = s.pick(5000, '/')
+        self.assertEqual(10, len(picked))
+        self.assertEqual([0, 4999], [picked[0], picked[-1]])
+        self.assertEqual(picked, sorted(set(picked)))
+        # The same seed and path pick the same items; other paths don't.
+        self.assertEqual(picked, sampler(count=10, min_length=100).pick(5000, '/'))
+        self.assertNotEqual(picked, s.pick(5000, item_doc_path('/', 3)))
+        self.assertNotEqual(picked, sampler(count=10, seed=1, min_length=100).pick(5000, '/'))
+        self.assertEqual((2, 10000, 20), s.take())
+        self.assertEqual((0, 0, 0), s.take())
+        rate = sampler(rate=0.01, min_length=100)
+        self.assertEqual(50, len(rate.pick(5000, '/')))
+
+    def test_sampled_validation(self):
+        s = schema('x', yaml.safe_load('{keys: [{rows: {items: {min: 0}, max_length: 3000}}], required: [n]}'))
+        rows = list(range(5000))
+        rows[0] = rows[-1] = rows[2500] = -1
+        self.assertEqual(3, len([e for e in s.validate({'rows': rows}) if 'less than min' in str(e)]))
+        sampled = s.sample(sampler(count=100, min_length=1000))
+        errors = [str(e) for e in sampled.validate({'rows': rows})]
+        # Container checks are exact; the first and last items are always
+        # checked, but not necessarily the middle one.
+        self.assertTrue(any('Missing required key "n"' in e for e in errors))
+        self.assertTrue(any('greater than max_length' in e for e in errors))
+        self.assertTrue(any(e.startswith('Doc:/rows[0] ') for e in errors))
+        self.assertTrue(any(e.startswith('Doc:/rows[4999] ') for e in errors))
+        self.assertEqual((1, 5000, 100), sampled.compile().sample.take())
+        # The schema itself still checks every item.
+        self.assertIsNone(s.compile().sample)
+
+    def test_rows(self):
+        s = schema('x', yaml.safe_load('items: {fields: [{n: int}, {s: str}]}'))
+        rows = [[i, 'a'] for i in range(3000)]
+        rows[-1][1] = 5
+        errors = s.sample(sampler(rate=0.1)).validate(rows)
+        self.assertEqual(['Doc:/[2999][1]'], [str(e).split(' ')[0] for e in errors])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os, sys, unittest, tempfile, shutil, yaml
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+from schema_cache import *
+
+schema_text = '''schema_id: 877cd6d9-f569-4fb7-9680-616758d9bb1d
+schema_version: "1.2"
+things:
+  items: {min: 0}
+'''
+
+class schema_cache_test(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def store(self, text):
+        s = schema('things', yaml.safe_load(text))
+        store_cached_schema(text, s, self.folder)
+        return s
+
+    def test_round_trip(self):
+        self.assertIsNone(load_cached_schema(schema_text, self.folder))
+        self.store(schema_text)
+        cached = load_cached_schema(schema_text, self.folder)
+        self.assertIsNotNone(cached._validator)
+        self.assertEqual(1, len(cached.validate([1, -1])))
+
+    def test_path_names_schema(self):
+        path = get_cache_path(schema_text, self.folder)
+        self.assertTrue(os.path.basename(path).startswith('877cd6d9-f569-4fb7-9680-616758d9bb1d-1.2-'))
+
+    def test_changed_text_misses_and_evicts(self):
+        self.store(schema_text)
+        changed = schema_text.replace('min: 0', 'min: 5')
+        self.assertIsNone(load_cached_schema(changed, self.folder))
+        self.store(changed)
+        self.assertIsNone(load_cached_schema(schema_text, self.folder))
+        self.assertEqual(1, len(os.listdir(os.path.join(self.folder, 'schemas'))))
+
+    def test_corrupt_entry_is_a_miss(self):
+        path = get_cache_path(schema_text, self.folder)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(b'not a pickle')
+        self.assertIsNone(load_cached_schema(schema_text, self.folder))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,7 +13,7 @@ def get_yaval_schema_yaml():
     if _ysy is None:
         with open(yaval_schema_path, 'r') as f:
             doc = f.read()
-            _ysy = yaml.load(doc)
+            _ysy = yaml.safe_load(doc)
     return _ysy
             
 
@@ -28,7 +28,7 @@ def get_yaval_schema():
 def assert_invalid(schema, text, *yaml_nodes):
     msgs = []
     for yn_text in yaml_nodes:
-        yaml_node = yaml.load(yn_text)
+        yaml_node = yaml.safe_load(yn_text)
         errors = schema.validate(yaml_node, '/')
         if errors:
             if not text: continue
@@ -55,7 +55,7 @@ def assert_invalid(schema, text, *yaml_nodes):
 def assert_valid(schema, *yaml_nodes):
     msgs = []
     for yn_text in yaml_nodes:
-        yaml_node = yaml.load(yn_text)
+        yaml_node = yaml.safe_load(yn_text)
         errors = schema.validate(yaml_node, '/')
         if errors:
             msg = 'Expected to validate cleanly. Instead, saw:\n  %s' % '\n  '.join([str(e) for e in errors])
@@ -68,7 +68,7 @@ def assert_expected_types(schema_txt, expected_types):
         expected_types = expected_types.split(',')
         expected_types = sorted(expected_types)
     expected_types = str(expected_types)
-    s = schema('x', yaml.load(schema_txt))
+    s = schema('x', yaml.safe_load(schema_txt))
     actual_types = s.get_expected_types()
     if actual_types is None:
         actual_types = 'None'
@@ -84,74 +84,74 @@ def assert_expected_types(schema_txt, expected_types):
 class schema_test(unittest.TestCase):
     
     def test_xpath1(self):
-        s = schema('any_string', yaml.load('str'))
+        s = schema('any_string', yaml.safe_load('str'))
         self.assertEquals('schema:any_string', s.get_xpath())
 
     def test_ultra_simple(self):
-        s = schema('any_string', yaml.load('str'))
+        s = schema('any_string', yaml.safe_load('str'))
         assert_valid(s, 'hello', '"hi"', 'this is a test', '\nthis is a test\nparagraph')
         assert_invalid(s, 'Expected node type to be str', '456789', '{}', '[]', '3.14')
-        s = schema('any_int', yaml.load('int'))
+        s = schema('any_int', yaml.safe_load('int'))
         assert_valid(s, '123')
         assert_invalid(s, 'Expected node type to be int', 'hello', '{}', '[]', '3.14')
         
     def test_min_out_of_range(self):
-        s = schema('min_25', yaml.load('min: 25'))
+        s = schema('min_25', yaml.safe_load('min: 25'))
         assert_valid(s, '25', '30', '!!float 3.2e7')
         assert_invalid(s, 'less than', '24', '-3', '0', '!!float -3.2e7', '!!float 3.2e-7')
         assert_invalid(s, 'node type', 'hello')
         
     def test_min_0(self):
-        s = schema('min_0', yaml.load('min: 0'))
+        s = schema('min_0', yaml.safe_load('min: 0'))
         assert_invalid(s, 'less than', '-1')
         assert_invalid(s, 'Expected node type to be', 'hello', '', '[]', '{}')
         
     def test_min_0dot0(self):
-        s = schema('min_0dot0', yaml.load('min: 0.0'))
+        s = schema('min_0dot0', yaml.safe_load('min: 0.0'))
         assert_invalid(s, 'less than', '-1')
         assert_invalid(s, 'Expected node type to be', 'hello', '', '[]', '{}')
         
     def test_xmin_out_of_range(self):
-        s = schema('xmin_25', yaml.load('xmin: 25'))
+        s = schema('xmin_25', yaml.safe_load('xmin: 25'))
         assert_valid(s, '26', '30', '!!float 3.2e7')
         assert_invalid(s, 'less than or equal to', '25', '25.0', '-3', '0', '!!float -3.2e7', '!!float 3.2e-7')
         assert_invalid(s, 'Expected node type to be', 'hello', '', '[]', '{}')
         
     def test_xmin_0(self):
-        s = schema('xmin_0', yaml.load('xmin: 0'))
+        s = schema('xmin_0', yaml.safe_load('xmin: 0'))
         assert_invalid(s, 'less than or equal to', '0')
         assert_invalid(s, 'Expected node type to be', 'hello', '', '[]', '{}')        
         
     def test_max_out_of_range(self):
-        s = schema('max_25', yaml.load('max: 25'))
+        s = schema('max_25', yaml.safe_load('max: 25'))
         assert_valid(s, '2', '10', '3.14', '0', '-3', '!!float 3.2e-7')
         assert_invalid(s, 'greater than', '34', '!!float 3.2e7')
         assert_invalid(s, 'Expected node type to be', 'hello', '', '[]', '{}')
         
     def test_max_0(self):
-        s = schema('max_0', yaml.load('max: 0'))
+        s = schema('max_0', yaml.safe_load('max: 0'))
         assert_invalid(s, 'greater than', '1')
         assert_invalid(s, 'Expected node type to be', 'hello', '', '[]', '{}')
       
     def test_xmax_out_of_range(self):
-        s = schema('xmax_25', yaml.load('xmax: 25'))
+        s = schema('xmax_25', yaml.safe_load('xmax: 25'))
         assert_valid(s, '2', '10', '3.14', '0', '-3', '!!float 3.2e-7')
         assert_invalid(s, 'greater than or equal to', '25', '25.0', '34', '!!float 3.2e7')
         assert_invalid(s, 'Expected node type to be', 'hello', '', '[]', '{}')
       
     def test_xmax_0(self):
-        s = schema('xmax_0', yaml.load('xmax: 0'))
+        s = schema('xmax_0', yaml.safe_load('xmax: 0'))
         assert_invalid(s, 'greater than or equal to', '0')
         assert_invalid(s, 'Expected node type to be', 'hello', '', '[]', '{}')
         
     def test_multiple_of(self):
-        s = schema('mult3', yaml.load('multiple_of: 3'))
+        s = schema('mult3', yaml.safe_load('multiple_of: 3'))
         assert_valid(s, '3', '6', '7611849', '0', '-3')
         assert_invalid(s, 'not a multiple of', '5', '2', '-26')
         assert_invalid(s, 'Expected node type to be int', '3.14', '27.0', 'hello', '{}', '[]', '')
         
     def test_length_constraints(self):
-        s = schema('3to5', yaml.load('min_length: 3\nmax_length: 5'))
+        s = schema('3to5', yaml.safe_load('min_length: 3\nmax_length: 5'))
         assert_valid(s, 'abc', 'abcde', 'four', '[a, b, c]', '[a, b, c, d, e]', '{a: 1, b: 2, c: 3}', '{a: 1, b: 2, c: 3, d: 4, e: 5}')
         assert_invalid(s, 'greater than max_length', 'too big', 'way, way too big', 'sixsix', '[1,2,3,4,5,6]', '{a: 1, b: 2, c: 3, d: 4, e: 5, f: 6}')
         assert_invalid(s, 'less than min_length', 'hi', '[]', '{x: 1}')
@@ -165,12 +165,57 @@ class schema_test(unittest.TestCase):
         assert_expected_types('multiple_of: 1\nregex: x', [])
         
     def test_expected_types_are_validated(self):
-        s = schema('impossible', yaml.load('multiple_of: 1\nregex: x'))
+        s = schema('impossible', yaml.safe_load('multiple_of: 1\nregex: x'))
         assert_invalid(s, 'No type fits', '3')
 
     def test_yaval_schema_validates_itself(self):
         ys = get_yaval_schema()
-        ys.self_validate()
+        self.assertEqual([], ys.self_validate())
+
+    def test_embedded_meta_schema_is_current(self):
+        # If this fails, run "python schema.py" to regenerate meta_schema.py.
+        import meta_schema
+        self.assertEqual(get_meta_schema_hash(), meta_schema.source_hash)
+        self.assertEqual(get_yaval_schema_yaml(), meta_schema.node)
+
+    def test_nodes_are_compact(self):
+        import pickle, weakref
+        s = schema('x', yaml.safe_load('keys: [{a: {items: int}}, b]'))
+        self.assertFalse(hasattr(s, '__dict__'))
+        self.assertFalse(hasattr(s.compile(), '__dict__'))
+        # Children are made once, and hold their parent weakly.
+        a = s.children()[0]
+        self.assertIs(a, s.children()[0])
+        self.assertIs(s, a.parent)
+        self.assertIs(s, a._parent())
+        self.assertEqual('schema:x/a/items', a.extra_schemas()[0].get_xpath())
+        copy = pickle.loads(pickle.dumps(s, pickle.HIGHEST_PROTOCOL))
+        self.assertIs(copy, copy.children()[0].parent)
+        self.assertIs(a.get_xpath(), copy.children()[0].get_xpath())
+        assert_invalid(copy, 'Expected node type to be int', '{a: [x]}')
+
+    def test_part_outlives_its_schema(self):
+        import gc
+        root = schema('x', yaml.safe_load('''
+            schema_id: 12345678-1234-1234-1234-123456789abc
+            types:
+              - pos: {type: int, min: 1}
+            root: {keys: [{n: pos}]}
+        ''')).get_root()
+        gc.collect()
+        # The schema doc is gone but for root, which still finds its
+        # parent and the doc's named types.
+        self.assertEqual('schema:x', root.parent.get_xpath())
+        self.assertEqual(['pos'], list(root.get_types()))
+        assert_invalid(root, 'less than min', '{n: 0}')
+        n = schema('y', yaml.safe_load('keys: [{n: {items: int}}]')).children()[0].extra_schemas()[0]
+        gc.collect()
+        self.assertEqual('schema:y', n.parent.parent.get_xpath())
+
+    def test_regex_normalization(self):
+        self.assertEqual('(?i)^a$', normalize_regex('/^(?i)a$/'))
+        self.assertEqual('^(?i:a)b', normalize_regex('^(?i:a)b'))
+        assert_valid(schema('r', yaml.safe_load('regex: /^(?i)ab$/')), '"AB"')
         
     def test_yaval_schema_requires_map_at_root(self):
         return
@@ -181,7 +226,7 @@ class schema_test(unittest.TestCase):
         
     def test_yaval_schema_allows_exactly_one_extra_key(self):
         ys = get_yaval_schema()
-        assert_invalid(ys, 'x: 0\ny: 1', 'exactly one key')
+        assert_invalid(ys, 'exactly one key', 'x: 0\ny: 1')
 
 
 if __name__ == '__main__':
@@ -18,5 +18,16 @@ class schema_violation_test(unittest.TestCase):
       sv = schema_violation('schema:top', 'loc', 'msg')
       self.assertEqual('Doc:loc violates schema:top. msg', str(sv))
 
+  def test_doc_paths(self):
+      path = item_doc_path(child_doc_path(child_doc_path('/', 'a'), 2), 3)
+      self.assertEqual('/a/2[3]', format_doc_path(path))
+      self.assertEqual('/[0]', format_doc_path(item_doc_path('/', 0)))
+      self.assertEqual('/x/y', format_doc_path(child_doc_path('/x', 'y')))
+
+  def test_lazy_msg(self):
+      sv = schema_violation('schema:top', child_doc_path('/', 'k'), ('Value is %s.', ('odd',)), 'v')
+      self.assertEqual('Value is odd.', sv.msg)
+      self.assertEqual("Doc:/k with value='v' violates schema:top. Value is odd.", str(sv))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,104 @@
+import os, sys, io, unittest, tracemalloc, yaml
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+from schema import *
+from streaming import *
+
+def _messages(errors):
+    return sorted(str(e) for e in errors)
+
+class streaming_test(unittest.TestCase):
+
+    def assert_same_as_in_memory(self, schema_txt, doc_txt):
+        v = schema('x', yaml.safe_load(schema_txt)).compile()
+        expected = _messages(v.validate(yaml.safe_load(doc_txt)))
+        for loader in ['python', 'auto']:
+            self.assertEqual(expected, _messages(validate_stream(v, doc_txt, loader)))
+        return expected
+
+    def test_scalars(self):
+        self.assertEqual(1, len(self.assert_same_as_in_memory('min: 3', '2')))
+        self.assertEqual([], self.assert_same_as_in_memory('regex: ^a', 'abc'))
+
+    def test_maps(self):
+        schema_txt = 'keys: [{a: int}, {b: {min_length: 2}}]\nrequired: [a, c]\nmax_length: 2'
+        errors = self.assert_same_as_in_memory(schema_txt, 'b: x\nd: 1\ne: {f: 1}')
+        self.assertEqual(6, len(errors))
+
+    def test_seqs_and_fields(self):
+        schema_txt = 'items: {fields: [{name: str}, {amount: number}], required: [name, amount]}'
+        errors = self.assert_same_as_in_memory(schema_txt, '- [eggs, 12]\n- [milk]\n- [a, b, c]\n- 5')
+        self.assertEqual(4, len(errors))
+
+    def test_extras(self):
+        schema_txt = 'keys: [a]\nextras: {type: int, min_length: 1, max_length: 1}'
+        self.assertEqual(2, len(self.assert_same_as_in_memory(schema_txt, 'a: 1\nb: x\nc: 3')))
+
+    def test_type_errors_skip_subtree(self):
+        errors = self.assert_same_as_in_memory('items: {min: 0}', '{a: [1, -1]}')
+        self.assertEqual(1, len(errors))
+
+    def test_anchors_and_aliases(self):
+        schema_txt = 'items: {keys: [{n: {min: 0}}]}'
+        self.assertEqual(2, len(self.assert_same_as_in_memory(schema_txt, '- &x {n: -1}\n- *x\n- {n: 1}')))
+
+    def test_merge_keys(self):
+        schema_txt = 'items: {keys: [{n: {min: 0}}, {m: str}]}'
+        self.assertEqual(3, len(self.assert_same_as_in_memory(schema_txt,
+            '- &base {n: -1}\n- {<<: *base, m: hi}\n- {<<: {m: 3}}')))
+
+    def test_named_types(self):
+        schema_txt = '''types:
+  - tree: {keys: [{name: str}, {children: {items: tree}}], required: [name]}
+  - small: {type: int, max: 9}
+root: {keys: [{t: tree}, {n: {type: small, min: 1}}, {u: str|small}]}'''
+        errors = self.assert_same_as_in_memory(schema_txt,
+            't: {name: a, children: [{name: b}, {children: []}]}\nn: 0\nu: 12')
+        self.assertEqual(3, len(errors))
+
+    def test_refined_named_types(self):
+        schema_txt = '''types:
+  - row: {fields: [{name: str}, {n: {type: int, min: 0}}], required: [name]}
+  - rows: {items: row, max_length: 3}
+root:
+  keys:
+    - r: {type: rows, min_length: 2}
+    - s: {type: row, max_length: 1}
+    - t: {type: str|rows}'''
+        errors = self.assert_same_as_in_memory(schema_txt,
+            'r: [[a, 1], [b, -1], [c], 5]\ns: [a, x]\nt: [[a]]')
+        self.assertEqual(5, len(errors))
+        self.assertEqual(3, len(self.assert_same_as_in_memory(schema_txt, 'r: [[a, 1]]\ns: 5\nt: 5')))
+
+    def test_refined_named_type_is_not_built(self):
+        # A node that refines a named type is streamed through both, so it
+        # takes no more memory than a bare reference to the type.
+        text = ''.join('- [r%d, %d]\n' % (i, i) for i in range(4000))
+        peaks = []
+        for root in ['rows', '{type: rows, max_length: 5000}']:
+            v = schema('x', yaml.safe_load('types:\n  - rows: {items: {fields: [str, int]}}\nroot: %s' % root)).compile()
+            tracemalloc.start()
+            try:
+                self.assertEqual([], validate_stream(v, io.StringIO(text)))
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+        self.assertLess(peaks[1], peaks[0] * 1.5)
+
+    def test_lines_and_columns(self):
+        v = schema('x', yaml.safe_load('keys: [{a: str}, {b: {items: {min: 0}, max_length: 1}}]')).compile()
+        errors = list(iter_stream_violations(v, 'a: 1\nb:\n  - 1\n  - -2\n'))
+        self.assertEqual([(1, 4), (4, 5), (3, 3)], [(e.line, e.column) for e in errors])
+
+    def test_file_stream(self):
+        v = schema('x', yaml.safe_load('items: int')).compile()
+        path = os.path.join(folder_under_test, 'samples', 'shopping-list', 'schema.yaml')
+        with open(path, 'r') as f:
+            errors = validate_stream(v, f)
+        self.assertEqual(1, len(errors))
+
+if __name__ == '__main__':
+    unittest.main()
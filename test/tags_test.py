@@ -0,0 +1,106 @@
+import os, sys, io, unittest, yaml
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+from schema import *
+from tags import *
+from streaming import validate_stream
+
+schema_text = '''
+schema_id: 12345678-1234-1234-1234-123456789abc
+tags: [all]
+types:
+  - address:
+      tags: [+pii]
+      keys: [{zip: {regex: '^\\d+$'}}, {city: str}]
+      required: [zip]
+person:
+  keys:
+    - name: {type: str, tags: [critical]}
+    - age: {type: int, min: 0}
+    - home: address
+    - work: {type: address, tags: [-all, +critical]}
+    - notes: {items: {max_length: 3}, tags: [+cosmetic]}
+  required: [name, age]
+'''
+
+doc_text = '''
+name: 5
+age: -1
+home: {zip: x}
+work: {zip: y, city: 3}
+notes: [abcdef]
+extra: 1
+'''
+
+def _paths(errors):
+    return [str(e).split(' ')[0] for e in errors]
+
+class tags_test(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = schema('t', yaml.safe_load(schema_text))
+        self.doc = yaml.safe_load(doc_text)
+
+    def test_parse_tags(self):
+        self.assertEqual((frozenset(['a', 'b']), frozenset(['b']), frozenset(['c'])),
+            parse_tags(['a', '+b', '-c']))
+        self.assertEqual(no_tags, parse_tags(None))
+
+    def test_tag_index(self):
+        index = self.schema.get_tag_index()
+        self.assertEqual({'all'}, index['schema:t/person/age'])
+        self.assertEqual({'all', 'critical'}, index['schema:t/person/name'])
+        # + reaches the items; a plain tag doesn't reach anything.
+        self.assertEqual({'all', 'cosmetic'}, index['schema:t/person/notes/items'])
+        # -all stops the doc's tag at work; address is also used by home.
+        self.assertEqual({'critical'}, index['schema:t/person/work'])
+        self.assertEqual({'all', 'critical', 'pii'}, index['schema:t/types/address/zip'])
+
+    def test_only_tag(self):
+        selected = self.schema.select_tags(only=['critical'])
+        self.assertEqual(['Doc:/name', 'Doc:/work/zip', 'Doc:/work/city'], _paths(selected.validate(self.doc)))
+        # The schema itself is unchanged.
+        self.assertEqual(7, len(self.schema.validate(self.doc)))
+
+    def test_skip_tag(self):
+        selected = self.schema.select_tags(skip=['pii', 'cosmetic'])
+        self.assertEqual(['Doc:/', 'Doc:/name', 'Doc:/age'], _paths(selected.validate(self.doc)))
+
+    def test_nothing_selected(self):
+        self.assertEqual([], self.schema.select_tags(only=['nope']).validate(self.doc))
+        self.assertEqual([], self.schema.select_tags(skip=['all', 'critical']).validate(self.doc))
+
+    def test_pruned_subtrees_are_not_visited(self):
+        v = self.schema.select_tags(skip=['cosmetic']).compile()
+        self.assertIsNone(v.keys['notes'])
+        self.assertIsNotNone(v.keys['name'])
+
+    def test_recursive_type(self):
+        s = schema('r', yaml.safe_load('''
+            schema_id: 12345678-1234-1234-1234-123456789abc
+            types:
+              - tree: {keys: [{n: {type: int, tags: [leafy]}}, {kids: {items: tree}}]}
+            root: tree
+        '''))
+        doc = {'n': 'a', 'kids': [{'n': 'b', 'kids': [{'n': 1}]}]}
+        self.assertEqual(['Doc:/n', 'Doc:/kids[0]/n'], _paths(s.select_tags(only=['leafy']).validate(doc)))
+        self.assertEqual([], s.select_tags(skip=['leafy']).validate(doc))
+
+    def test_streaming_matches(self):
+        for only, skip in [([], []), (['critical'], []), ([], ['pii', 'cosmetic']), (['pii'], [])]:
+            v = self.schema.select_tags(only, skip).compile()
+            expected = sorted(_paths(v.validate(self.doc)))
+            self.assertEqual(expected, sorted(_paths(validate_stream(v, io.StringIO(doc_text)))))
+
+    def test_streaming_keeps_anchors_in_pruned_subtrees(self):
+        text = 'notes: [&n abcdef]\nname: *n\nage: 1\n'
+        v = self.schema.select_tags(skip=['cosmetic']).compile()
+        self.assertEqual([], validate_stream(v, io.StringIO(text)))
+        text = 'notes: [&n 5]\nname: *n\nage: 1\n'
+        self.assertEqual(['Doc:/name'], _paths(validate_stream(v, io.StringIO(text))))
+
+if __name__ == '__main__':
+    unittest.main()
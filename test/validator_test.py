@@ -0,0 +1,154 @@
+import os, sys, unittest, yaml
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+from schema import *
+
+class validator_test(unittest.TestCase):
+
+    def test_compile_is_reused(self):
+        s = schema('x', yaml.safe_load('min: 1'))
+        self.assertIs(s.compile(), s.compile())
+
+    def test_only_present_constraints_are_checked(self):
+        v = schema('x', yaml.safe_load('min: 1\nmax: 5')).compile()
+        self.assertEqual(2, len(v.checks))
+        self.assertEqual(('date', 'float', 'int'), v.expected)
+
+    def test_date_bounds(self):
+        def msgs(schema_txt, doc_txt):
+            return [e.msg for e in schema('x', yaml.safe_load(schema_txt)).validate(yaml.safe_load(doc_txt))]
+        # A date can't be compared with a number; that's a violation, not a crash.
+        self.assertEqual(["Value can't be compared with min (0)."], msgs('min: 0', '2020-01-01'))
+        self.assertEqual([], msgs('min: 0', '5'))
+        # A date and a timestamp are compared by day.
+        self.assertEqual([], msgs('min: 2020-01-01', '2020-01-01 10:00:00'))
+        self.assertEqual([], msgs('max: 2020-01-01', '2020-01-01 10:00:00'))
+        self.assertEqual(['Value is less than min (2020-01-02)'], msgs('min: 2020-01-02', '2020-01-01 10:00:00'))
+        self.assertEqual(['Value is greater than or equal to xmax (2020-01-01 00:00:00).'],
+            msgs('xmax: 2020-01-01 00:00:00', '2020-01-01'))
+        # Long columns are checked in bulk, and fall back to the same checks.
+        v = schema('x', yaml.safe_load('items: {min: 0}')).compile()
+        doc = yaml.safe_load('[%s]' % ', '.join(['1'] * 100 + ['2020-01-01']))
+        self.assertEqual(['/[100]'], [e.doc_xpath for e in v.validate(doc)])
+
+    def test_bare_type_has_no_checks(self):
+        v = schema('x', 'str').compile()
+        self.assertEqual((), v.checks)
+        self.assertEqual(('str',), v.expected)
+
+    def test_regex_is_compiled_once(self):
+        v = schema('x', yaml.safe_load('regex: ^a+$')).compile()
+        self.assertIs(v.regex, v.schema.get_regex())
+        self.assertEqual([], v.validate('aaa'))
+        self.assertEqual(1, len(v.validate('b')))
+
+    def test_keys_and_required(self):
+        s = schema('x', yaml.safe_load('keys: [{a: int}, b]\nrequired: [a]'))
+        self.assertEqual([], s.validate({'a': 1, 'b': 'anything'}))
+        errors = [str(e) for e in s.validate({'b': 2, 'c': 3})]
+        self.assertEqual(2, len(errors))
+        self.assertTrue('Missing required key "a"' in errors[0])
+        self.assertTrue('Key "c" is not declared' in errors[1])
+
+    def test_extras_count_and_members(self):
+        s = schema('x', yaml.safe_load('keys: [a]\nextras: {type: int, max_length: 1}'))
+        self.assertEqual([], s.validate({'a': 1, 'b': 2}))
+        errors = [str(e) for e in s.validate({'b': 'two', 'c': 3})]
+        self.assertTrue('/b' in errors[1] and 'Expected node type to be int' in errors[1])
+        self.assertTrue('at most one key' in errors[0])
+
+    def test_items(self):
+        s = schema('x', yaml.safe_load('items: {min: 0}'))
+        self.assertEqual([], s.validate([1, 2, 3]))
+        errors = s.validate([1, -2, 3, -4])
+        self.assertEqual(['/[1]', '/[3]'], [e.doc_xpath for e in errors])
+
+    def test_fields(self):
+        s = schema('x', yaml.safe_load('fields: [{name: str}, {amount: number}]\nrequired: [name, amount]'))
+        self.assertEqual([], s.validate(['eggs', 12]))
+        self.assertEqual([], s.validate(['flour', 2.5]))
+        errors = [str(e) for e in s.validate(['eggs'])]
+        self.assertTrue('Missing required field "amount"' in errors[0])
+        errors = [str(e) for e in s.validate(['eggs', 12, 'dozen'])]
+        self.assertTrue('extras are not allowed' in errors[0])
+
+    def test_key_and_value_type(self):
+        s = schema('x', yaml.safe_load('key_type: str\nvalue_type: int'))
+        self.assertEqual([], s.validate({'a': 1}))
+        errors = s.validate({'a': 'one', 2: 2})
+        self.assertEqual(['/a', '/2'], [e.doc_xpath for e in errors])
+
+    def test_nested_items(self):
+        node = 'int'
+        doc = 'oops'
+        for i in range(100):
+            node = {'items': node}
+            doc = [doc]
+        errors = schema('x', node).validate(doc)
+        self.assertEqual(1, len(errors))
+        self.assertEqual('/' + '[0]' * 100, errors[0].doc_xpath)
+
+    def test_max_errors(self):
+        s = schema('x', yaml.safe_load('items: {min: 0}'))
+        errors = s.validate([-1, -2, -3, -4], max_errors=2)
+        self.assertEqual(['/[0]', '/[1]'], [e.doc_xpath for e in errors])
+        self.assertEqual(4, len(s.validate([-1, -2, -3, -4])))
+
+    def test_iter_violations(self):
+        v = schema('x', yaml.safe_load('items: {min: 0}')).compile()
+        errors = v.iter_violations([-1, -2, -3])
+        self.assertEqual('/[0]', next(errors).doc_xpath)
+        self.assertEqual(['/[1]', '/[2]'], [e.doc_xpath for e in errors])
+
+    named_types_txt = '''types:
+  - tree: {keys: [{name: str}, {children: {items: tree}}], required: [name]}
+  - small: {type: int, max: 9}
+root: {keys: [{t: tree}, {n: {type: small, min: 1}}, {u: str|small}]}'''
+
+    def test_named_types_share_one_validator(self):
+        s = schema('x', yaml.safe_load(self.named_types_txt))
+        tree = s.get_types()['tree'].compile()
+        root = s.compile()
+        self.assertIs(tree, root.keys['t'])
+        self.assertIs(tree, tree.keys['children'].items)
+
+    def test_recursive_named_type(self):
+        s = schema('x', yaml.safe_load(self.named_types_txt))
+        doc = {'name': 'leaf'}
+        for i in range(1000):
+            doc = {'name': 'n%d' % i, 'children': [doc]}
+        self.assertEqual([], s.validate({'t': doc}))
+        doc['children'].append({'children': []})
+        errors = [str(e) for e in s.validate({'t': doc})]
+        self.assertEqual(1, len(errors))
+        self.assertTrue('Missing required key "name"' in errors[0])
+        self.assertTrue('schema:x/types/tree' in errors[0])
+
+    def test_refinement_of_named_type(self):
+        s = schema('x', yaml.safe_load(self.named_types_txt))
+        self.assertEqual([], s.validate({'n': 5, 'u': 'five'}))
+        self.assertEqual([], s.validate({'u': 5}))
+        errors = [str(e) for e in s.validate({'n': 0, 'u': 12})]
+        self.assertEqual(2, len(errors))
+        self.assertTrue('less than min (1)' in errors[0])
+        self.assertTrue('/u' in errors[1] and 'greater than max (9)' in errors[1])
+        errors = [str(e) for e in s.validate({'n': 'x', 'u': 1.5})]
+        self.assertTrue('Expected node type to be int, not str' in errors[0])
+        self.assertTrue('Expected node type to be str|int, not float' in errors[1])
+
+    def test_type_cycle(self):
+        s = schema('x', yaml.safe_load('types: [{a: b}, {b: {type: a, min: 1}}]\nroot: {items: a}'))
+        errors = [str(e) for e in s.validate([1])]
+        self.assertEqual(1, len(errors))
+        self.assertTrue('defined in terms of itself' in errors[0])
+
+    def test_unresolved_type_name(self):
+        s = schema('x', yaml.safe_load('items: {type: nonesuch}'))
+        errors = [str(e) for e in s.validate([1])]
+        self.assertTrue('Type "nonesuch" is not a built-in type or a named type' in errors[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os, sys, unittest, tempfile, shutil
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+from watcher import *
+
+class watcher_test(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        for name in ['a.yaml', 'sub/b.yml', 'sub/notes.txt', '.hidden/c.yaml']:
+            self.write(name, 'x: 1\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, name, text):
+        path = os.path.join(self.folder, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_list_docs(self):
+        other = os.path.join(self.folder, 'sub', 'notes.txt')
+        self.assertEqual([other, os.path.join(self.folder, 'a.yaml'), os.path.join(self.folder, 'sub', 'b.yml')],
+            list_docs([other, self.folder]))
+
+    def test_changes(self):
+        for use_inotify in [True, False]:
+            watcher = file_watcher([self.folder], use_inotify)
+            try:
+                self.assertEqual(([], []), watcher.changes(0.1))
+                a = self.write('a.yaml', 'x: 2\n')
+                d = self.write('sub/d.yaml', 'x: 1\n')
+                self.assertEqual(([a, d], []), watcher.changes(2))
+                os.remove(d)
+                self.assertEqual(([], [d]), watcher.changes(2))
+            finally:
+                watcher.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import os, sys, io, json, unittest, tempfile, shutil, contextlib, subprocess
+
+my_folder = os.path.dirname(os.path.abspath(__file__))
+folder_under_test = os.path.abspath(os.path.join(my_folder, '..'))
+sys.path = [folder_under_test] + sys.path
+
+import yaval
+
+shopping_list_schema = os.path.join(folder_under_test, 'samples', 'shopping-list', 'schema.yaml')
+
+class yaval_test(unittest.TestCase):
+
+    def setUp(self):
+        yaval.use_schema_cache = False
+        self.folder = tempfile.mkdtemp()
+        self.docs = []
+        for i, text in enumerate(['- [eggs, 12]\n', '- [milk, x]\n- 5\n', '[["tea", 1]]', '- [a, b]\n']):
+            path = os.path.join(self.folder, 'doc%d.yaml' % i)
+            with open(path, 'w') as f:
+                f.write(text)
+            self.docs.append(path)
+
+    def tearDown(self):
+        yaval.max_errors = None
+        yaval.output_format = 'text'
+        yaval.chunk_docs = None
+        yaval.streaming = False
+        shutil.rmtree(self.folder)
+
+    def load_schema(self):
+        return yaval.load_schema(shopping_list_schema, yaval.validation_context(shopping_list_schema, buffered=True))
+
+    def test_serial(self):
+        s = self.load_schema()
+        counts = []
+        for doc in self.docs:
+            ctx = yaval.validation_context(doc, buffered=True)
+            yaval.yaval_one_file(s, doc, ctx)
+            counts.append(ctx.error_count)
+        self.assertEqual([0, 2, 0, 1], counts)
+
+    def test_pool_matches_serial_order(self):
+        s = self.load_schema()
+        results = [ctx for ctx, last in yaval.yaval_many_files(s, self.docs, 2)]
+        self.assertEqual(self.docs, [ctx.path for ctx in results])
+        self.assertEqual([0, 2, 0, 1], [ctx.error_count for ctx in results])
+        self.assertEqual(2, len(results[1].output))
+
+    def test_stdin_with_jobs(self):
+        env = dict(os.environ, XDG_CACHE_HOME=os.path.join(self.folder, 'cache'),
+            YAVAL_SOCKET=os.path.join(self.folder, 'no-daemon.sock'))
+        results = []
+        for jobs in ['1', '2']:
+            done = subprocess.run([sys.executable, os.path.join(folder_under_test, 'yaval.py'),
+                '--no-daemon', '-j', jobs, '--format', 'jsonl', shopping_list_schema, self.docs[0], '-', self.docs[2]],
+                input='- [milk, x]\n- 5\n', capture_output=True, text=True, env=env)
+            records = [json.loads(line) for line in done.stdout.splitlines()]
+            results.append((done.returncode, [(r['file'], r['doc_xpath']) for r in records]))
+        self.assertEqual((2, [('-', '/[0][1]'), ('-', '/[1]')]), results[0])
+        self.assertEqual(results[0], results[1])
+
+    def test_memo_with_sample_is_rejected(self):
+        done = subprocess.run([sys.executable, os.path.join(folder_under_test, 'yaval.py'),
+            '--no-daemon', '--memo', '100', '--sample', '10', shopping_list_schema, self.docs[0]],
+            capture_output=True, text=True)
+        self.assertEqual(2, done.returncode)
+        self.assertIn('--memo does not work with --sample', done.stderr)
+
+    def test_max_errors_stops_early(self):
+        s = self.load_schema()
+        yaval.max_errors = 1
+        for jobs in [1, 2]:
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr):
+                results = list(yaval.yaval_files(s, self.docs, jobs))
+            self.assertEqual(self.docs[:2], [ctx.path for ctx in results])
+            self.assertEqual([0, 1], [ctx.error_count for ctx in results])
+            self.assertEqual(1, stderr.getvalue().count('Error: '))
+
+    def test_jsonl_records(self):
+        s = self.load_schema()
+        yaval.output_format = 'jsonl'
+        ctx = yaval.validation_context(self.docs[1], buffered=True)
+        yaval.yaval_one_file(s, self.docs[1], ctx)
+        records = [json.loads(text) for stream_name, text, is_error in ctx.output if stream_name == 'stdout']
+        self.assertEqual(2, len(records))
+        self.assertEqual(self.docs[1], records[0]['file'])
+        self.assertEqual('/[0][1]', records[0]['doc_xpath'])
+        self.assertEqual('schema:schema/shopping_list/items/amount', records[0]['schema_xpath'])
+        self.assertEqual((1, 10), (records[0]['line'], records[0]['column']))
+        self.assertEqual((2, 3), (records[1]['line'], records[1]['column']))
+
+    def test_multi_doc_stream(self):
+        s = self.load_schema()
+        path = os.path.join(self.folder, 'stream.yaml')
+        with open(path, 'w') as f:
+            for i in range(10):
+                f.write('---\n- [eggs, %s]\n' % ('x' if i in (3, 8) else i))
+        yaval.output_format = 'jsonl'
+        ctx = yaval.validation_context(path, buffered=True)
+        yaval.yaval_one_file(s, path, ctx)
+        records = [json.loads(text) for stream_name, text, is_error in ctx.output if stream_name == 'stdout']
+        self.assertEqual([(3, 8), (8, 18)], [(r['doc_index'], r['line']) for r in records])
+        # Chunks of one stream, validated in parallel, add up to the same.
+        yaval.chunk_docs = 3
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            results = list(yaval.yaval_files(s, [path, self.docs[1]], 2))
+        self.assertEqual([path, self.docs[1]], [ctx.path for ctx in results])
+        self.assertEqual([2, 2], [ctx.error_count for ctx in results])
+        records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([3, 8, None, None], [r['doc_index'] for r in records])
+
+    def test_falsy_single_doc(self):
+        from schema import schema
+        s = schema('x', {'items': 'int', 'min_length': 1})
+        counts = []
+        for i, text in enumerate(['[]\n', '--- []\n', '--- []\n--- []\n', '', '# nothing\n']):
+            path = os.path.join(self.folder, 'falsy%d.yaml' % i)
+            with open(path, 'w') as f:
+                f.write(text)
+            ctx = yaval.validation_context(path, buffered=True)
+            yaval.yaval_one_file(s, path, ctx)
+            counts.append(ctx.error_count)
+        self.assertEqual([1, 1, 2, 0, 0], counts)
+
+    def test_stream_multi_doc(self):
+        from schema import schema
+        s = schema('x', {'items': 'int', 'min_length': 1})
+        yaval.output_format = 'jsonl'
+        def check(text):
+            path = os.path.join(self.folder, 'streamed.yaml')
+            with open(path, 'w') as f:
+                f.write(text)
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()):
+                yaval.yaval_one_file(s, path, yaval.validation_context(path))
+            return [(r['doc_index'], r['doc_xpath'], r['line']) for r in map(json.loads, stdout.getvalue().splitlines())]
+        for text in ['[1, x]\n', '- 1\n---\n- x\n--- []\n--- [2, 3, y]\n']:
+            expected = check(text)
+            yaval.streaming = True
+            self.assertEqual(expected, check(text))
+            yaval.streaming = False
+        self.assertEqual([(1, '/[0]', 3), (2, '/', 4), (3, '/[2]', 5)], expected)
+
+    def test_watch_one_file(self):
+        s = self.load_schema()
+        path = os.path.join(self.folder, 'watched.yaml')
+        yaval.output_format = 'jsonl'
+        docs = []
+        def watch(text):
+            with open(path, 'w') as f:
+                f.write(text)
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()):
+                yaval.watch_one_file(s, path, docs)
+            return [(r['doc_index'], r['line']) for r in map(json.loads, stdout.getvalue().splitlines())]
+        self.assertEqual([(1, 3)], watch('- [eggs, 1]\n---\n- [milk, x]\n'))
+        second = docs[1]
+        # The second doc is unchanged, so it isn't parsed again, but its
+        # errors are reported where they are now.
+        self.assertEqual([(0, 2), (1, 4)], watch('- [eggs, 1]\n- [tea, y]\n---\n- [milk, x]\n'))
+        self.assertIs(second[2], docs[1][2])
+        self.assertEqual([], watch('- [eggs, 1]\n'))
+        self.assertEqual(1, len(docs))
+
+if __name__ == '__main__':
+    unittest.main()
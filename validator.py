@@ -0,0 +1,486 @@
+import sys, itertools, datetime, operator
+
+from schema_violation import *
+from datatypes import *
+
+# Each check is a plain function that takes the value being validated and a
+# single operand from the schema, and that returns None, or an error message
+# as a (template, args) tuple that is only formatted if it gets printed.
+# Keeping them at module level (rather than building closures per schema node)
+# means a compiled validator is nothing but data plus references to these
+# functions.
+
+def _check_regex(value, r):
+    if not r.search(value):
+        return 'Value "%s" does not match regex /%s/.', (value, r.pattern)
+
+def _check_multiple_of(value, n):
+    if value % n != 0:
+        return 'Value is not a multiple of %d.', (n,)
+
+def _compare_by_day(value, n, op):
+    # For a value and a bound that python can't compare: a date and a
+    # timestamp (or timestamps with and without a time zone) are compared
+    # by day. Return None if they can't be compared at all, like a date and
+    # a number.
+    if isinstance(value, datetime.date) and isinstance(n, datetime.date):
+        if isinstance(value, datetime.datetime):
+            value = value.date()
+        if isinstance(n, datetime.datetime):
+            n = n.date()
+        return op(value, n)
+    return None
+
+_incomparable_err_txt = "Value can't be compared with %s (%s)."
+
+def _check_max(value, n):
+    try:
+        bad = value > n
+    except TypeError:
+        bad = _compare_by_day(value, n, operator.gt)
+        if bad is None:
+            return _incomparable_err_txt, ('max', n)
+    if bad:
+        return 'Value is greater than max (%s).', (n,)
+
+def _check_xmax(value, n):
+    try:
+        bad = value >= n
+    except TypeError:
+        bad = _compare_by_day(value, n, operator.ge)
+        if bad is None:
+            return _incomparable_err_txt, ('xmax', n)
+    if bad:
+        return 'Value is greater than or equal to xmax (%s).', (n,)
+
+def _check_min(value, n):
+    try:
+        bad = value < n
+    except TypeError:
+        bad = _compare_by_day(value, n, operator.lt)
+        if bad is None:
+            return _incomparable_err_txt, ('min', n)
+    if bad:
+        return 'Value is less than min (%s)', (n,)
+
+def _check_xmin(value, n):
+    try:
+        bad = value <= n
+    except TypeError:
+        bad = _compare_by_day(value, n, operator.le)
+        if bad is None:
+            return _incomparable_err_txt, ('xmin', n)
+    if bad:
+        return 'Value is less than or equal to xmin (%s).', (n,)
+
+def _check_max_length(value, n):
+    if len(value) > n:
+        return 'Length of %d is greater than max_length (%s).', (len(value), n)
+
+def _check_min_length(value, n):
+    if len(value) < n:
+        return 'Length of %d is less than min_length (%s).', (len(value), n)
+
+# Order matters; it determines the order in which errors are reported.
+_bounded_checks = [
+    ('max', _check_max),
+    ('xmax', _check_xmax),
+    ('min', _check_min),
+    ('xmin', _check_xmin),
+    ('max_length', _check_max_length),
+    ('min_length', _check_min_length),
+]
+
+_exactly_one_key_err_txt = 'Expected exactly one key (besides /schema_* and /types) to define the top-level node in the schema.'
+
+def _count_phrase(n, noun):
+    if n == 1:
+        return 'one %s' % noun
+    return '%d %ss' % (n, noun)
+
+def _check_extras_count(v, count, noun, section):
+    lo, hi = v.extras_min, v.extras_max
+    if lo is not None and lo == hi:
+        if count != lo:
+            return 'Expected exactly %s besides those declared in %s; found %d.', (
+                _count_phrase(lo, noun), section, count)
+    elif lo is not None and count < lo:
+        return 'Expected at least %s besides those declared in %s; found %d.', (
+            _count_phrase(lo, noun), section, count)
+    elif hi is not None and count > hi:
+        return 'Expected at most %s besides those declared in %s; found %d.', (
+            _count_phrase(hi, noun), section, count)
+
+def _walk_map(v, value, xpath, stack, errors):
+    for name in v.required:
+        if name not in value:
+            errors.append(schema_violation(v.schema, xpath, ('Missing required key "%s".', (name,)), value))
+    keys = v.keys
+    key_type = v.key_type
+    value_type = v.value_type
+    extras = v.extras
+    extras_allowed = v.extras_allowed
+    constrain_extras = keys is not None or extras_allowed
+    extra_count = 0
+    children = []
+    for k, item in value.items():
+        child_xpath = child_doc_path(xpath, k)
+        if key_type:
+            children.append((key_type, k, child_xpath))
+        child = keys.get(k) if keys else None
+        if child is not None:
+            children.append((child, item, child_xpath))
+        elif keys is not None and k in keys:
+            pass
+        elif value_type:
+            children.append((value_type, item, child_xpath))
+        elif constrain_extras:
+            if not extras_allowed:
+                errors.append(schema_violation(v.schema, xpath,
+                    ('Key "%s" is not declared in keys, and extras are not allowed.', (k,)), value))
+                continue
+            extra_count += 1
+            if extras:
+                children.append((extras, item, child_xpath))
+    if extras_allowed:
+        msg = _check_extras_count(v, extra_count, 'key', 'keys')
+        if msg:
+            errors.append(schema_violation(v.schema, xpath, msg, value))
+    # Reverse so that, once popped, children are visited in doc order.
+    children.reverse()
+    stack.extend(children)
+
+def _walk_seq(v, value, xpath, stack, errors):
+    items = v.items
+    if items:
+        # With sampling (see sampling.py), only some items of a long
+        # sequence are checked.
+        index = v.sample.pick(len(value), xpath) if v.sample is not None else None
+        column = value if index is None else [value[i] for i in index]
+        bad = None
+        if v.batch:
+            # Only set from columnar, so this import is just a lookup.
+            import columnar
+            if len(column) >= columnar.batch_min:
+                # Find the items with problems in bulk; only they are visited.
+                bad = v.batch(items, column)
+                if bad is not None and index is not None:
+                    bad = [index[i] for i in bad]
+        if bad is not None:
+            children = [(items, value[i], item_doc_path(xpath, i)) for i in bad]
+        elif index is not None:
+            children = [(items, value[i], item_doc_path(xpath, i)) for i in index]
+        else:
+            children = [(items, item, item_doc_path(xpath, i)) for i, item in enumerate(value)]
+    else:
+        children = []
+        fields = v.fields
+        if fields is not None:
+            for name, i in v.required_fields:
+                if i >= len(value):
+                    errors.append(schema_violation(v.schema, xpath, ('Missing required field "%s".', (name,)), value))
+            n = len(fields)
+            for i, item in enumerate(value):
+                if i < n:
+                    if fields[i]:
+                        children.append((fields[i], item, item_doc_path(xpath, i)))
+                elif not v.extras_allowed:
+                    errors.append(schema_violation(v.schema, xpath,
+                        ('Found %d fields, but only %d are declared, and extras are not allowed.', (len(value), n)), value))
+                    break
+                elif v.extras:
+                    children.append((v.extras, item, item_doc_path(xpath, i)))
+            if v.extras_allowed:
+                msg = _check_extras_count(v, max(len(value) - n, 0), 'field', 'fields')
+                if msg:
+                    errors.append(schema_violation(v.schema, xpath, msg, value))
+    children.reverse()
+    stack.extend(children)
+
+# Which walker, if any, descends into a container of a given python type.
+_walkers = {
+    map_type: _walk_map,
+    seq_type: _walk_seq,
+    tuple_type: _walk_seq,
+}
+
+def _walk_ref(v, value, xpath, stack, errors):
+    # The node must also satisfy the named type that this schema refines.
+    t = type(value)
+    walker = v.walkers.get(t)
+    if walker:
+        walker(v, value, xpath, stack, errors)
+    # With alternatives like str|address, only values of the named type's
+    # types are checked against it.
+    ref = v.ref
+    if t in ref.dispatch or ref.accepts_any or not ref.built:
+        stack.append((ref, value, xpath))
+
+def _compile_child(child):
+    '''
+    Compile a child schema, returning None if it imposes no constraints at
+    all (a bare member name, for example); that lets walkers skip it.
+    '''
+    v = child.compile()
+    if not v.built:
+        # A recursive named type, still being built; it can't be pruned.
+        return v
+    if v.accepts_any and not v.checks and not any(v.dispatch.values()):
+        return None
+    return v
+
+# Validators that accept the same types share one dispatch table (and one
+# table of walkers), rather than each holding a copy; they never change
+# once built.
+_tables = {}
+
+def _share(table):
+    return _tables.setdefault(tuple(table.items()), table)
+
+_no_table = _share({})
+
+class validator:
+    '''
+    A validator is the compiled form of a schema. All the analysis that a
+    schema requires (which constraints are present, which types are implied,
+    what the regex compiles to, which members are declared, which named
+    types are referenced) happens once, when the validator is built.
+    Afterward, validating a node only runs the checks that actually apply.
+    '''
+    __slots__ = ('schema', 'built', 'type_error', 'expected', 'checks', 'regex',
+        'dispatch', 'walkers', 'ref', 'accepts_any', 'keys', 'fields', 'required',
+        'required_fields', 'items', 'key_type', 'value_type', 'extras',
+        'extras_allowed', 'extras_min', 'extras_max', 'batch', 'tags', 'sample',
+        '__weakref__')
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.built = False
+        self.type_error = None
+        self.expected = None
+        self.checks = ()
+        self.regex = None
+        self.dispatch = _no_table
+        self.walkers = _no_table
+        self.ref = None
+        self.accepts_any = True
+        self.keys = None
+        self.fields = None
+        self.required = ()
+        self.required_fields = ()
+        self.items = None
+        self.key_type = None
+        self.value_type = None
+        self.extras = None
+        self.extras_allowed = False
+        self.extras_min = None
+        self.extras_max = None
+        self.batch = None
+        # What the schema node's tags say, if it has any: see tags.py.
+        self.tags = None
+        # A sampler, if only some items of long sequences are to be checked.
+        self.sample = None
+
+    def build(self):
+        '''
+        Do the work of compiling. This is separate from construction so that
+        a named type can refer to itself: its validator already exists (and
+        can be linked to) while it is being built.
+        '''
+        schema = self.schema
+        if schema.is_doc():
+            # Only reached when the doc doesn't have exactly one top-level
+            # construct; otherwise the schema compiles its root instead.
+            self.expected = ()
+            self.accepts_any = False
+            self.type_error = _exactly_one_key_err_txt
+        else:
+            tags = schema.get_def_for('tags')
+            if tags is not None:
+                from tags import parse_tags
+                self.tags = parse_tags(tags)
+            self._compile_types()
+            if self.accepts_any or self.expected:
+                self._compile_checks()
+                self._compile_ref()
+                self._compile_members()
+                self._compile_batch()
+        self.built = True
+        return self
+
+    def _compile_types(self):
+        schema = self.schema
+        expected = schema.get_expected_types()
+        if schema._type_problem:
+            self.expected = ()
+            self.accepts_any = False
+            self.type_error = schema._type_problem
+        elif expected is None:
+            self.expected = None
+        elif not expected:
+            self.expected = ()
+            self.accepts_any = False
+            msg = 'No type fits all the properties specified in the schema:'
+            implied = schema._implied_type_map
+            for key in implied:
+                msg += '\n    - %s implies type %s' % (key, '|'.join(implied[key]))
+            self.type_error = msg
+        else:
+            self.expected = tuple(expected)
+            self.type_error = sys.intern('Expected node type to be %s, not %%s.' % '|'.join(expected))
+            self.accepts_any = False
+
+    def _compile_checks(self):
+        schema = self.schema
+        self.regex = schema.get_regex()
+        checks = []
+        if self.regex:
+            checks.append((_check_regex, self.regex))
+        n = schema.get_def_for('multiple_of')
+        if n:
+            checks.append((_check_multiple_of, n))
+        for key, check in _bounded_checks:
+            n = schema.get_def_for(key)
+            if n is not None:
+                checks.append((check, n))
+        self.checks = tuple(checks)
+
+    def _compile_ref(self):
+        # A node_def like {type: address, required: [zip]} refines a named
+        # type; both must be satisfied. (A bare reference like "address"
+        # never gets here; it shares the named type's validator outright.)
+        named = self.schema.get_type_ref()
+        if named is not None and named is not self.schema:
+            self.ref = named.compile()
+
+    def _compile_members(self):
+        schema = self.schema
+        node = schema.node
+        if not is_map(node):
+            self._compile_dispatch()
+            return
+        members = list(schema.children())
+        required = schema.get_def_for('required') or ()
+        if 'fields' in node:
+            self.fields = tuple(_compile_child(child) for child in members)
+            names = [child.name for child in members]
+            self.required_fields = tuple((name, names.index(name))
+                for name in required if name in names)
+        else:
+            if 'keys' in node:
+                self.keys = dict((child.name, _compile_child(child)) for child in members)
+            self.required = tuple(required)
+        for child in schema.extra_schemas():
+            if child.name == 'extras':
+                self._compile_extras(child)
+            else:
+                setattr(self, child.name, _compile_child(child))
+        self._compile_dispatch()
+
+    def _compile_extras(self, child):
+        # Length constraints on "extras" limit how many extra members there
+        # may be; everything else constrains each extra member.
+        self.extras_allowed = True
+        node = child.node
+        if is_map(node):
+            self.extras_min = node.get('min_length')
+            self.extras_max = node.get('max_length')
+            node = dict((k, v) for k, v in node.items() if k not in ('min_length', 'max_length'))
+            if not node:
+                return
+            child = child.__class__(child.name, node, child.parent)
+        self.extras = _compile_child(child)
+
+    def _compile_dispatch(self):
+        structured = (self.keys is not None or self.fields is not None or
+            self.items or self.key_type or self.value_type or self.required or
+            self.extras_allowed)
+        if self.accepts_any:
+            names = python_types_for_name.keys()
+        else:
+            names = self.expected
+        dispatch = {}
+        walkers = {}
+        for name in names:
+            for t in python_types_for_name.get(name, ()):
+                walker = _walkers.get(t) if structured else None
+                if walker:
+                    walkers[t] = walker
+                dispatch[t] = _walk_ref if self.ref else walker
+        self.dispatch = _share(dispatch)
+        self.walkers = _share(walkers)
+
+    def _compile_batch(self):
+        # A sequence of scalars, or of rows of scalars, can be checked a
+        # column at a time (see columnar.py).
+        items = self.items
+        if items is None or not items.built:
+            return
+        import columnar
+        if columnar.is_leaf(items):
+            self.batch = columnar.failing_indices
+        elif (items.fields is not None and items.ref is None and
+                all(columnar.is_leaf(field) for field in items.fields) and
+                columnar.is_leaf(items.extras)):
+            self.batch = columnar.failing_rows
+
+    def type_violation(self, yaml_node, node_xpath):
+        msg = self.type_error
+        if self.expected:
+            msg = (msg, (get_simple_type_name(yaml_node),))
+        return schema_violation(self.schema, node_xpath, msg, yaml_node)
+
+    def check_node(self, yaml_node, node_xpath, errors):
+        '''
+        Check a single node (but not its descendants) and append any errors.
+        Return the walker that should descend into the node, if any.
+        '''
+        try:
+            walker = self.dispatch[type(yaml_node)]
+        except KeyError:
+            if not self.accepts_any:
+                errors.append(self.type_violation(yaml_node, node_xpath))
+                # If the type isn't right, the remaining checks are useless.
+                return None
+            walker = None
+        for check, operand in self.checks:
+            msg = check(yaml_node, operand)
+            if msg:
+                errors.append(schema_violation(self.schema, node_xpath, msg, yaml_node))
+        return walker
+
+    def iter_violations(self, yaml_node, node_xpath='/', memo=None, profile=None):
+        '''
+        Validate a node and all its descendants, yielding each error as soon
+        as it is found. Descendants are tracked on an explicit stack rather
+        than by recursion, so deep docs cost neither a python frame per level
+        nor a brush with the recursion limit. Validation goes no further than
+        the consumer reads. A memo (see memo.py) lets repeated subtrees be
+        looked up instead of validated again. A profile (see profiler.py)
+        records where the time goes, schema node by schema node.
+        '''
+        if profile is not None:
+            yield from profile.iter_violations(self, yaml_node, node_xpath)
+            return
+        if memo is not None:
+            yield from memo.iter_violations(self, yaml_node, node_xpath)
+            return
+        errors = []
+        stack = [(self, yaml_node, node_xpath)]
+        pop = stack.pop
+        while stack:
+            v, node, xpath = pop()
+            walker = v.check_node(node, xpath, errors)
+            if walker:
+                walker(v, node, xpath, stack, errors)
+            if errors:
+                yield from errors
+                errors.clear()
+
+    def validate(self, yaml_node, node_xpath='/', max_errors=None, memo=None, profile=None):
+        '''
+        Validate a node and all its descendants, and return a list of errors.
+        An empty list means the node is valid. If max_errors is given,
+        validation stops as soon as that many errors have been found.
+        '''
+        return list(itertools.islice(self.iter_violations(yaml_node, node_xpath, memo, profile), max_errors))
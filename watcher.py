@@ -0,0 +1,148 @@
+import os, time
+
+# Noticing when docs change. Each time something might have changed, the
+# watched files are stat'ed again and compared with what was seen before;
+# inotify (on linux) only says when to look, so that edits show up at once
+# and nothing is done in between. Without it, files are looked at every
+# poll_interval seconds.
+
+# Files with these extensions are validated when a folder is watched.
+doc_extensions = ('.yaml', '.yml', '.json')
+
+poll_interval = 0.5
+
+# Editors often save in several steps (write a temp file, rename it, set
+# its mode); changes are gathered for this long before they are acted on.
+settle_time = 0.05
+
+def list_docs(paths):
+    '''
+    Return the files named in paths, plus the docs (by extension) anywhere
+    beneath the folders named in paths, in a stable order. Hidden folders
+    are skipped.
+    '''
+    docs = []
+    for path in paths:
+        if not os.path.isdir(path):
+            docs.append(path)
+            continue
+        found = []
+        for folder, subfolders, files in os.walk(path):
+            subfolders[:] = [name for name in subfolders if not name.startswith('.')]
+            found.extend(os.path.join(folder, name) for name in files
+                if name.endswith(doc_extensions) and not name.startswith('.'))
+        docs.extend(sorted(found))
+    return docs
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+# inotify_add_watch() mask: anything that can change which files exist or
+# what they hold.
+_in_mask = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200 | 0x400 | 0x800
+
+class _inotify:
+    # Just enough of inotify, through ctypes, to wait for a change in any of
+    # a set of folders.
+    def __init__(self):
+        import ctypes
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.folders = set()
+
+    def watch(self, folder):
+        if folder not in self.folders:
+            if self._libc.inotify_add_watch(self.fd, os.fsencode(folder), _in_mask) >= 0:
+                self.folders.add(folder)
+
+    def wait(self, timeout=None):
+        import select
+        if select.select([self.fd], [], [], timeout)[0]:
+            # The events themselves don't matter; the caller looks again.
+            os.read(self.fd, 65536)
+            return True
+        return False
+
+    def close(self):
+        os.close(self.fd)
+
+class file_watcher:
+    '''
+    Watches files, and the docs in folders, for changes. changes() waits
+    until at least one file was added, changed or removed since the last
+    call (or since the watcher was made), and says which.
+    '''
+    def __init__(self, paths, use_inotify=True):
+        self.paths = list(paths)
+        self.stamps = self._scan()
+        self._inotify = None
+        if use_inotify:
+            try:
+                self._inotify = _inotify()
+            except (OSError, AttributeError):
+                # Not linux, or out of inotify instances: poll.
+                self._inotify = None
+        self._watch_folders()
+
+    def files(self):
+        return list(self.stamps)
+
+    def _scan(self):
+        stamps = {}
+        for path in list_docs(self.paths):
+            stamp = _stamp(path)
+            if stamp is not None:
+                stamps[path] = stamp
+        return stamps
+
+    def _watch_folders(self):
+        if self._inotify is None:
+            return
+        for path in self.paths:
+            if os.path.isdir(path):
+                for folder, subfolders, files in os.walk(path):
+                    subfolders[:] = [name for name in subfolders if not name.startswith('.')]
+                    self._inotify.watch(folder)
+            else:
+                # Editors replace files as often as they rewrite them, so
+                # the folder is watched rather than the file.
+                self._inotify.watch(os.path.dirname(os.path.abspath(path)))
+
+    def changes(self, timeout=None):
+        '''
+        Return (changed, removed): the files added or modified, and the files
+        that are gone. Both are empty if nothing happened within timeout
+        seconds (if given).
+        '''
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            if self._inotify is not None:
+                left = None if deadline is None else max(deadline - time.time(), 0)
+                if self._inotify.wait(left):
+                    time.sleep(settle_time)
+                    while self._inotify.wait(0):
+                        pass
+            else:
+                time.sleep(poll_interval if deadline is None else
+                    max(min(poll_interval, deadline - time.time()), 0))
+            stamps = self._scan()
+            changed = [path for path, stamp in stamps.items() if self.stamps.get(path) != stamp]
+            removed = [path for path in self.stamps if path not in stamps]
+            self.stamps = stamps
+            if changed or removed:
+                # Folders may have been added.
+                self._watch_folders()
+                return changed, removed
+            if deadline is not None and time.time() >= deadline:
+                return [], []
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
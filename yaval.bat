@@ -1,4 +1,4 @@
-@echo off
-title yaval
-python "%~dp0\yaval.py" %*
-title 
+@echo off
+title yaval
+python -c "import sys; sys.path.insert(0, sys.argv.pop(1)); import yaval; yaval.main()" "%~dp0." %*
+title 
@@ -1,33 +1,324 @@
-import os, sys, argparse, yaml, traceback, re
+import os, sys, io, argparse, yaml, re, itertools, collections
+
+from schema import *
+from loaders import *
+from schema_cache import *
+# Already imported by schema; named here for regexes.regex_backend, which
+# changes once --regex-engine is read.
+import regexes
+
+# Runs that check one small doc (from a git hook, say) spend most of their
+# time starting up, so modules that only some runs need (multiprocessing,
+# streaming, codegen, result_cache, daemon, memo, profiler, sampling and the
+# like) are imported where they're used. The launchers import this module
+# and call main(), so that python can use its cached bytecode; "python
+# yaval.py" compiles it on every run.
 
 verbose = False            
+loader = 'auto'
+streaming = False
+use_schema_cache = True
+use_result_cache = False
+max_errors = None
+output_format = 'text'
+output_formats = ['text', 'jsonl']
+# When set, a subtree_memo shared by all the docs this process validates.
+memo = None
+# Multi-doc streams are read this many docs at a time. When chunk_docs is
+# set, that is the size instead, and with several jobs, the chunks of one
+# stream are validated in parallel.
+default_chunk_docs = 256
+chunk_docs = None
+# When set, a schema_profile that validation of docs (not of the schema)
+# reports to, and how to present it at the end.
+profile = None
+profile_top = 20
+profile_sort = 'self'
+profile_collapsed = None
+# With --only-tag or --skip-tag, only the schema nodes with (or without)
+# these tags are checked.
+only_tags = []
+skip_tags = []
+# With --sample, a sampler (see sampling.py) that picks which items of long
+# sequences are checked.
+sample = None
     
 class validation_context:
-    def __init__(self, path):
+    def __init__(self, path, buffered=False, max_errors=None):
         self.path = path
+        # How many errors validating this doc may report, if limited.
+        self.max_errors = max_errors
         self.error_count = 0
         self.warning_count = 0
+        # When buffered, output is held as (stream_name, text, is_error)
+        # triples so that a parent process can replay it in a deterministic
+        # order.
+        self.output = [] if buffered else None
+
+    def errors_left(self):
+        # How many more errors may be reported, or None if there is no limit.
+        if self.max_errors is None:
+            return None
+        return max(self.max_errors - self.error_count, 0)
+
+def write(stream_name, text, ctx, is_error=False):
+    if ctx.output is None:
+        getattr(sys, stream_name).write(text)
+    else:
+        ctx.output.append((stream_name, text, is_error))
 
-def yaval_one_node(schema, node, ctx):
-    pass
+def yaval_one_node(schema, node, ctx, source=None, doc_index=None, profile=None):
+    # Errors are reported as they're found, not collected first. A
+    # source_map, if given, only reads the doc's text again when there is an
+    # error to locate.
+    errors = schema.iter_violations(node, memo=memo, profile=profile)
+    for e in itertools.islice(errors, ctx.errors_left()):
+        if doc_index is not None:
+            e.doc_index = doc_index
+        if source is not None:
+            source.locate(e)
+        violation_err(e, ctx)
+    s = schema.compile().sample
+    if s is not None:
+        sequences, total, checked = s.take()
+        if sequences:
+            report('Checked a sample of %d of the %d items in %d long sequence(s).' % (
+                checked, total, sequences), ctx)
 
 def yaval_one_file(schema, doc_path, ctx):
-    node = load_yaml(doc_path, ctx)
-    if node:
-        yaval_one_node(schema, node, ctx)
+    if doc_path == '-':
+        yaval_one_text(schema, '<stdin>', sys.stdin.read(), ctx)
+        return
+    if streaming:
+        stream_one_file(schema, doc_path, ctx)
+        return
+    if not os.path.isfile(doc_path):
+        err('File %s does not exist or is unavailable.' % doc_path, ctx)
+        return
+    report('Parsing yaml in %s.' % doc_path, ctx)
+    try:
+        with open(doc_path, 'r') as f:
+            yaval_chunks(schema, doc_path, split_stream(f, chunk_docs or default_chunk_docs), ctx)
+    except (IOError, UnicodeDecodeError) as e:
+        err(unreadable_msg(doc_path, e), ctx)
+
+def yaval_one_text(schema, name, text, ctx):
+    yaval_chunks(schema, name, split_stream(io.StringIO(text), chunk_docs or default_chunk_docs), ctx)
+
+def yaval_chunks(schema, name, chunks, ctx):
+    '''
+    Validate the docs in the chunks of a yaml stream (see split_stream). A
+    stream of one doc is validated as a whole; a longer one a doc at a time,
+    so memory use doesn't grow with the number of docs, and its errors say
+    which doc they are about.
+    '''
+    first = next(chunks)
+    second = next(chunks, None)
+    if second is None and first[2] <= 1:
+        text = first[0]
+        node = load_yaml_text(text, name, ctx, loader)
+        # Docs like [], {}, 0 and false are checked too. None means there
+        # was no doc, or it didn't parse; as in yaval_one_chunk, it's skipped.
+        if node is not None:
+            yaval_one_node(schema, node, ctx, source_map(text, loader), profile=profile)
+        return
+    for chunk in itertools.chain([first], [second] if second else [], chunks):
+        yaval_one_chunk(schema, name, chunk, ctx)
+        if ctx.errors_left() == 0:
+            return
+
+def yaval_one_chunk(schema, name, chunk, ctx):
+    text, first_doc, doc_count, first_line = chunk
+    source = source_map(text, loader, first_doc, first_line)
+    doc_index = first_doc
+    try:
+        for node in parse_all(text, name, loader):
+            if node is not None:
+                yaval_one_node(schema, node, ctx, source, doc_index, profile)
+                if ctx.errors_left() == 0:
+                    return
+            doc_index += 1
+    except yaml.YAMLError as e:
+        chunk_syntax_err(name, e, first_line, ctx)
+    except ValueError as e:
+        err('Unable to parse %s.\n%s' % (name, indent(capitalize(str(e)), '  ')), ctx)
+
+def chunk_syntax_err(name, e, first_line, ctx):
+    # The parser counted lines from the start of the chunk.
+    for attr in ('context_mark', 'problem_mark'):
+        mark = getattr(e, attr, None)
+        if mark is not None:
+            setattr(e, attr, yaml.Mark(mark.name, mark.index,
+                mark.line + first_line, mark.column, None, None))
+    yaml_syntax_err(name, e, ctx)
+
+def stream_one_file(schema, doc_path, ctx):
+    if not os.path.isfile(doc_path):
+        err('File %s does not exist or is unavailable.' % doc_path, ctx)
+        return
+    report('Streaming yaml in %s.' % doc_path, ctx)
+    from streaming import iter_stream_violations
+    try:
+        with open(doc_path, 'r') as f:
+            # As without --stream, docs are only numbered in multi-doc
+            # streams. Counting stops at the second doc, so only single-doc
+            # files are read to the end first.
+            multi_doc = count_docs(f, 2) > 1
+            f.seek(0)
+            errors = iter_stream_violations(schema.compile(), f, loader)
+            for e in itertools.islice(errors, ctx.max_errors):
+                if not multi_doc:
+                    e.doc_index = None
+                violation_err(e, ctx)
+    except yaml.YAMLError as e:
+        yaml_syntax_err(doc_path, e, ctx)
+
+def _init_worker(worker_settings):
+    global verbose, loader, streaming, max_errors, output_format, memo, chunk_docs
+    verbose, loader, streaming, max_errors, output_format, memo_size, chunk_docs, schema = worker_settings
+    if memo_size:
+        from memo import subtree_memo
+        memo = subtree_memo(memo_size)
+    else:
+        memo = None
+    _worker_state['schema'] = schema
+
+_worker_state = {}
+
+class _task:
+    # A unit of work for the pool: a whole file, one chunk of a stream that
+    # was read and split by the parent, or stdin, which the parent read.
+    def __init__(self, path, chunk=None, whole=True, last=True, problem=None, text=None):
+        self.path = path
+        self.chunk = chunk
+        # The text of stdin; a worker's own stdin is empty.
+        self.text = text
+        # Is the chunk the entire stream?
+        self.whole = whole
+        # Is this the file's last task?
+        self.last = last
+        # An error the parent ran into, to report in order.
+        self.problem = problem
+
+def _do_task(task):
+    # A worker can't know what other workers have found, so each task is
+    # held to the overall limit; the parent trims the total.
+    ctx = validation_context(task.path, buffered=True, max_errors=max_errors)
+    schema = _worker_state['schema']
+    if task.problem:
+        err(task.problem, ctx)
+    elif task.text is not None:
+        yaval_one_text(schema, '<stdin>', task.text, ctx)
+    elif task.chunk is None:
+        yaval_one_file(schema, task.path, ctx)
+    elif task.whole:
+        yaval_chunks(schema, task.path, iter([task.chunk]), ctx)
+    else:
+        yaval_one_chunk(schema, task.path, task.chunk, ctx)
+    return ctx
+
+def _yaval_in_worker(tasks):
+    return [_do_task(task) for task in tasks]
+
+def _tasks(docs):
+    for doc_path in docs:
+        if doc_path == '-':
+            yield _task(doc_path, text=sys.stdin.read())
+            continue
+        if not chunk_docs or streaming or not os.path.isfile(doc_path):
+            yield _task(doc_path)
+            continue
+        try:
+            with open(doc_path, 'r') as f:
+                chunks = split_stream(f, chunk_docs)
+                chunk = next(chunks)
+                whole = True
+                for following in chunks:
+                    yield _task(doc_path, chunk, whole=False, last=False)
+                    chunk = following
+                    whole = False
+                yield _task(doc_path, chunk, whole=whole)
+        except (IOError, UnicodeDecodeError) as e:
+            yield _task(doc_path, problem=unreadable_msg(doc_path, e))
+
+def yaval_many_files(schema, docs, jobs):
+    '''
+    Validate docs in a pool of worker processes, yielding a finished
+    validation_context for each task, in the same order as docs, along with
+    whether it was the doc's last. A task is a whole doc, unless chunk_docs
+    is set, in which case multi-doc streams are read here and their chunks
+    become separate tasks. Only a few batches of tasks are in flight at
+    once, so long streams are read no faster than they are validated. The
+    schema is compiled once, here; workers receive the compiled form
+    (inherited when processes fork, pickled otherwise) and never re-parse
+    it.
+    '''
+    import multiprocessing
+    schema.compile()
+    settings = (verbose, loader, streaming, max_errors, output_format,
+        memo.max_entries if memo else None, chunk_docs, schema)
+    batch_size = max(1, len(docs) // (jobs * 4))
+    tasks = _tasks(docs)
+    pending = collections.deque()
+    pool = multiprocessing.Pool(jobs, _init_worker, (settings,))
+    try:
+        while True:
+            batch = list(itertools.islice(tasks, batch_size))
+            if batch:
+                pending.append((batch, pool.apply_async(_yaval_in_worker, (batch,))))
+            if not pending:
+                break
+            if not batch or len(pending) > jobs * 2:
+                batch, result = pending.popleft()
+                for task, ctx in zip(batch, result.get()):
+                    yield ctx, task.last
+    finally:
+        # If the caller stopped early, there's no point finishing the rest.
+        pool.terminate()
+        pool.join()
 
 def report(msg, ctx):
     if verbose:
-        sys.stdout.write(msg.strip() + '\n')
+        # With jsonl, stdout carries nothing but error records.
+        write('stderr' if output_format == 'jsonl' else 'stdout', msg.strip() + '\n', ctx)
     
-def err(msg, ctx, error=True):
-    sys.stderr.write('Error: ' + msg.strip() + '\n')
+def err(msg, ctx, error=True, mark=None):
+    if output_format == 'jsonl':
+        write_record(ctx, msg.strip(), line=mark.line + 1 if mark else None,
+            column=mark.column + 1 if mark else None)
+        return
+    write('stderr', 'Error: ' + msg.strip() + '\n', ctx, is_error=True)
+    ctx.error_count += 1
+
+def violation_err(e, ctx):
+    if output_format == 'jsonl':
+        write_record(ctx, e.msg, e.doc_xpath, e.schema_xpath, e.line, e.column, e.doc_index)
+    else:
+        where = []
+        if e.doc_index is not None:
+            where.append('doc %d' % e.doc_index)
+        if e.line is not None:
+            where.append('line %d, column %d' % (e.line, e.column))
+        text = str(e)
+        if where:
+            text += ' (%s)' % ', '.join(where)
+        err(text, ctx)
+
+def write_record(ctx, msg, doc_xpath=None, schema_xpath=None, line=None, column=None, doc_index=None):
+    '''
+    Report an error as one line of json, for tools to consume as it arrives.
+    doc_index is only set for docs in multi-doc streams.
+    '''
+    import json
+    record = {'file': ctx.path, 'doc_index': doc_index, 'doc_xpath': doc_xpath,
+        'schema_xpath': schema_xpath, 'message': msg, 'line': line, 'column': column}
+    write('stdout', json.dumps(record) + '\n', ctx, is_error=True)
     ctx.error_count += 1
             
 def warn(msg, ctx):
     ctx.warning_count += 1
     if verbose:
-        sys.stderr.write('Warning: ' + msg.strip() + '\n')
+        write('stderr', 'Warning: ' + msg.strip() + '\n', ctx)
         
 def capitalize(sentence):
     if sentence[0].islower():
@@ -38,42 +329,164 @@ def indent(paragraph, prefix):
     return prefix + paragraph.replace('\n', '\n' + prefix)
     
 useless_yaml_ctx_pat = re.compile(r'\n\s*in "<string>",\s*', re.M)
-def load_yaml(path, ctx):
+def yaml_syntax_err(path, e, ctx):
+    e_txt = capitalize(useless_yaml_ctx_pat.sub(' ', str(e)))
+    err('YAML syntax error in %s.\n%s' % (path, indent(e_txt, '  ')), ctx,
+        mark=getattr(e, 'problem_mark', None))
+
+def unreadable_msg(path, e):
+    return 'Unable to read %s.\n%s' % (path, indent(str(e), '  '))
+
+def read_yaml(path, ctx):
     if os.path.isfile(path):
         report('Parsing yaml in %s.' % path, ctx)
         try:
             with open(path, 'r') as f:
-                loaded = yaml.load(f.read())
-                return loaded
-        except yaml.YAMLError as e:
-            e_txt = capitalize(useless_yaml_ctx_pat.sub(' ', str(e)))
-            err('YAML syntax error in %s.\n%s' % (path, indent(e_txt, 2)), ctx)
-        except:
-            e_txt = traceback.format_exc()
-            err('''YAML syntax error in %s.
+                return f.read()
+        except (IOError, UnicodeDecodeError) as e:
+            err(unreadable_msg(path, e), ctx)
+    else:
+        err('File %s does not exist or is unavailable.' % path, ctx)
+
+def load_yaml_text(text, path, ctx, backend='auto'):
+    try:
+        return parse(text, path, backend)
+    except yaml.YAMLError as e:
+        yaml_syntax_err(path, e, ctx)
+    except ValueError as e:
+        # Raised by the json parser, or for an unavailable loader.
+        err('Unable to parse %s.\n%s' % (path, indent(capitalize(str(e)), '  ')), ctx)
+    except:
+        import traceback
+        err('''YAML syntax error in %s.
   Location was not captured by parser; try simplifying doc bit
   by bit to narrow down the source.  
 %s''' % (path, indent(traceback.format_exc(), '    ')), ctx)
-    else:
-        err('File %s does not exist or is unavailable.' % path, ctx)
     
 def load_schema(schema_path, ctx):
     report('Loading schema from %s.' % schema_path, ctx)
+    # A schema that was already validated and compiled on an earlier run
+    # can be reused as-is, as long as its text hasn't changed.
+    schema_text = None
+    if use_schema_cache and os.path.isfile(schema_path):
+        with open(schema_path, 'r') as f:
+            schema_text = f.read()
+        cached = load_cached_schema(schema_text)
+        if cached:
+            report('Using cached compiled schema for %s.' % schema_path, ctx)
+            return cached
     # This proves that the schema is well formed yaml, but nothing more.
-    schema = load_yaml(schema_path, ctx)
-    if schema:
+    text = schema_text if schema_text is not None else read_yaml(schema_path, ctx)
+    doc = load_yaml_text(text, schema_path, ctx) if text is not None else None
+    if doc:
         # Prove that the schema matches the schema for yaval schemas.
-        yaval_one_node(meta_schema, schema, ctx)
+        yaval_one_node(get_meta_schema(), doc, ctx, source_map(text))
         # Also prove that the schema makes sense, semantically. This
         # is a step beyond schema validation, and is not technically
         # necessary--but we do it to help schema writers debug and
         # produce the best possible schemas.
         
         if not ctx.error_count:
-            return schema
+            loaded = schema(os.path.splitext(os.path.basename(schema_path))[0], doc)
+            try:
+                # Compile now, so that a regex that doesn't compile is
+                # reported as a problem with the schema.
+                loaded.compile()
+            except ValueError as e:
+                err(str(e), ctx)
+            else:
+                if schema_text is not None:
+                    store_cached_schema(schema_text, loaded)
+                return loaded
     err("The schema itself is not valid, so it can't be used to test other docs.", ctx)
 
-def yaval(schema_path, docs):
+def select_tags(schema, ctx):
+    '''
+    Return the part of a loaded schema that --only-tag and --skip-tag say to
+    check (or the whole schema, if neither was given).
+    '''
+    if not (only_tags or skip_tags):
+        return schema
+    known = set()
+    for tags in schema.get_tag_index().values():
+        known.update(tags)
+    for tag in only_tags + skip_tags:
+        if tag not in known:
+            warn('No node in the schema has the tag "%s".' % tag, ctx)
+    return schema.select_tags(only_tags, skip_tags)
+
+def sample_schema(schema):
+    # With --sample, only some items of long sequences are checked.
+    return schema.sample(sample) if sample else schema
+
+def remaining_errors(error_count):
+    '''
+    Return how many more errors may be reported after error_count have been,
+    or None if there is no limit.
+    '''
+    if max_errors is None:
+        return None
+    return max(max_errors - error_count, 0)
+
+def replay(ctx, limit=None):
+    # Write buffered output, dropping any errors beyond the limit.
+    for stream_name, text, is_error in ctx.output:
+        if is_error:
+            if limit == 0:
+                continue
+            if limit is not None:
+                limit -= 1
+        getattr(sys, stream_name).write(text)
+
+def yaval_files(schema, docs, jobs=1):
+    '''
+    Validate docs, yielding a finished validation_context for each, in
+    order. Output has already been written when a context is yielded. If
+    max_errors is set, stop as soon as that many errors have been reported;
+    docs after that point are not validated or yielded.
+    '''
+    error_count = 0
+    if jobs > 1 and (len(docs) > 1 or chunk_docs):
+        # Contexts for the chunks of one doc are added up into the first.
+        doc_ctx = None
+        for ctx, last in yaval_many_files(schema, docs, jobs):
+            limit = remaining_errors(error_count)
+            replay(ctx, limit)
+            if limit is not None:
+                ctx.error_count = min(ctx.error_count, limit)
+            error_count += ctx.error_count
+            if doc_ctx is None:
+                doc_ctx = ctx
+            else:
+                doc_ctx.error_count += ctx.error_count
+                doc_ctx.warning_count += ctx.warning_count
+            if last or remaining_errors(error_count) == 0:
+                yield doc_ctx
+                doc_ctx = None
+            if remaining_errors(error_count) == 0:
+                return
+    else:
+        for doc_path in docs:
+            ctx = validation_context(doc_path, max_errors=remaining_errors(error_count))
+            yaval_one_file(schema, doc_path, ctx)
+            error_count += ctx.error_count
+            yield ctx
+            if remaining_errors(error_count) == 0:
+                return
+
+def get_result_cache(schema_path):
+    from result_cache import result_cache
+    # Results depend on the schema and on how docs are parsed.
+    with open(schema_path, 'r') as f:
+        fingerprint = get_schema_fingerprint(f.read())
+    name = '%s-%s' % (fingerprint, loader)
+    if only_tags or skip_tags:
+        # A doc that passes part of the schema isn't known to pass all of it.
+        import hashlib
+        name += '-' + hashlib.sha1(repr((sorted(only_tags), sorted(skip_tags))).encode('utf-8')).hexdigest()[:12]
+    return result_cache(name)
+
+def yaval(schema_path, docs, jobs=1):
     # Begin by loading the schema and confirming that it's useful.
     exit_code = 0
     ctx = validation_context(schema_path)
@@ -81,20 +494,419 @@ def yaval(schema_path, docs):
     if not schema:
         exit_code = 255
     else:
+        schema = sample_schema(select_tags(schema, ctx))
+        cache = None
+        if use_result_cache:
+            cache = get_result_cache(schema_path)
+            changed = [doc_path for doc_path in docs if not cache.is_known_valid(doc_path)]
+            report('Skipping %d doc(s) that are unchanged since they last validated.' % (
+                len(docs) - len(changed)), ctx)
+            docs = changed
         # Now use the schema to validate each doc.
-        for doc_path in docs:
-            ctx = validation_context(doc_path)
-            yaval_one_file(schema, doc_path, ctx)
+        done = 0
+        for ctx in yaval_files(schema, docs, jobs):
+            done += 1
             exit_code += ctx.error_count
-    if not exit_code:
+            if cache:
+                cache.record(ctx.path, ctx.error_count == 0)
+        if cache:
+            cache.save()
+        if remaining_errors(exit_code) == 0:
+            report('Stopped after %d error(s); skipped %d doc(s).' % (
+                exit_code, len(docs) - done), validation_context(None))
+        if profile:
+            write_profile()
+    if not exit_code and output_format == 'text':
         print('Valid.')
     sys.exit(exit_code)
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(prog='yaval', description='Validate one or more yaml docs against a schema.')
-    parser.add_argument('schema', help='schema to use')
-    parser.add_argument('doc', nargs='+', help='doc(s) to validate')
+def write_profile():
+    sys.stderr.write(profile.report(profile_top, profile_sort))
+    if profile_collapsed:
+        with open(profile_collapsed, 'w') as f:
+            profile.write_collapsed(f)
+
+def yaval_compile(schema_path, output_path=None):
+    '''
+    Generate a standalone validator module for a schema. Return an exit code.
+    '''
+    ctx = validation_context(schema_path)
+    schema = load_schema(schema_path, ctx)
+    if not schema:
+        return 255
+    schema = select_tags(schema, ctx)
+    from codegen import generate_source
+    source = generate_source(schema, os.path.basename(schema_path))
+    if output_path:
+        with open(output_path, 'w') as f:
+            f.write(source)
+        report('Wrote validator for %s to %s.' % (schema_path, output_path), ctx)
+    else:
+        sys.stdout.write(source)
+    return 0
+
+def watch_one_file(schema, path, docs):
+    '''
+    Validate a doc that is new or has changed, and report on it. docs holds
+    (text, incremental_doc, errors) for each doc in the file's stream, as of
+    the last time; it is updated. Docs whose text is unchanged aren't parsed
+    again, and in the rest, only subtrees that changed are validated again.
+    '''
+    import time
+    from incremental import incremental_doc
+    start = time.perf_counter()
+    ctx = validation_context(path, max_errors=max_errors)
+    text = read_yaml(path, ctx)
+    if text is None:
+        del docs[:]
+        return ctx
+    chunks = list(split_stream(io.StringIO(text), 1))
+    for i, (doc_text, first_doc, doc_count, first_line) in enumerate(chunks):
+        if i == len(docs):
+            docs.append((None, incremental_doc(schema.compile()), []))
+        old_text, inc, errors = docs[i]
+        if doc_text != old_text:
+            try:
+                node = next(parse_all(doc_text, path, loader), None)
+                errors = inc.update(node) if node is not None else []
+            except yaml.YAMLError as e:
+                chunk_syntax_err(path, e, first_line, ctx)
+                doc_text, errors = None, []
+            except ValueError as e:
+                err('Unable to parse %s.\n%s' % (path, indent(capitalize(str(e)), '  ')), ctx)
+                doc_text, errors = None, []
+            docs[i] = (doc_text, inc, errors)
+        source = source_map(doc_text, loader, first_doc, first_line) if doc_text else None
+        for e in itertools.islice(errors, ctx.errors_left()):
+            # Errors are kept for next time, where they may have moved.
+            e = e.copy()
+            if len(chunks) > 1:
+                e.doc_index = first_doc
+            if source is not None:
+                source.locate(e)
+            violation_err(e, ctx)
+    del docs[len(chunks):]
+    summary = '%s: %s (%.1f ms).' % (path, '%d error(s)' % ctx.error_count if ctx.error_count else 'valid',
+        (time.perf_counter() - start) * 1000)
+    write('stderr' if output_format == 'jsonl' else 'stdout', summary + '\n', ctx)
+    return ctx
+
+def yaval_watch(schema_path, paths):
+    '''
+    Validate the docs in paths (files, or folders of them), then validate
+    each again whenever it changes, until interrupted. If the schema
+    changes, it is loaded again and every doc is validated again.
+    '''
+    from watcher import file_watcher
+    watcher = file_watcher([schema_path] + list(paths))
+    schema_key = os.path.abspath(schema_path)
+    # What watch_one_file() keeps for each doc.
+    states = {}
+    schema = None
+    changed, removed = [schema_path], []
+    try:
+        while True:
+            if any(os.path.abspath(path) == schema_key for path in changed):
+                ctx = validation_context(schema_path)
+                schema = load_schema(schema_path, ctx)
+                if schema:
+                    schema = sample_schema(select_tags(schema, ctx))
+                states.clear()
+                changed = watcher.files()
+            for path in removed:
+                states.pop(path, None)
+                report('%s was removed.' % path, validation_context(path))
+            if schema:
+                for path in changed:
+                    if os.path.abspath(path) != schema_key:
+                        watch_one_file(schema, path, states.setdefault(path, []))
+            changed, removed = watcher.changes()
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        watcher.close()
+
+# Compiled schemas kept resident by a daemon, keyed by absolute path and
+# regex engine. Each entry also records the file's mtime and size, so edits
+# are noticed.
+_warm_schemas = {}
+
+def get_warm_schema(schema_path, ctx):
+    key = (os.path.abspath(schema_path), regexes.regex_backend)
+    try:
+        st = os.stat(key[0])
+        stamp = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        stamp = None
+    entry = _warm_schemas.get(key)
+    if entry and stamp and entry[0] == stamp:
+        return entry[1]
+    loaded = load_schema(schema_path, ctx)
+    if loaded and stamp:
+        loaded.compile()
+        _warm_schemas[key] = (stamp, loaded)
+    return loaded
+
+def _context_msg(ctx):
+    return {'path': ctx.path, 'output': ctx.output, 'error_count': ctx.error_count}
+
+def serve_request(request, respond):
+    '''
+    Handle one request sent to a daemon (see yaval_via_daemon), streaming
+    back a response for the schema, then one per doc, then the exit code.
+    '''
+    global verbose, loader, streaming, max_errors, output_format, memo, only_tags, skip_tags, sample
+    os.chdir(request['cwd'])
+    verbose = request.get('verbose', False)
+    loader = request.get('loader', 'auto')
+    streaming = request.get('stream', False)
+    max_errors = request.get('max_errors')
+    output_format = request.get('format', 'text')
+    only_tags = request.get('only_tags', [])
+    skip_tags = request.get('skip_tags', [])
+    sample = None
+    if request.get('sample'):
+        from sampling import sampler
+        sample = sampler(*request['sample'])
+    ctx = validation_context(request['schema'], buffered=True)
+    try:
+        set_regex_backend(request.get('regex_engine', 're'))
+    except ValueError as e:
+        err(str(e), ctx)
+        respond(_context_msg(ctx))
+        respond({'exit_code': 255})
+        return
+    # The memo is kept from one request to the next, like compiled schemas.
+    # main() rejects it with --sample, so a request with both does without.
+    memo_size = request.get('memo')
+    if not memo_size or sample:
+        memo = None
+    elif memo is None or memo.max_entries != memo_size:
+        from memo import subtree_memo
+        memo = subtree_memo(memo_size)
+    schema = get_warm_schema(request['schema'], ctx)
+    if schema:
+        # The warm schema is shared by later requests, so it is left whole.
+        schema = sample_schema(select_tags(schema, ctx))
+    respond(_context_msg(ctx))
+    if not schema:
+        respond({'exit_code': 255})
+        return
+    exit_code = 0
+    # The client read stdin; like a file, it can only be read once.
+    stdin = request.get('stdin') or ''
+    for doc_path in request.get('docs', []):
+        if remaining_errors(exit_code) == 0:
+            break
+        ctx = validation_context(doc_path, buffered=True, max_errors=remaining_errors(exit_code))
+        if doc_path == '-':
+            yaval_one_text(schema, '<stdin>', stdin, ctx)
+            stdin = ''
+        else:
+            yaval_one_file(schema, doc_path, ctx)
+        exit_code += ctx.error_count
+        respond(_context_msg(ctx))
+    for name, text in request.get('texts', []):
+        if remaining_errors(exit_code) == 0:
+            break
+        ctx = validation_context(name, buffered=True, max_errors=remaining_errors(exit_code))
+        yaval_one_text(schema, name, text, ctx)
+        exit_code += ctx.error_count
+        respond(_context_msg(ctx))
+    respond({'exit_code': exit_code})
+
+def yaval_via_daemon(sock, schema_path, docs):
+    '''
+    Ask a running daemon to do what yaval() would do, and replay its output.
+    Stdin (a doc named "-") is read here and sent inline. If the daemon
+    fails, or goes away, before it is done, its output is dropped and
+    yaval() does the work in this process instead.
+    '''
+    request = {'cwd': os.getcwd(), 'schema': schema_path, 'verbose': verbose,
+        'loader': loader, 'regex_engine': regexes.regex_backend, 'stream': streaming,
+        'max_errors': max_errors, 'format': output_format, 'memo': memo.max_entries if memo else None,
+        'only_tags': only_tags, 'skip_tags': skip_tags,
+        'sample': [sample.rate, sample.count, sample.seed, sample.min_length] if sample else None,
+        'docs': docs, 'stdin': sys.stdin.read() if '-' in docs else None}
+    exit_code = None
+    problem = 'it closed the connection'
+    # Output is held until the daemon has finished, so that nothing is
+    # written twice if this process has to take over.
+    output = []
+    import daemon
+    try:
+        for msg in daemon.send_request(sock, request):
+            if 'internal_error' in msg:
+                problem = msg['internal_error']
+                break
+            if 'exit_code' in msg:
+                exit_code = msg['exit_code']
+                break
+            output.extend(msg['output'])
+    except (OSError, ValueError) as e:
+        problem = str(e)
+    if exit_code is None:
+        report('The yaval daemon failed (%s); validating here instead.' % problem, validation_context(None))
+        if request['stdin'] is not None:
+            sys.stdin = io.StringIO(request['stdin'])
+        yaval(schema_path, docs)
+    for stream_name, text, is_error in output:
+        getattr(sys, stream_name).write(text)
+    if exit_code == 255:
+        err("The schema itself is not valid, so it can't be used to test other docs.",
+            validation_context(schema_path))
+    if not exit_code and output_format == 'text':
+        print('Valid.')
+    sys.exit(exit_code)
+
+class _help_formatter(argparse.HelpFormatter):
+    # argparse makes a formatter for each add_argument() call, and each one
+    # asks shutil for the terminal's width; importing shutil and asking 20
+    # times is a noticeable share of startup. This asks os, once.
+    _width = None
+    def __init__(self, prog):
+        if _help_formatter._width is None:
+            try:
+                columns = int(os.environ.get('COLUMNS', 0)) or os.get_terminal_size(sys.__stdout__.fileno()).columns
+            except (AttributeError, ValueError, OSError):
+                columns = 80
+            _help_formatter._width = columns - 2
+        argparse.HelpFormatter.__init__(self, prog, width=_help_formatter._width)
+
+def main():
+    global verbose, loader, streaming, use_schema_cache, use_result_cache, max_errors, \
+        output_format, memo, chunk_docs, profile, profile_top, profile_sort, profile_collapsed, \
+        only_tags, skip_tags, sample
+    parser = argparse.ArgumentParser(prog='yaval', description='Validate one or more yaml docs against a schema.',
+        formatter_class=_help_formatter)
+    parser.add_argument('schema', nargs='?', help='schema to use')
+    parser.add_argument('doc', nargs='*', help='doc(s) to validate; - means stdin')
     parser.add_argument('-v', '--verbose', help='display warnings and status', action='store_true')
+    parser.add_argument('--loader', choices=loader_names, default='auto',
+        help='parser backend for docs; auto uses json or libyaml when possible')
+    parser.add_argument('--regex-engine', choices=regex_backends, default='re',
+        help="engine for schema regexes; re2 (if installed) takes linear time, for schemas you don't trust")
+    parser.add_argument('--stream', action='store_true',
+        help='validate from parse events, without loading whole docs into memory')
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+        help='validate docs in N worker processes (0 = one per cpu)')
+    parser.add_argument('--chunk-docs', type=int, metavar='N',
+        help='with --jobs, split multi-doc streams into chunks of N docs, validated in parallel')
+    parser.add_argument('--format', choices=output_formats, default='text',
+        help='how to report errors; jsonl writes one json record per error to stdout')
+    parser.add_argument('--max-errors', type=int, metavar='N',
+        help='stop validating once N errors have been reported')
+    parser.add_argument('--fail-fast', action='store_true',
+        help='stop validating at the first error (same as --max-errors 1)')
+    parser.add_argument('--memo', type=int, metavar='N',
+        help='validate repeated subtrees once, remembering up to N of them')
+    parser.add_argument('--only-tag', action='append', default=[], metavar='TAG',
+        help='check only the schema nodes tagged TAG (repeat for any of several tags)')
+    parser.add_argument('--skip-tag', action='append', default=[], metavar='TAG',
+        help="don't check the schema nodes tagged TAG (repeatable)")
+    parser.add_argument('--sample', metavar='RATE|N',
+        help='in sequences of more than --sample-min items, check only a share (0.01) or a number (500) of them, plus the first and last')
+    parser.add_argument('--sample-seed', type=int, default=0, metavar='N',
+        help='seed for the random choice of items that --sample checks (default 0)')
+    parser.add_argument('--sample-min', type=int, metavar='N',
+        help='with --sample, check sequences of up to N items in full (default 1000)')
+    parser.add_argument('--profile', action='store_true',
+        help='time each schema node, and report the most expensive ones when done')
+    parser.add_argument('--profile-top', type=int, default=20, metavar='N',
+        help='how many schema nodes --profile reports (default 20)')
+    parser.add_argument('--profile-sort', default='self', metavar='KEY',
+        help='what --profile ranks schema nodes by: self (the default), cum, visits, regex or violations')
+    parser.add_argument('--profile-collapsed', metavar='PATH',
+        help='with --profile, also write stacks of schema nodes for flamegraph tools')
+    parser.add_argument('--no-schema-cache', action='store_true',
+        help="don't reuse or save compiled schemas between runs")
+    parser.add_argument('--cache', action='store_true',
+        help='skip docs that are unchanged since they last validated against this schema')
+    parser.add_argument('--watch', action='store_true',
+        help='keep validating docs (files or folders) as they change, until interrupted')
+    parser.add_argument('--serve', action='store_true',
+        help='run a daemon that keeps compiled schemas loaded, for fast repeat validation')
+    parser.add_argument('--no-daemon', action='store_true',
+        help="validate in this process, even if a daemon is running")
+    parser.add_argument('--compile', action='store_true',
+        help='instead of validating, write a python module that validates docs against the schema')
+    parser.add_argument('-o', '--output', metavar='PATH',
+        help='where --compile writes the module (default: stdout)')
     args = parser.parse_args()
+    if args.compile:
+        if not args.schema or args.doc:
+            parser.error('--compile takes a schema and no docs')
+    elif not args.serve and not (args.schema and args.doc):
+        parser.error('a schema and at least one doc are required')
+    use_schema_cache = not args.no_schema_cache
+    use_result_cache = args.cache
+    try:
+        set_regex_backend(args.regex_engine)
+    except ValueError as e:
+        parser.error(str(e))
+    loader = args.loader
+    streaming = args.stream
+    output_format = args.format
+    only_tags = args.only_tag
+    skip_tags = args.skip_tag
+    if args.sample:
+        if streaming or use_result_cache:
+            parser.error('--sample does not work with --stream or --cache')
+        from sampling import parse_sample, sampler, default_min_length
+        try:
+            rate, count = parse_sample(args.sample)
+        except ValueError as e:
+            parser.error('--sample: %s' % e)
+        min_length = default_min_length if args.sample_min is None else max(args.sample_min, 0)
+        sample = sampler(rate, count, args.sample_seed, min_length)
+    if args.memo:
+        # Which items are sampled depends on where a sequence is, which the
+        # memo's keys leave out.
+        if sample:
+            parser.error('--memo does not work with --sample')
+        from memo import subtree_memo
+        memo = subtree_memo(args.memo)
+    max_errors = 1 if args.fail_fast else args.max_errors
+    if max_errors is not None and max_errors < 1:
+        parser.error('--max-errors must be at least 1')
+    chunk_docs = args.chunk_docs
+    if chunk_docs is not None and chunk_docs < 1:
+        parser.error('--chunk-docs must be at least 1')
+    jobs = args.jobs or os.cpu_count() or 1
+    if args.profile or args.profile_collapsed:
+        if streaming:
+            parser.error('--profile does not work with --stream')
+        from profiler import schema_profile, sort_keys
+        if args.profile_sort not in sort_keys:
+            parser.error('--profile-sort must be one of: %s' % ', '.join(sort_keys))
+        # Profiles are gathered in this process, so that's where docs go.
+        profile = schema_profile()
+        profile_top = args.profile_top
+        profile_sort = args.profile_sort
+        profile_collapsed = args.profile_collapsed
+        jobs = 1
     verbose = True #args.verbose
-    yaval(args.schema, args.doc)
\ No newline at end of file
+    if args.compile:
+        sys.exit(yaval_compile(args.schema, args.output))
+    if args.watch:
+        if streaming or profile or '-' in args.doc:
+            parser.error('--watch does not work with --stream, --profile or stdin')
+        sys.exit(yaval_watch(args.schema, args.doc))
+    if args.serve:
+        import daemon
+        try:
+            daemon.serve(serve_request)
+        except RuntimeError as e:
+            err(str(e), validation_context(None))
+            sys.exit(1)
+        sys.exit(0)
+    # The daemon doesn't do parallel, cached or profiled runs; those stay local.
+    if not args.no_daemon and jobs == 1 and not use_result_cache and not profile:
+        import daemon
+        sock = daemon.connect()
+        if sock:
+            yaval_via_daemon(sock, args.schema, args.doc)
+    yaval(args.schema, args.doc, jobs)
+
+if __name__ == '__main__':
+    main()